@@ -0,0 +1,238 @@
+#################################################
+# benchmark 용 로컬 backend
+#  - PostgreSQL : 이미 떠 있는 서버를 사용하거나(--postgres host:port), pgserver / PATH 의 binary 로 임시 서버를 띄운다.
+#  - MLflow     : basic-auth tracking 서버를 subprocess 로 띄운다.
+#  - 외부 network 를 사용하지 않는다. (127.0.0.1 만 사용)
+#################################################
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import tempfile
+import subprocess
+import urllib.request
+
+class BackendError(Exception) :
+    pass
+
+def free_port() :
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s :
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _wait(check, timeout, what) :
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline :
+        try:
+            if check() :
+                return
+        except BackendError :
+            raise
+        except Exception :
+            pass
+        time.sleep(0.2)
+    raise BackendError(f'{what} did not start within {timeout}s')
+
+########################################
+# PostgreSQL
+########################################
+# 이미 떠 있는 PostgreSQL 서버 (benchmark 용 database 는 이 서버에 만들고 지운다.)
+class ExternalPostgres(object) :
+    def __init__(self, host, port, user, password) :
+        self.host = host
+        self.port = int(port)
+        self.user = user
+        self.password = password
+
+    def start(self) :
+        return self
+
+    def stop(self) :
+        pass
+
+    def dsn(self, dbname='postgres') :
+        return f'postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{dbname}'
+
+# 임시 디렉토리에 initdb 한 PostgreSQL 서버 (trust 인증, 127.0.0.1 만 listen)
+#  - pgserver 가 설치되어 있으면 그 binary 를, 없으면 PATH 의 initdb / pg_ctl 을 사용한다.
+#  - root 로 실행하면 postgres 가 거부하므로 별도 system 사용자로 실행한다.
+class EmbeddedPostgres(object) :
+    def __init__(self, base_dir=None) :
+        self.base_dir = base_dir
+        self.host = '127.0.0.1'
+        self.port = None
+        self.user = 'postgres'
+        self.password = 'bench'
+        self.pgdata = None
+        self._tmp = None
+        self._system_user = None
+
+    def _bin(self, name) :
+        try:
+            from pgserver._commands import POSTGRES_BIN_PATH
+            path = os.path.join(str(POSTGRES_BIN_PATH), name)
+            if os.path.exists(path) :
+                return path
+        except ImportError :
+            pass
+        path = shutil.which(name)
+        if path is None :
+            raise BackendError(f'{name} not found : pip install pgserver, install PostgreSQL, or use --postgres host:port')
+        return path
+
+    def _run(self, args) :
+        kwargs = {'user': self._system_user} if self._system_user else {}
+        result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, **kwargs)
+        if result.returncode != 0 :
+            raise BackendError(f'{" ".join(args)} failed :\n{result.stdout}')
+        return result.stdout
+
+    def _prepare_root(self) :
+        import pwd
+        for name in ('postgres', 'pgserver') :
+            try:
+                pwd.getpwnam(name)
+                self._system_user = name
+                break
+            except KeyError :
+                continue
+        if self._system_user is None :
+            subprocess.run(['useradd', '-s', '/bin/bash', 'pgserver'], check=True)
+            self._system_user = 'pgserver'
+
+        entry = pwd.getpwnam(self._system_user)
+        os.chmod(self._tmp, 0o755)
+        os.chown(self.pgdata, entry.pw_uid, entry.pw_gid)
+
+    def start(self) :
+        self._tmp = tempfile.mkdtemp(prefix='mlstudio-bench-pg-', dir=self.base_dir)
+        self.pgdata = os.path.join(self._tmp, 'data')
+        os.makedirs(self.pgdata)
+        if hasattr(os, 'geteuid') and os.geteuid() == 0 :
+            self._prepare_root()
+
+        self._run([self._bin('initdb'), '-D', self.pgdata, '-U', self.user, '--auth=trust', '--encoding=utf8'])
+        self.port = free_port()
+        self._run([self._bin('pg_ctl'), '-D', self.pgdata, '-w', '-l', os.path.join(self.pgdata, 'server.log'),
+                   '-o', f'-h {self.host} -p {self.port} -k {self.pgdata}', 'start'])
+        return self
+
+    def stop(self) :
+        if self.pgdata and os.path.exists(os.path.join(self.pgdata, 'postmaster.pid')) :
+            try:
+                self._run([self._bin('pg_ctl'), '-D', self.pgdata, '-w', '-m', 'fast', 'stop'])
+            except BackendError :
+                pass
+        if self._tmp :
+            shutil.rmtree(self._tmp, ignore_errors=True)
+            self._tmp = None
+
+    def dsn(self, dbname='postgres') :
+        return f'postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{dbname}'
+
+# benchmark 용 database 를 (다른 연결을 끊고) 지운 뒤 다시 만든다. create=False 이면 지우기만 한다.
+def recreate_database(postgres, dbname, create=True) :
+    import psycopg2
+    conn = psycopg2.connect(postgres.dsn())
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE datname = %s AND pid <> pg_backend_pid()', (dbname,))
+        cursor.execute(f'DROP DATABASE IF EXISTS "{dbname}"')
+        if create :
+            cursor.execute(f'CREATE DATABASE "{dbname}"')
+    finally:
+        conn.close()
+
+def drop_database(postgres, dbname) :
+    recreate_database(postgres, dbname, create=False)
+
+########################################
+# MLflow basic-auth 서버
+########################################
+ADMIN_USERNAME = 'admin'
+ADMIN_PASSWORD = 'bench-admin'
+
+class MlflowServer(object) :
+    def __init__(self, tracking_dsn, auth_dsn, work_dir, workers=4) :
+        self.tracking_dsn = tracking_dsn
+        self.auth_dsn = auth_dsn
+        self.work_dir = work_dir
+        self.workers = workers
+        self.port = None
+        self.process = None
+        self._log = None
+
+    @property
+    def url(self) :
+        return f'http://127.0.0.1:{self.port}'
+
+    def start(self, timeout=120) :
+        os.makedirs(self.work_dir, exist_ok=True)
+        auth_config = os.path.join(self.work_dir, 'basic_auth.ini')
+        with open(auth_config, 'w') as f :
+            f.write('[mlflow]\n'
+                    'default_permission = READ\n'
+                    f'database_uri = {self.auth_dsn}\n'
+                    f'admin_username = {ADMIN_USERNAME}\n'
+                    f'admin_password = {ADMIN_PASSWORD}\n'
+                    'authorization_function = mlflow.server.auth:authenticate_request_basic_auth\n')
+
+        env = dict(os.environ)
+        env['MLFLOW_AUTH_CONFIG_PATH'] = auth_config
+        self.port = free_port()
+        self._log = open(os.path.join(self.work_dir, 'mlflow-server.log'), 'w')
+        self.process = subprocess.Popen([
+            sys.executable, '-m', 'mlflow', 'server',
+            '--app-name', 'basic-auth',
+            '--backend-store-uri', self.tracking_dsn,
+            '--default-artifact-root', os.path.join(self.work_dir, 'artifacts'),
+            '--host', '127.0.0.1',
+            '--port', str(self.port),
+            '--workers', str(self.workers),
+        ], env=env, stdout=self._log, stderr=subprocess.STDOUT, start_new_session=True)
+
+        def healthy() :
+            if self.process.poll() is not None :
+                raise BackendError(f'mlflow server exited : see {self._log.name}')
+            with urllib.request.urlopen(f'{self.url}/health', timeout=2) as resp :
+                return resp.status == 200
+        try:
+            _wait(healthy, timeout, 'mlflow server')
+        except BackendError :
+            self.stop()
+            raise
+        return self
+
+    def stop(self) :
+        if self.process is not None and self.process.poll() is None :
+            import signal
+            os.killpg(self.process.pid, signal.SIGTERM)
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired :
+                os.killpg(self.process.pid, signal.SIGKILL)
+        self.process = None
+        if self._log is not None :
+            self._log.close()
+            self._log = None
+
+########################################
+# mlstudio_sdk 설정 파일
+########################################
+def write_sdk_config(conf_dir, postgres, tracking_db, auth_db, server_url, artifact_root) :
+    os.makedirs(conf_dir, exist_ok=True)
+    config = {
+        'db': {
+            'cluster': {'ip': postgres.host, 'port': postgres.port},
+            'user': {'mlflow': {'id': postgres.user, 'password': postgres.password}},
+            'database': {'mlflow': {'tracking': tracking_db, 'auth': auth_db}},
+        },
+        'mlflow': {'server_url': server_url, 'artifact_root': artifact_root},
+    }
+    path = os.path.join(conf_dir, 'mlstudio-config.json')
+    with open(path, 'w') as f :
+        f.write(json.dumps(config, indent=2))
+    return path
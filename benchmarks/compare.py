@@ -0,0 +1,80 @@
+#################################################
+# 두 benchmark 결과 비교
+#  - 같은 scale / 작업끼리 비교하여 표로 출력한다.
+#  - metric 이 threshold 비율 이상 (그리고 min_delta 초 이상) 나빠진 작업이 있으면 종료 코드 1
+#
+#   python benchmarks/compare.py base.json head.json --metric p99 --threshold 0.2
+#################################################
+import sys
+import json
+import argparse
+
+# 값이 클수록 좋은 metric
+HIGHER_IS_BETTER = ('throughput',)
+
+def load(path) :
+    with open(path, 'r') as f :
+        result = json.loads(f.read())
+    operations = {}
+    for scale in result['results'] :
+        for name, stats in scale['operations'].items() :
+            operations[(scale['scale'], name)] = stats
+    return result['meta'], operations
+
+def compare(base, head, metric='p99', threshold=0.2, min_delta=0.0005) :
+    rows = []
+    regressions = []
+    for key in sorted(set(base) | set(head)) :
+        before = base.get(key, {}).get(metric)
+        after = head.get(key, {}).get(metric)
+        change = None
+        regressed = False
+        if before and after is not None :
+            change = (after - before) / before
+            if metric in HIGHER_IS_BETTER :
+                regressed = change < -threshold
+            else :
+                regressed = change > threshold and after - before > min_delta
+        rows.append((key, before, after, change, regressed))
+        if regressed :
+            regressions.append(key)
+    return rows, regressions
+
+def _format(value, metric) :
+    if value is None :
+        return '-'
+    if metric in HIGHER_IS_BETTER :
+        return f'{value:.1f}/s'
+    return f'{value * 1000:.2f}ms'
+
+def main(argv=None) :
+    parser = argparse.ArgumentParser(description='compare two mlstudio_sdk benchmark results')
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--metric', default='p99', help='p50 / p90 / p99 / mean / max / throughput (default: p99)')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative regression (default: 0.2)')
+    parser.add_argument('--min-delta', type=float, default=0.0005, help='ignore latency changes below this many seconds (default: 0.0005)')
+    args = parser.parse_args(argv)
+
+    base_meta, base = load(args.base)
+    head_meta, head = load(args.head)
+    rows, regressions = compare(base, head, args.metric, args.threshold, args.min_delta)
+
+    print(f"base : {base_meta.get('commit')} {base_meta.get('label') or ''}")
+    print(f"head : {head_meta.get('commit')} {head_meta.get('label') or ''}")
+    print(f'metric : {args.metric}, threshold : {args.threshold:.0%}')
+    print()
+    width = max([len(name) for (_, name), *_ in rows] + [9])
+    print(f"{'scale':>5}  {'operation':<{width}}  {'base':>12}  {'head':>12}  {'change':>8}")
+    for (scale, name), before, after, change, regressed in rows :
+        change_text = f'{change:+.1%}' if change is not None else '-'
+        mark = '  REGRESSION' if regressed else ''
+        print(f'{scale:>5}  {name:<{width}}  {_format(before, args.metric):>12}  {_format(after, args.metric):>12}  {change_text:>8}{mark}')
+
+    if regressions :
+        print(f'\n{len(regressions)} regression(s)')
+        return 1
+    return 0
+
+if __name__ == '__main__' :
+    sys.exit(main())
@@ -0,0 +1,313 @@
+#################################################
+# mlstudio_sdk benchmark
+#  - 로컬 PostgreSQL 과 MLflow basic-auth 서버를 띄우고 scale 별로 데이터를 만든 뒤 SDK 작업의 지연시간과 처리량을 잰다.
+#  - 결과는 JSON 으로 저장하며 compare.py 로 두 결과(commit)를 비교한다.
+#
+#   python benchmarks/run.py --scales 1,10 --output bench-head.json
+#   python benchmarks/run.py --postgres 127.0.0.1:5432 --pg-user postgres --pg-password pw
+#   python benchmarks/compare.py bench-base.json bench-head.json
+#################################################
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_PATH = os.path.dirname(os.path.abspath(__file__))
+REPO_PATH = os.path.dirname(BENCH_PATH)
+
+# 설치된 package 가 아니라 이 checkout 의 SDK 를 잰다.
+sys.path.insert(0, os.path.join(REPO_PATH, 'src'))
+
+import backends
+import seed as seeding
+
+########################################
+# 측정
+########################################
+def _percentile(values, q) :
+    if not values :
+        return None
+    index = max(0, min(len(values) - 1, int(round(q / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+def summarize(latencies, errors, records, elapsed) :
+    latencies = sorted(latencies)
+    count = len(latencies)
+    result = {
+        'iterations': count,
+        'errors': len(errors),
+        'mean': sum(latencies) / count if count else None,
+        'p50': _percentile(latencies, 50),
+        'p90': _percentile(latencies, 90),
+        'p99': _percentile(latencies, 99),
+        'max': latencies[-1] if count else None,
+        'throughput': count / elapsed if elapsed > 0 else None,
+    }
+    # instrumentation 으로 잰 작업당 평균 왕복 수 / row 수
+    if records :
+        result['db_round_trips'] = sum(r.db_round_trips for r in records) / len(records)
+        result['rest_round_trips'] = sum(r.rest_round_trips for r in records) / len(records)
+        result['rows'] = sum(r.rows for r in records) / len(records)
+    if errors :
+        result['first_error'] = errors[0]
+    return result
+
+class Recorder(object) :
+    def __init__(self) :
+        self.records = []
+        self._lock = threading.Lock()
+
+    def __call__(self, record) :
+        with self._lock :
+            self.records.append(record)
+
+    def take(self) :
+        with self._lock :
+            records, self.records = self.records, []
+        return records
+
+# func(i) 를 warmup 번 실행한 뒤 iterations 번 실행하며 한번씩 시간을 잰다.
+def measure(recorder, func, iterations, warmup=0) :
+    for i in range(warmup) :
+        func(i)
+    recorder.take()
+
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    for i in range(warmup, warmup + iterations) :
+        t = time.perf_counter()
+        try:
+            func(i)
+        except Exception as e :
+            errors.append(f'{type(e).__name__}: {e}')
+            continue
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    return summarize(latencies, errors, recorder.take(), elapsed)
+
+# threads 개의 thread 가 동시에 func 를 iterations 번씩 실행했을 때의 지연시간과 처리량
+def measure_concurrent(recorder, func, iterations, threads) :
+    recorder.take()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(n) :
+        for i in range(iterations) :
+            t = time.perf_counter()
+            try:
+                func(n * iterations + i)
+            except Exception as e :
+                with lock :
+                    errors.append(f'{type(e).__name__}: {e}')
+                continue
+            with lock :
+                latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor :
+        list(executor.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+    result = summarize(latencies, errors, recorder.take(), elapsed)
+    result['threads'] = threads
+    return result
+
+########################################
+# scale 하나 실행
+########################################
+def run_scale(args, postgres, work_dir, scale) :
+    from mlstudio_sdk import db, clients, instrumentation, mlflow_api
+    from mlstudio_sdk.config import Config
+
+    tracking_db = f'mlstudio_bench_s{scale}_tracking'
+    auth_db = f'mlstudio_bench_s{scale}_auth'
+    scale_dir = os.path.join(work_dir, f'scale-{scale}')
+    artifact_root = os.path.join(scale_dir, 'artifacts')
+
+    print(f'[scale {scale}] creating databases', flush=True)
+    backends.recreate_database(postgres, tracking_db)
+    backends.recreate_database(postgres, auth_db)
+
+    server = backends.MlflowServer(postgres.dsn(tracking_db), postgres.dsn(auth_db), scale_dir, workers=args.workers)
+    try:
+        print(f'[scale {scale}] starting mlflow server', flush=True)
+        server.start()
+
+        print(f'[scale {scale}] seeding', flush=True)
+        info = seeding.seed(postgres.dsn(tracking_db), postgres.dsn(auth_db), scale, artifact_root)
+
+        backends.write_sdk_config(os.environ['CONF_PATH'], postgres, tracking_db, auth_db, server.url, artifact_root)
+        Config().load()
+
+        recorder = Recorder()
+        instrumentation.add_listener(recorder)
+        instrumentation.enable()
+        try:
+            operations = run_operations(args, mlflow_api, recorder, info, scale)
+        finally:
+            instrumentation.disable()
+            instrumentation.remove_listener(recorder)
+    finally:
+        server.stop()
+        db.close_all_pools()
+        clients.close()
+        if not args.keep :
+            backends.drop_database(postgres, tracking_db)
+            backends.drop_database(postgres, auth_db)
+
+    return {
+        'scale': scale,
+        'sizes': info.sizes,
+        'seed_seconds': info.seconds,
+        'operations': operations,
+    }
+
+def run_operations(args, api, recorder, info, scale) :
+    admin = (backends.ADMIN_USERNAME, backends.ADMIN_PASSWORD)
+    iterations = args.iterations
+    warmup = args.warmup
+    operations = {}
+
+    def run(name, func, count=iterations, skip=warmup) :
+        print(f'[scale {scale}] {name}', flush=True)
+        operations[name] = measure(recorder, func, count, skip)
+
+    # 조회
+    run('get_experiments_by_permission', lambda i : api.get_experiments_by_permission(info.reader))
+    run('get_experiments_by_permission[admin]', lambda i : api.get_experiments_by_permission(admin[0]))
+    run('get_registered_model_by_permission', lambda i : api.get_registered_model_by_permission(info.reader))
+    run('get_all_experiments', lambda i : api.get_all_experiments(*admin), count=max(1, iterations // 5), skip=min(warmup, 1))
+
+    if args.threads > 1 :
+        print(f'[scale {scale}] concurrent reads ({args.threads} threads)', flush=True)
+        operations['get_experiments_by_permission[concurrent]'] = measure_concurrent(
+            recorder, lambda i : api.get_experiments_by_permission(info.reader), iterations, args.threads)
+        operations['get_registered_model_by_permission[concurrent]'] = measure_concurrent(
+            recorder, lambda i : api.get_registered_model_by_permission(info.reader), iterations, args.threads)
+
+    # 접근권한 설정 / 변경 / 취소 : 같은 resource 에 차례로 적용하므로 resource 개수까지만 실행한다.
+    experiments = info.experiment_names
+    count = min(warmup + iterations, len(experiments))
+    skip = min(warmup, count // 2)
+    run('apply_experiment_permission',
+        lambda i : api.apply_experiment_permission(*admin, experiments[i], info.target, 'READ'), count - skip, skip)
+    run('update_experiment_permission',
+        lambda i : api.update_experiment_permission(*admin, experiments[i], info.target, 'EDIT'), count - skip, skip)
+    run('cancel_experiment_permission',
+        lambda i : api.cancel_experiment_permission(*admin, experiments[i], info.target), count - skip, skip)
+
+    models = info.registered_model_names
+    count = min(warmup + iterations, len(models))
+    skip = min(warmup, count // 2)
+    run('apply_registered_model_permission',
+        lambda i : api.apply_registered_model_permission(*admin, models[i], info.target, 'READ'), count - skip, skip)
+    run('update_registered_model_permission',
+        lambda i : api.update_registered_model_permission(*admin, models[i], info.target, 'EDIT'), count - skip, skip)
+    run('cancel_registered_model_permission',
+        lambda i : api.cancel_registered_model_permission(*admin, models[i], info.target), count - skip, skip)
+
+    # experiment 생성 : 이미 있는 이름 / 새 이름
+    # 위 권한 작업에서 채워진 이름 cache 를 비워 처음 조회하는 경우를 잰다.
+    api.clear_name_cache()
+    count = min(warmup + iterations, len(experiments))
+    skip = min(warmup, count // 2)
+    run('create_experiment_if_not_exists[existing]',
+        lambda i : api.create_experiment_if_not_exists(*admin, experiments[i]), count - skip, skip)
+    run('create_experiment_if_not_exists[new]',
+        lambda i : api.create_experiment_if_not_exists(*admin, f'bench_new_experiment_{i:06d}'))
+
+    return operations
+
+########################################
+# main
+########################################
+def _git_commit() :
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_PATH, stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError) :
+        return None
+
+def _versions() :
+    versions = {'python': platform.python_version()}
+    for name in ('mlflow', 'psycopg2', 'sqlalchemy') :
+        try:
+            versions[name] = __import__(name).__version__
+        except Exception :
+            versions[name] = None
+    return versions
+
+def parse_args(argv=None) :
+    parser = argparse.ArgumentParser(description='mlstudio_sdk benchmark against local PostgreSQL / MLflow servers')
+    parser.add_argument('--scales', default='1,5', help='comma separated scale factors (default: 1,5)')
+    parser.add_argument('--iterations', type=int, default=50, help='measured calls per operation (default: 50)')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured calls before measuring (default: 5)')
+    parser.add_argument('--threads', type=int, default=8, help='threads for the concurrent read benchmark, 1 to skip (default: 8)')
+    parser.add_argument('--workers', type=int, default=4, help='mlflow server workers (default: 4)')
+    parser.add_argument('--output', default=None, help='result JSON path (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--label', default=None, help='free-form label stored in the result')
+    parser.add_argument('--postgres', default=None, help='use a running PostgreSQL host:port instead of a temporary one')
+    parser.add_argument('--pg-user', default='postgres')
+    parser.add_argument('--pg-password', default='postgres')
+    parser.add_argument('--keep', action='store_true', help='keep benchmark databases after the run')
+    return parser.parse_args(argv)
+
+def main(argv=None) :
+    args = parse_args(argv)
+    scales = [int(s) for s in args.scales.split(',') if s.strip()]
+    if not scales or min(scales) < 1 :
+        raise SystemExit(f'invalid --scales : {args.scales}')
+
+    work_dir = tempfile.mkdtemp(prefix='mlstudio-bench-')
+    # SDK 는 CONF_PATH 의 설정 파일을 읽으므로 SDK 를 import 하기 전에 정해 둔다.
+    os.environ['CONF_PATH'] = os.path.join(work_dir, 'conf')
+
+    if args.postgres :
+        host, _, port = args.postgres.partition(':')
+        postgres = backends.ExternalPostgres(host, port or 5432, args.pg_user, args.pg_password)
+    else :
+        postgres = backends.EmbeddedPostgres()
+
+    commit = _git_commit()
+    result = {
+        'meta': {
+            'commit': commit,
+            'label': args.label,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'versions': _versions(),
+            'postgres': 'external' if args.postgres else 'embedded',
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'threads': args.threads,
+            'workers': args.workers,
+        },
+        'results': [],
+    }
+
+    try:
+        postgres.start()
+        for scale in scales :
+            result['results'].append(run_scale(args, postgres, work_dir, scale))
+    finally:
+        postgres.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(BENCH_PATH, 'results', f'{(commit or "local")[:12]}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f :
+        f.write(json.dumps(result, indent=2))
+    print(f'results written to {output}')
+    return result
+
+if __name__ == '__main__' :
+    main()
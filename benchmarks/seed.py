@@ -0,0 +1,130 @@
+#################################################
+# benchmark 데이터 생성
+#  - MLflow 서버가 schema 와 admin 사용자를 만든 뒤, 사용자 / experiment / registered model / 접근권한을
+#    tracking / auth DB 에 직접 넣는다. (REST 로 넣으면 scale 이 클 때 너무 오래 걸린다.)
+#  - 같은 scale 이면 항상 같은 데이터가 만들어진다.
+#################################################
+import time
+from collections import namedtuple
+
+PERMISSIONS = ('READ', 'EDIT', 'MANAGE')
+
+USER_PASSWORD = 'bench-user'
+
+# scale 1 의 크기. scale factor 만큼 곱한다.
+#   *_per_user : 사용자 한명이 가지는 접근권한 수 (전체 개수를 넘지 않는다.)
+SCALE_UNIT = {
+    'users': 10,
+    'experiments': 100,
+    'registered_models': 20,
+    'experiment_permissions_per_user': 10,
+    'registered_model_permissions_per_user': 2,
+}
+
+# benchmark 에서 사용하는 이름
+#   reader : 접근권한을 가진 일반 사용자, target : 권한 설정/취소 대상 사용자 (처음에는 권한 없음)
+SeedInfo = namedtuple('SeedInfo', ['scale', 'sizes', 'reader', 'target', 'experiment_names', 'registered_model_names', 'seconds'])
+
+def user_name(i) :
+    return f'bench_user_{i:06d}'
+
+def experiment_name(i) :
+    return f'bench_experiment_{i:06d}'
+
+def registered_model_name(i) :
+    return f'bench_model_{i:06d}'
+
+def scale_sizes(scale) :
+    sizes = {key: value * scale for key, value in SCALE_UNIT.items()}
+    sizes['experiment_permissions_per_user'] = min(sizes['experiment_permissions_per_user'], sizes['experiments'])
+    sizes['registered_model_permissions_per_user'] = min(sizes['registered_model_permissions_per_user'], sizes['registered_models'])
+    return sizes
+
+def seed(tracking_dsn, auth_dsn, scale, artifact_root) :
+    import psycopg2
+    import psycopg2.extras
+    from werkzeug.security import generate_password_hash
+
+    start = time.monotonic()
+    sizes = scale_sizes(scale)
+    now = int(time.time() * 1000)
+
+    experiment_names = [experiment_name(i) for i in range(sizes['experiments'])]
+    registered_model_names = [registered_model_name(i) for i in range(sizes['registered_models'])]
+
+    tracking = psycopg2.connect(tracking_dsn)
+    try:
+        with tracking :
+            cursor = tracking.cursor()
+            rows = psycopg2.extras.execute_values(cursor, """
+                INSERT INTO experiments (name, artifact_location, lifecycle_stage, creation_time, last_update_time)
+                VALUES %s
+                RETURNING experiment_id
+                """, [(name, None, 'active', now, now) for name in experiment_names], page_size=1000, fetch=True)
+            experiment_ids = [r[0] for r in rows]
+            psycopg2.extras.execute_values(cursor, """
+                UPDATE experiments SET artifact_location = v.location
+                FROM (VALUES %s) AS v(experiment_id, location)
+                WHERE experiments.experiment_id = v.experiment_id
+                """, [(i, f'{artifact_root}/{i}') for i in experiment_ids], template='(%s::integer, %s)', page_size=1000)
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO registered_models (name, creation_time, last_updated_time, description)
+                VALUES %s
+                """, [(name, now, now, '') for name in registered_model_names], page_size=1000)
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO model_versions (name, version, creation_time, last_updated_time, description, user_id,
+                                            current_stage, source, run_id, status, status_message, run_link, storage_location)
+                VALUES %s
+                """, [(name, 1, now, now, '', None, 'None', f'{artifact_root}/models/{name}', None, 'READY', None, None, None)
+                      for name in registered_model_names], page_size=1000)
+    finally:
+        tracking.close()
+
+    # 비밀번호 hash 는 느리므로 한번만 만들어 모든 사용자가 같이 쓴다.
+    password_hash = generate_password_hash(USER_PASSWORD)
+    users = [user_name(i) for i in range(sizes['users'])]
+    target = 'bench_target'
+
+    auth = psycopg2.connect(auth_dsn)
+    try:
+        with auth :
+            cursor = auth.cursor()
+            rows = psycopg2.extras.execute_values(cursor, """
+                INSERT INTO users (username, password_hash, is_admin)
+                VALUES %s
+                RETURNING id
+                """, [(name, password_hash, False) for name in users + [target]], page_size=1000, fetch=True)
+            user_ids = [r[0] for r in rows][:len(users)]
+
+            experiment_permissions = []
+            registered_model_permissions = []
+            for n, user_id in enumerate(user_ids) :
+                for j in range(sizes['experiment_permissions_per_user']) :
+                    i = (n * sizes['experiment_permissions_per_user'] + j) % len(experiment_ids)
+                    experiment_permissions.append((str(experiment_ids[i]), user_id, PERMISSIONS[j % len(PERMISSIONS)]))
+                for j in range(sizes['registered_model_permissions_per_user']) :
+                    i = (n * sizes['registered_model_permissions_per_user'] + j) % len(registered_model_names)
+                    registered_model_permissions.append((registered_model_names[i], user_id, PERMISSIONS[j % len(PERMISSIONS)]))
+
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO experiment_permissions (experiment_id, user_id, permission)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+                """, experiment_permissions, page_size=1000)
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO registered_model_permissions (name, user_id, permission)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+                """, registered_model_permissions, page_size=1000)
+    finally:
+        auth.close()
+
+    for dsn in (tracking_dsn, auth_dsn) :
+        conn = psycopg2.connect(dsn)
+        conn.autocommit = True
+        try:
+            conn.cursor().execute('ANALYZE')
+        finally:
+            conn.close()
+
+    return SeedInfo(scale, sizes, users[0], target, experiment_names, registered_model_names, time.monotonic() - start)
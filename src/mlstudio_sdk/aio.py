@@ -0,0 +1,472 @@
+import asyncio
+from mlstudio_sdk.bulk import CREATE, UPDATE, UPSERT, DELETE, PermissionResult, _check_mode, _plan
+from mlstudio_sdk.config import Config
+from mlstudio_sdk.mlflow_api import _permissions_changed, _resource_changed, _resource_deleted, _is_already_exists_error, _invalidate_name
+from mlstudio_sdk import instrumentation
+from mlstudio_sdk import mlflow_api
+from mlstudio_sdk import retry
+from mlstudio_sdk import permission_index
+from mlstudio_sdk import queries
+
+class RestError(Exception) :
+    def __init__(self, message, error_code=None, status=None) :
+        super().__init__(message)
+        self.error_code = error_code
+        self.status = status
+
+def _import_asyncpg() :
+    try:
+        import asyncpg
+    except ImportError :
+        raise ImportError('asyncpg is required for mlstudio_sdk.aio (pip install asyncpg)')
+    return asyncpg
+
+def _import_aiohttp() :
+    try:
+        import aiohttp
+    except ImportError :
+        raise ImportError('aiohttp is required for mlstudio_sdk.aio (pip install aiohttp)')
+    return aiohttp
+
+########################################
+# event loop 별 asyncpg pool / aiohttp connector
+########################################
+# asyncpg pool 과 aiohttp connector 는 만든 event loop 에서만 사용할 수 있으므로 loop 별로 만든다.
+# 동시에 처음 요청하더라도 하나만 만들도록 생성 task 를 저장해 두고 같이 기다린다.
+# loop 객체를 key 로 두어 (id 는 loop 가 사라진 뒤 새 loop 에 다시 쓰일 수 있다.) 닫힌 loop 의 것은 다음 요청 때 버린다.
+_pools = {}         # loop -> {dsn: pool 생성 task}
+_connectors = {}    # loop -> connector
+
+def _running_loop() :
+    loop = asyncio.get_running_loop()
+    for registry in (_pools, _connectors) :
+        for closed in [l for l in registry if l is not loop and l.is_closed()] :
+            del registry[closed]
+    return loop
+
+async def get_pool(dsn) :
+    pools = _pools.setdefault(_running_loop(), {})
+    task = pools.get(dsn)
+    if task is None :
+        options = Config().get_db_pool_options()
+        task = asyncio.ensure_future(_import_asyncpg().create_pool(
+            dsn,
+            min_size=options['min_size'],
+            max_size=options['max_size'],
+            max_inactive_connection_lifetime=options['check_interval'] * 10))
+        pools[dsn] = task
+    try:
+        return await asyncio.shield(task)
+    except Exception :
+        if pools.get(dsn) is task :
+            del pools[dsn]
+        raise
+
+def _connector(limit) :
+    loop = _running_loop()
+    connector = _connectors.get(loop)
+    if connector is None or connector.closed :
+        connector = _import_aiohttp().TCPConnector(limit=limit)
+        _connectors[loop] = connector
+    return connector
+
+# 현재 event loop 에서 만든 pool 과 connector 를 정리한다.
+async def close() :
+    loop = asyncio.get_running_loop()
+    for task in _pools.pop(loop, {}).values() :
+        if task.done() and not task.cancelled() and not task.exception() :
+            await task.result().close()
+    connector = _connectors.pop(loop, None)
+    if connector is not None :
+        await connector.close()
+
+########################################
+# AsyncSession
+########################################
+# mlflow_api.Session 의 asyncio 버전
+#  - 인증 서버 / tracking 서버는 aiohttp 로 REST API 를 직접 호출한다. (로그인 정보는 요청마다 Basic 인증으로 보낸다.)
+#  - DB 직접 조회는 asyncpg pool 을 사용한다.
+#  - REST 동시 호출 수는 max_concurrency 로 제한한다.
+#
+#   async with AsyncSession(login_id, login_pwd) as session :
+#       await session.apply_experiment_permission('my-experiment', 'user1', 'READ')
+#       results = await session.apply_experiment_permissions(names, user_ids, 'READ')
+# public method 는 'aio.<method>' 이름으로 instrumentation 작업이 기록된다.
+# (gather 로 동시에 처리한 구간은 각각 더하므로 구간 시간의 합이 작업 시간보다 클 수 있다.)
+@instrumentation.instrument_class('aio')
+class AsyncSession(object) :
+    def __init__(self, login_id='', login_pwd='', max_concurrency=16, timeout=30.0) :
+        self.login_id = login_id
+        self.login_pwd = login_pwd
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._semaphore = None
+        self._http = None
+
+    async def __aenter__(self) :
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) :
+        await self.close()
+
+    async def close(self) :
+        if self._http is not None :
+            await self._http.close()
+            self._http = None
+
+    def _session(self) :
+        if self._http is None :
+            aiohttp = _import_aiohttp()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._http = aiohttp.ClientSession(
+                connector=_connector(max(100, self.max_concurrency)),
+                connector_owner=False,
+                auth=aiohttp.BasicAuth(self.login_id, self.login_pwd) if self.login_id else None,
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._http
+
+    async def _request(self, endpoint, method, **kwargs) :
+        http = self._session()
+        url = Config().get_mlflow_server_url().rstrip('/') + '/api/2.0/mlflow/' + endpoint
+        # retry.deadline 안에서 호출하면 남은 시간을 넘기지 않는다. (재시도는 하지 않는다.)
+        left = retry.check_deadline()
+        if left is not None and left < self.timeout :
+            kwargs.setdefault('timeout', _import_aiohttp().ClientTimeout(total=left))
+        async with self._semaphore :
+            with instrumentation.phase(instrumentation.REST) as p :
+                async with http.request(method, url, **kwargs) as response :
+                    text = await response.text()
+                    if p.active :
+                        p.bytes = len(text.encode('utf-8'))
+                    if response.status != 200 :
+                        try:
+                            body = await response.json(content_type=None)
+                        except ValueError :
+                            body = {}
+                        error_code = body.get('error_code') if isinstance(body, dict) else None
+                        message = body.get('message', text) if isinstance(body, dict) else text
+                        raise RestError(f'{error_code or response.status}: {message}', error_code, response.status)
+                    return await response.json(content_type=None) if text else {}
+
+    ########################################
+    # 사용자 관리
+    ########################################
+    async def create_user(self, user_id, user_pwd) :
+        try:
+            return (await self._request('users/create', 'POST', json={'username': user_id, 'password': user_pwd}))['user']
+        finally:
+            _permissions_changed(user_id)
+
+    async def delete_user(self, user_id) :
+        try:
+            await self._request('users/delete', 'DELETE', json={'username': user_id})
+        finally:
+            _permissions_changed(user_id)
+
+    async def update_user_admin(self, user_id, is_admin) :
+        try:
+            await self._request('users/update-admin', 'PATCH', json={'username': user_id, 'is_admin': is_admin})
+        finally:
+            _permissions_changed(user_id)
+
+    ########################################
+    # experiment 생성/삭제
+    ########################################
+    async def get_experiment_by_name(self, experiment_name) :
+        try:
+            return (await self._request('experiments/get-by-name', 'GET', params={'experiment_name': experiment_name}))['experiment']
+        except RestError as e :
+            if e.error_code == 'RESOURCE_DOES_NOT_EXIST' :
+                return None
+            raise
+
+    async def _experiment_id(self, experiment_name) :
+        experiment = await self.get_experiment_by_name(experiment_name)
+        if experiment is None :
+            raise Exception(f'{experiment_name} does not exist.')
+        return experiment['experiment_id']
+
+    async def create_experiment(self, name : str, tags : dict = None) :
+        body = {
+            'name': name,
+            'artifact_location': Config().get_mlflow_artifact_url(),
+            'tags': [{'key': k, 'value': str(v)} for k, v in (tags or {}).items()],
+        }
+        try:
+            return (await self._request('experiments/create', 'POST', json=body))['experiment_id']
+        finally:
+            _invalidate_name(mlflow_api.experiment_cache, name)
+            _resource_changed()
+
+    # 바로 생성을 시도하고 이미 있으면 id 를 조회한다. (mlflow_api.Session.ensure_experiment 와 같음)
+    async def ensure_experiment(self, experiment_name : str, tags : dict = None) :
+        try:
+            return await self.create_experiment(experiment_name, tags)
+        except RestError as e :
+            if not _is_already_exists_error(e.error_code, str(e)) :
+                raise
+        return await self._experiment_id(experiment_name)
+
+    async def ensure_experiments(self, experiment_names, tags : dict = None) :
+        experiment_names = list(dict.fromkeys(experiment_names))
+        ids = await asyncio.gather(*[self.ensure_experiment(name, tags) for name in experiment_names])
+        return dict(zip(experiment_names, ids))
+
+    async def delete_experiment(self, experiment_name) :
+        experiment_id = await self._experiment_id(experiment_name)
+        try:
+            await self._request('experiments/delete', 'POST', json={'experiment_id': experiment_id})
+        finally:
+            _invalidate_name(mlflow_api.experiment_cache, experiment_name)
+            _resource_deleted(experiment_id)
+
+    ########################################
+    # registered model 생성/삭제
+    ########################################
+    async def get_registered_model(self, name) :
+        try:
+            return (await self._request('registered-models/get', 'GET', params={'name': name}))['registered_model']['name']
+        except RestError as e :
+            if e.error_code == 'RESOURCE_DOES_NOT_EXIST' :
+                return None
+            raise
+
+    async def create_registered_model(self, name, desc : str = '', tags : dict = None) :
+        body = {
+            'name': name,
+            'description': desc,
+            'tags': [{'key': k, 'value': str(v)} for k, v in (tags or {}).items()],
+        }
+        try:
+            return (await self._request('registered-models/create', 'POST', json=body))['registered_model']['name']
+        finally:
+            _invalidate_name(mlflow_api.registered_model_cache, name)
+            _resource_changed(permission_index.REGISTERED_MODEL)
+
+    # 바로 생성을 시도하고 이미 있으면 실제로 있는지 조회한다. (mlflow_api.Session.ensure_registered_model 과 같음)
+    async def ensure_registered_model(self, name, desc : str = '', tags : dict = None) :
+        try:
+            return await self.create_registered_model(name, desc, tags)
+        except RestError as e :
+            if not _is_already_exists_error(e.error_code, str(e)) :
+                raise
+        model_name = await self.get_registered_model(name)
+        if model_name is None :
+            raise Exception(f'{name} does not exist.')
+        return model_name
+
+    async def delete_registered_model(self, registered_model_name) :
+        if await self.get_registered_model(registered_model_name) is None :
+            return
+        try:
+            await self._request('registered-models/delete', 'DELETE', json={'name': registered_model_name})
+        finally:
+            _invalidate_name(mlflow_api.registered_model_cache, registered_model_name)
+            _resource_deleted(registered_model_name, permission_index.REGISTERED_MODEL)
+
+    ########################################
+    # 접근권한 관리
+    ########################################
+    async def _permission(self, resource, action, user_id, key, permission=None) :
+        methods = {CREATE: 'POST', UPDATE: 'PATCH', DELETE: 'DELETE'}
+        body = {'username': user_id}
+        body.update({'experiment_id': str(key)} if resource == 'experiments' else {'name': key})
+        if action != DELETE :
+            body['permission'] = permission
+        try:
+            return await self._request(f'{resource}/permissions/{action}', methods[action], json=body)
+        finally:
+            _permissions_changed(user_id)
+
+    async def apply_experiment_permission(self, experiment_name, user_id, permission) :
+        experiment_id = await self._experiment_id(experiment_name)
+        return await self._permission('experiments', CREATE, user_id, experiment_id, permission)
+
+    async def update_experiment_permission(self, experiment_name, user_id, permission) :
+        experiment_id = await self._experiment_id(experiment_name)
+        await self._permission('experiments', UPDATE, user_id, experiment_id, permission)
+
+    async def cancel_experiment_permission(self, experiment_name, user_id) :
+        experiment = await self.get_experiment_by_name(experiment_name)
+        if experiment is None :
+            return
+        await self._permission('experiments', DELETE, user_id, experiment['experiment_id'])
+
+    async def apply_registered_model_permission(self, registered_model_name, user_id, permission) :
+        return await self._permission('registered-models', CREATE, user_id, registered_model_name, permission)
+
+    async def update_registered_model_permission(self, registered_model_name, user_id, permission) :
+        await self._permission('registered-models', UPDATE, user_id, registered_model_name, permission)
+
+    async def cancel_registered_model_permission(self, registered_model_name, user_id) :
+        if await self.get_registered_model(registered_model_name) is None :
+            return
+        await self._permission('registered-models', DELETE, user_id, registered_model_name)
+
+    ########################################
+    # 일괄 접근권한 관리 (bulk.py 의 asyncio 버전)
+    ########################################
+    # 이름 변환과 현재 권한은 각각 한번의 query 로 조회하고, REST 호출은 asyncio.gather 로 동시에 보낸다.
+    async def apply_experiment_permissions(self, experiment_names, user_ids, permission=None, mode=UPSERT) :
+        _check_mode(mode, permission)
+        experiment_names = list(dict.fromkeys(experiment_names))
+        user_ids = list(dict.fromkeys(user_ids))
+
+        rows = await fetch(_tracking_uri(), 'SELECT name, experiment_id FROM experiments WHERE name = ANY($1)', experiment_names)
+        resolved = {r['name']: str(r['experiment_id']) for r in rows}
+        current = {}
+        if mode in (UPSERT, DELETE) and resolved and user_ids :
+            rows = await fetch(_auth_uri(), """
+                SELECT  users.username, permissions.experiment_id, permissions.permission
+                FROM    experiment_permissions permissions
+                INNER JOIN users
+                ON      permissions.user_id = users.id
+                WHERE   users.username = ANY($1)
+                AND     permissions.experiment_id = ANY($2)
+                """, user_ids, list(resolved.values()))
+            current = {(r['username'], r['experiment_id']): r['permission'] for r in rows}
+
+        return await self._apply('experiments', experiment_names, resolved, user_ids, permission, mode, current)
+
+    async def apply_registered_model_permissions(self, registered_model_names, user_ids, permission=None, mode=UPSERT) :
+        _check_mode(mode, permission)
+        registered_model_names = list(dict.fromkeys(registered_model_names))
+        user_ids = list(dict.fromkeys(user_ids))
+
+        rows = await fetch(_tracking_uri(), 'SELECT name FROM registered_models WHERE name = ANY($1)', registered_model_names)
+        resolved = {r['name']: r['name'] for r in rows}
+        current = {}
+        if mode in (UPSERT, DELETE) and resolved and user_ids :
+            rows = await fetch(_auth_uri(), """
+                SELECT  users.username, permissions.name, permissions.permission
+                FROM    registered_model_permissions permissions
+                INNER JOIN users
+                ON      permissions.user_id = users.id
+                WHERE   users.username = ANY($1)
+                AND     permissions.name = ANY($2)
+                """, user_ids, list(resolved.values()))
+            current = {(r['username'], r['name']): r['permission'] for r in rows}
+
+        return await self._apply('registered-models', registered_model_names, resolved, user_ids, permission, mode, current)
+
+    async def _apply(self, resource, names, resolved, user_ids, permission, mode, current) :
+        async def work(name, key, user_id, action) :
+            try:
+                await self._permission(resource, action, user_id, key, permission)
+                return PermissionResult(user_id, name, permission, action, 'ok', None)
+            except Exception as e :
+                return PermissionResult(user_id, name, permission, action, 'failed', str(e))
+
+        async def done(result) :
+            return result
+
+        jobs = []
+        for name in names :
+            key = resolved.get(name)
+            for user_id in user_ids :
+                if key is None :
+                    status = 'skipped' if mode == DELETE else 'failed'
+                    error = None if mode == DELETE else f'{name} does not exist.'
+                    jobs.append(done(PermissionResult(user_id, name, permission, 'skip', status, error)))
+                    continue
+                action = _plan(mode, permission, current.get((user_id, key)))
+                if action is None :
+                    jobs.append(done(PermissionResult(user_id, name, permission, 'skip', 'skipped', None)))
+                else :
+                    jobs.append(work(name, key, user_id, action))
+
+        return list(await asyncio.gather(*jobs))
+
+    ########################################
+    # MLFlow Database 직접 접근
+    # user_name 을 생략하면 Session 의 로그인 사용자로 조회한다.
+    ########################################
+    async def get_is_admin(self, user_name=None) :
+        return await get_is_admin(user_name or self.login_id)
+
+    async def get_experiment_permissions(self, user_name=None) :
+        return await get_experiment_permissions(user_name or self.login_id)
+
+    async def get_experiments_by_permission(self, user_name=None) :
+        return await get_experiments_by_permission(user_name or self.login_id)
+
+    async def get_registered_model_permissions(self, user_name=None) :
+        return await get_registered_model_permissions(user_name or self.login_id)
+
+    async def get_registered_model_by_permission(self, user_name=None) :
+        return await get_registered_model_by_permission(user_name or self.login_id)
+
+########################################
+# MLFlow Database 직접 접근 (asyncpg)
+# queries 의 query 를 그대로 사용하며 (asyncpg 가 연결별로 prepare 하여 재사용한다.)
+# 결과 형태는 mlflow_api 의 같은 이름 함수와 같다.
+########################################
+def _tracking_uri() :
+    return Config().get_mlflow_tracking_uri()
+
+def _auth_uri() :
+    return Config().get_mlflow_tracking_auth_uri()
+
+@instrumentation.operation('aio.fetch')
+async def fetch(dsn, sql, *args) :
+    pool = await get_pool(dsn)
+    with instrumentation.phase(instrumentation.CONNECT) :
+        conn = await pool.acquire()
+    try:
+        with instrumentation.phase(instrumentation.QUERY) as p :
+            rows = await conn.fetch(sql, *args)
+            p.rows = len(rows)
+        return rows
+    finally:
+        await pool.release(conn)
+
+@instrumentation.operation('aio.get_is_admin')
+async def get_is_admin(user_name) :
+    rows = await fetch(_auth_uri(), queries.IS_ADMIN.sql, user_name)
+    return bool(rows[0]['is_admin']) if rows else False
+
+@instrumentation.operation('aio.get_experiment_permissions')
+async def get_experiment_permissions(user_name) :
+    rows = await fetch(_auth_uri(), queries.EXPERIMENT_PERMISSIONS.sql, user_name)
+    return [dict(r) for r in rows]
+
+@instrumentation.operation('aio.resolve_experiment_permissions')
+async def resolve_experiment_permissions(user_name) :
+    rows = await fetch(_auth_uri(), queries.RESOLVE_EXPERIMENT_PERMISSIONS.sql, user_name)
+    if not rows : return False, []
+    return bool(rows[0]['is_admin']), [int(i) for i in rows[0]['experiment_ids'] if str(i).isdigit()]
+
+@instrumentation.operation('aio.get_experiments_by_permission')
+async def get_experiments_by_permission(user_name) :
+    is_admin, experiment_ids = await resolve_experiment_permissions(user_name)
+    if not is_admin and len(experiment_ids) < 1 :
+        return []
+
+    if is_admin :
+        rows = await fetch(_tracking_uri(), queries.ALL_EXPERIMENTS_PAGE.sql, -1, None)
+    else :
+        rows = await fetch(_tracking_uri(), queries.EXPERIMENTS_BY_IDS_PAGE.sql, experiment_ids, -1, None)
+    return [dict(r) for r in rows]
+
+@instrumentation.operation('aio.get_registered_model_permissions')
+async def get_registered_model_permissions(user_name) :
+    rows = await fetch(_auth_uri(), queries.REGISTERED_MODEL_PERMISSIONS.sql, user_name)
+    return [dict(r) for r in rows]
+
+@instrumentation.operation('aio.resolve_registered_model_permissions')
+async def resolve_registered_model_permissions(user_name) :
+    rows = await fetch(_auth_uri(), queries.RESOLVE_REGISTERED_MODEL_PERMISSIONS.sql, user_name)
+    if not rows : return False, []
+    return bool(rows[0]['is_admin']), list(rows[0]['names'])
+
+@instrumentation.operation('aio.get_registered_model_by_permission')
+async def get_registered_model_by_permission(user_name) :
+    is_admin, names = await resolve_registered_model_permissions(user_name)
+    if not is_admin and len(names) < 1 :
+        return None
+
+    if is_admin :
+        rows = await fetch(_tracking_uri(), queries.ALL_REGISTERED_MODELS_PAGE.sql, '', None)
+    else :
+        rows = await fetch(_tracking_uri(), queries.REGISTERED_MODELS_BY_NAMES_PAGE.sql, names, '', None)
+    return [dict(r) for r in rows]
@@ -0,0 +1,217 @@
+import os
+import time
+import errno
+import uuid
+import shutil
+import hashlib
+import threading
+from collections import namedtuple
+from urllib.parse import urlparse, unquote
+from concurrent.futures import ThreadPoolExecutor
+from mlstudio_sdk.common import LazyModule
+from mlstudio_sdk.config import Config
+
+mlflow = LazyModule('mlflow')
+clients = LazyModule('mlstudio_sdk.clients')
+
+CHUNK_SIZE = 8 * 1024 * 1024
+CAS_DIR_NAME = '.mlstudio-cas'
+
+# 파일 하나의 처리 결과
+#   status : uploaded (새로 저장) / deduplicated (같은 내용이 이미 있어 reflink 만 만듦) / failed
+FileResult = namedtuple('FileResult', ['path', 'size', 'sha256', 'status', 'error'])
+
+# 전체 처리 결과
+UploadResult = namedtuple('UploadResult', [
+    'files',            # FileResult list
+    'bytes_total',
+    'bytes_uploaded',
+    'bytes_deduplicated',
+    'seconds',
+    'throughput',       # 처리한 전체 bytes / 초
+    'dedup',            # 끝까지 content-addressed 저장소로 dedup 했는지
+    'dedup_disabled_reason',    # dedup 하지 않았거나 도중에 멈춘 이유 (dedup 이면 None)
+])
+
+# reflink 를 지원하지 않는 파일 시스템 / 저장소와 대상이 다른 파일 시스템인 경우의 errno
+_CLONE_UNSUPPORTED = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS)
+
+def _local_path(uri) :
+    parsed = urlparse(uri)
+    if parsed.scheme == 'file' :
+        return unquote(parsed.path)
+    if parsed.scheme == '' or (len(parsed.scheme) == 1 and os.name == 'nt') :
+        return uri
+    return None
+
+def _sha256(path, chunk_size) :
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f :
+        for chunk in iter(lambda : f.read(chunk_size), b'') :
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# 같은 폴더의 임시 파일에 쓴 뒤 os.replace 로 바꿔서, 동시에 같은 파일을 쓰더라도 깨진 파일이 보이지 않게 한다.
+def _copy_atomic(src, dst, chunk_size) :
+    tmp = f'{dst}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst :
+            shutil.copyfileobj(fsrc, fdst, chunk_size)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp) :
+            os.remove(tmp)
+
+# Linux 의 FICLONE ioctl (btrfs / XFS 등에서 내용을 공유하는 copy-on-write 복사본을 만든다.)
+_FICLONE = 0x40049409
+
+# blob 과 내용(block)만 공유하고 inode 는 따로인 파일을 만든다. (reflink)
+# 나중에 대상 파일을 덮어써도 blob 이나 다른 run 의 파일은 바뀌지 않는다. 지원하지 않으면 OSError
+def _clone_atomic(src, dst) :
+    import fcntl
+    tmp = f'{dst}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst :
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp) :
+            os.remove(tmp)
+
+def _walk(local_dir) :
+    for root, dirs, files in os.walk(local_dir) :
+        dirs.sort()
+        for name in sorted(files) :
+            path = os.path.join(root, name)
+            yield path, os.path.relpath(path, local_dir)
+
+########################################
+# artifact upload
+########################################
+# local_dir 아래 파일을 artifact 위치로 병렬 upload 한다.
+#  - 대상 : artifact_uri, 없으면 run_id 의 artifact 위치, 그것도 없으면 Config 의 artifact root
+#  - 파일은 chunk_size 단위로 읽고 써서 큰 파일도 메모리에 올리지 않는다.
+#  - local artifact root 이면 sha256 기준 content-addressed 저장소 (<root>/.mlstudio-cas) 에 읽기 전용 blob 으로 한번만 저장하고
+#    대상 경로에는 blob 의 reflink (copy-on-write 복사본) 를 만든다. 같은 내용이 이미 있으면 다시 쓰지 않는다.
+#    hard link 는 대상 파일을 덮어쓰면 blob 과 다른 run 의 파일까지 바뀌므로 쓰지 않는다.
+#    파일 시스템이 reflink 를 지원하지 않으면 (ext4 등) 저장소 없이 복사하고, 그 이유를 결과의 dedup_disabled_reason 에 남긴다.
+#  - local 이 아닌 위치 (s3 등) 는 MLflow artifact repository 로 파일별로 upload 한다. (dedup 하지 않음)
+def upload_directory(local_dir, artifact_uri=None, run_id=None, artifact_path=None, login_id='', login_pwd='',
+                     max_workers=8, chunk_size=CHUNK_SIZE, dedup=True, cas_root=None) :
+    if not os.path.isdir(local_dir) :
+        raise FileNotFoundError(f'not a directory : {local_dir}')
+
+    if artifact_uri is None :
+        if run_id is not None :
+            client = clients.get_mlflow_client(Config().get_mlflow_tracking_uri(), login_id, login_pwd)
+            artifact_uri = client.get_run(run_id).info.artifact_uri
+        else :
+            artifact_uri = Config().get_mlflow_artifact_url()
+
+    dest_root = _local_path(artifact_uri)
+    if dest_root is not None :
+        dest_root = os.path.join(dest_root, artifact_path) if artifact_path else dest_root
+        if dedup and cas_root is None :
+            cas_root = _default_cas_root(dest_root)
+        upload, state = _local_uploader(dest_root, cas_root if dedup else None, chunk_size)
+        if not dedup :
+            state['reason'] = 'dedup=False'
+    else :
+        upload = _repository_uploader(artifact_uri, artifact_path)
+        state = {'dedup': False, 'reason': f'artifact location is not local : {artifact_uri}'}
+
+    start = time.monotonic()
+    entries = list(_walk(local_dir))
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(entries) or 1))) as executor :
+        files = list(executor.map(lambda entry : _upload_one(upload, *entry), entries))
+    seconds = time.monotonic() - start
+
+    bytes_total = sum(f.size for f in files if f.status != 'failed')
+    return UploadResult(
+        files=files,
+        bytes_total=bytes_total,
+        bytes_uploaded=sum(f.size for f in files if f.status == 'uploaded'),
+        bytes_deduplicated=sum(f.size for f in files if f.status == 'deduplicated'),
+        seconds=seconds,
+        throughput=bytes_total / seconds if seconds > 0 else 0.0,
+        dedup=state['dedup'],
+        dedup_disabled_reason=state['reason'],
+    )
+
+def _upload_one(upload, path, relpath) :
+    try:
+        size = os.path.getsize(path)
+        sha256, status = upload(path, relpath)
+        return FileResult(relpath, size, sha256, status, None)
+    except Exception as e :
+        return FileResult(relpath, 0, None, 'failed', str(e))
+
+# Config 의 artifact root 아래로 upload 하면 root 에, 아니면 대상 폴더에 저장소를 둔다.
+def _default_cas_root(dest_root) :
+    root = _local_path(Config().get_mlflow_artifact_url())
+    if root is not None :
+        root = os.path.abspath(root)
+        if os.path.commonpath([root, os.path.abspath(dest_root)]) == root :
+            return os.path.join(root, CAS_DIR_NAME)
+    return os.path.join(dest_root, CAS_DIR_NAME)
+
+# upload 함수와 dedup 상태 {'dedup': 저장소 사용 여부, 'reason': 사용하지 않게 된 이유} 를 돌려준다.
+def _local_uploader(dest_root, cas_root, chunk_size) :
+    made_dirs = set()
+    lock = threading.Lock()
+    # reflink 를 지원하지 않는다는 오류가 나면 이후 파일은 저장소 없이 복사한다.
+    state = {'dedup': cas_root is not None, 'reason': None}
+
+    def makedirs(path) :
+        if path not in made_dirs :
+            os.makedirs(path, exist_ok=True)
+            with lock :
+                made_dirs.add(path)
+
+    def upload(path, relpath) :
+        dst = os.path.join(dest_root, relpath)
+        makedirs(os.path.dirname(dst))
+
+        if not state['dedup'] :
+            _copy_atomic(path, dst, chunk_size)
+            return None, 'uploaded'
+
+        sha256 = _sha256(path, chunk_size)
+        blob = os.path.join(cas_root, sha256[:2], sha256)
+        status = 'deduplicated'
+        if not os.path.exists(blob) :
+            makedirs(os.path.dirname(blob))
+            _copy_atomic(path, blob, chunk_size)
+            os.chmod(blob, 0o444)
+            status = 'uploaded'
+        try:
+            _clone_atomic(blob, dst)
+        except (OSError, ImportError) as e :
+            unsupported = isinstance(e, ImportError) or e.errno in _CLONE_UNSUPPORTED
+            if unsupported :
+                with lock :
+                    if state['dedup'] :
+                        state['dedup'] = False
+                        state['reason'] = f'reflink not supported ({e})'
+                # 이번에 만든 blob 은 쓰이지 않으므로 지운다.
+                if status == 'uploaded' :
+                    os.remove(blob)
+            # 그 외 오류 (공간 부족 등) 는 이 파일만 복사하고 다음 파일은 다시 reflink 를 시도한다.
+            _copy_atomic(path, dst, chunk_size)
+            return None, 'uploaded'
+        return sha256, status
+
+    return upload, state
+
+def _repository_uploader(artifact_uri, artifact_path) :
+    from mlflow.store.artifact.artifact_repository_registry import get_artifact_repository
+    repository = get_artifact_repository(artifact_uri)
+
+    def upload(path, relpath) :
+        subdir = os.path.dirname(relpath)
+        target = '/'.join(p for p in (artifact_path, subdir.replace(os.sep, '/')) if p) or None
+        repository.log_artifact(path, target)
+        return None, 'uploaded'
+
+    return upload
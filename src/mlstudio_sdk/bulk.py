@@ -0,0 +1,212 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from mlstudio_sdk import db
+from mlstudio_sdk import instrumentation
+from mlstudio_sdk import retry
+from mlstudio_sdk.common import bind_context
+from mlstudio_sdk.mlflow_api import AUTH_DB, TRACKING_DB, Session, _permissions_changed, _is_already_exists
+
+CREATE = 'create'
+UPDATE = 'update'
+UPSERT = 'upsert'
+DELETE = 'delete'
+
+_modes = (CREATE, UPDATE, UPSERT, DELETE)
+
+# upsert 재시도의 retry.stats() backend 이름
+PERMISSION_UPSERT = 'permission_upsert'
+
+# (사용자, experiment 또는 registered model) 한 건의 처리 결과
+#   action : 실제 수행한 작업 (create / update / delete / skip)
+#   status : ok / skipped / failed
+PermissionResult = namedtuple('PermissionResult', ['user_id', 'resource', 'permission', 'action', 'status', 'error'])
+
+########################################
+# 일괄 접근권한 관리
+########################################
+# experiment_names x user_ids 전체에 permission 을 일괄 적용한다.
+#  - experiment 이름은 한번의 조회로 id 로 바꾼다.
+#  - mode 가 upsert 이면 현재 권한을 한번에 조회하여 create/update 를 정하고, 같은 권한은 건너뛴다.
+#  - 인증 서버 호출은 max_workers 개의 thread 에서 동시에 처리한다.
+#  - upsert 는 다시 보내도 결과가 같으므로 일시적인 오류(연결 실패, timeout, 5xx)에서 재시도한다.
+@instrumentation.operation('apply_experiment_permissions')
+def apply_experiment_permissions(login_id, login_pwd, experiment_names, user_ids, permission=None, mode=UPSERT, max_workers=8) :
+    _check_mode(mode, permission)
+    experiment_names = list(dict.fromkeys(experiment_names))
+    user_ids = list(dict.fromkeys(user_ids))
+
+    experiment_ids = _resolve_experiment_ids(experiment_names)
+    current = {}
+    if mode in (UPSERT, DELETE) :
+        current = _current_experiment_permissions(user_ids, list(experiment_ids.values()))
+
+    auth_client = Session(login_id, login_pwd)._auth_client()
+    actions = {
+        CREATE: lambda experiment_id, user_id : auth_client.create_experiment_permission(experiment_id=experiment_id, username=user_id, permission=permission),
+        UPDATE: lambda experiment_id, user_id : auth_client.update_experiment_permission(experiment_id=experiment_id, username=user_id, permission=permission),
+        DELETE: lambda experiment_id, user_id : auth_client.delete_experiment_permission(experiment_id=experiment_id, username=user_id),
+    }
+
+    return _run(experiment_names, experiment_ids, user_ids, permission, mode, current, actions, max_workers)
+
+# registered_model_names x user_ids 전체에 permission 을 일괄 적용한다.
+@instrumentation.operation('apply_registered_model_permissions')
+def apply_registered_model_permissions(login_id, login_pwd, registered_model_names, user_ids, permission=None, mode=UPSERT, max_workers=8) :
+    _check_mode(mode, permission)
+    registered_model_names = list(dict.fromkeys(registered_model_names))
+    user_ids = list(dict.fromkeys(user_ids))
+
+    names = _resolve_registered_model_names(registered_model_names)
+    current = {}
+    if mode in (UPSERT, DELETE) :
+        current = _current_registered_model_permissions(user_ids, list(names.values()))
+
+    auth_client = Session(login_id, login_pwd)._auth_client()
+    actions = {
+        CREATE: lambda name, user_id : auth_client.create_registered_model_permission(name=name, username=user_id, permission=permission),
+        UPDATE: lambda name, user_id : auth_client.update_registered_model_permission(name=name, username=user_id, permission=permission),
+        DELETE: lambda name, user_id : auth_client.delete_registered_model_permission(name=name, username=user_id),
+    }
+
+    return _run(registered_model_names, names, user_ids, permission, mode, current, actions, max_workers)
+
+def _check_mode(mode, permission) :
+    if mode not in _modes :
+        raise ValueError(f'invalid mode : {mode} (use one of {_modes})')
+    if mode != DELETE and not permission :
+        raise ValueError(f'permission is required for mode {mode}')
+
+def _plan(mode, permission, current_permission) :
+    if mode == UPSERT :
+        if current_permission is None :
+            return CREATE
+        if current_permission == permission :
+            return None
+        return UPDATE
+    if mode == DELETE and current_permission is None :
+        return None
+    return mode
+
+def _run(resources, resolved, user_ids, permission, mode, current, actions, max_workers) :
+    results = [None] * (len(resources) * len(user_ids))
+    jobs = []
+
+    i = 0
+    for resource in resources :
+        key = resolved.get(resource)
+        for user_id in user_ids :
+            if key is None :
+                # cancel_* 와 같이 없는 대상의 권한 취소는 건너뛴다.
+                if mode == DELETE :
+                    results[i] = PermissionResult(user_id, resource, permission, 'skip', 'skipped', None)
+                else :
+                    results[i] = PermissionResult(user_id, resource, permission, 'skip', 'failed', f'{resource} does not exist.')
+            else :
+                action = _plan(mode, permission, current.get((user_id, key)))
+                if action is None :
+                    results[i] = PermissionResult(user_id, resource, permission, 'skip', 'skipped', None)
+                else :
+                    jobs.append((i, action, key, resource, user_id))
+            i += 1
+
+    def work(job) :
+        i, action, key, resource, user_id = job
+        try:
+            if mode == UPSERT :
+                _upsert(actions, action, key, user_id)
+            else :
+                actions[action](key, user_id)
+            return i, PermissionResult(user_id, resource, permission, action, 'ok', None)
+        except Exception as e :
+            return i, PermissionResult(user_id, resource, permission, action, 'failed', str(e))
+
+    if jobs :
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as executor :
+                for i, result in executor.map(bind_context(work), jobs) :
+                    results[i] = result
+        finally:
+            for user_id in {job[4] for job in jobs} :
+                _permissions_changed(user_id)
+
+    return results
+
+# 이미 있는 권한을 만들려고 하면 (앞선 시도가 서버에 반영된 경우 포함) update 로 바꾼다.
+def _upsert(actions, action, key, user_id) :
+    def send() :
+        try:
+            actions[action](key, user_id)
+        except Exception as e :
+            if action != CREATE or not _is_already_exists(e) :
+                raise
+            actions[UPDATE](key, user_id)
+    retry.call(PERMISSION_UPSERT, send, retry.is_transient_http_error)
+
+########################################
+# 이름 변환 / 현재 권한 조회 (한번의 query 로 처리)
+########################################
+@retry.idempotent(TRACKING_DB, retry.is_transient_db_error)
+def _resolve_experiment_ids(experiment_names) :
+    if not experiment_names :
+        return {}
+
+    sql = """
+    SELECT  name, experiment_id
+    FROM    experiments
+    WHERE   name = ANY(%s)
+    """
+
+    with db.tracking_connection() as conn :
+        rows = db.execute(conn, sql, (experiment_names,)).fetchall()
+        return {name: str(experiment_id) for name, experiment_id in rows}
+
+@retry.idempotent(TRACKING_DB, retry.is_transient_db_error)
+def _resolve_registered_model_names(registered_model_names) :
+    if not registered_model_names :
+        return {}
+
+    sql = """
+    SELECT  name
+    FROM    registered_models
+    WHERE   name = ANY(%s)
+    """
+
+    with db.tracking_connection() as conn :
+        rows = db.execute(conn, sql, (registered_model_names,)).fetchall()
+        return {name: name for name, in rows}
+
+@retry.idempotent(AUTH_DB, retry.is_transient_db_error)
+def _current_experiment_permissions(user_ids, experiment_ids) :
+    if not user_ids or not experiment_ids :
+        return {}
+
+    sql = """
+    SELECT  users.username, permissions.experiment_id, permissions.permission
+    FROM    experiment_permissions permissions
+    INNER JOIN users
+    ON      permissions.user_id = users.id
+    WHERE   users.username = ANY(%s)
+    AND     permissions.experiment_id = ANY(%s)
+    """
+
+    with db.auth_connection() as conn :
+        rows = db.execute(conn, sql, (user_ids, experiment_ids)).fetchall()
+        return {(username, experiment_id): permission for username, experiment_id, permission in rows}
+
+@retry.idempotent(AUTH_DB, retry.is_transient_db_error)
+def _current_registered_model_permissions(user_ids, names) :
+    if not user_ids or not names :
+        return {}
+
+    sql = """
+    SELECT  users.username, permissions.name, permissions.permission
+    FROM    registered_model_permissions permissions
+    INNER JOIN users
+    ON      permissions.user_id = users.id
+    WHERE   users.username = ANY(%s)
+    AND     permissions.name = ANY(%s)
+    """
+
+    with db.auth_connection() as conn :
+        rows = db.execute(conn, sql, (user_ids, names)).fetchall()
+        return {(username, name): permission for username, name, permission in rows}
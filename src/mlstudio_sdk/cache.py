@@ -0,0 +1,134 @@
+import time
+import threading
+from collections import OrderedDict
+
+# 같은 key 를 조회 중인 loader 수와, 조회 중에 무효화되었는지 여부
+class _Flight(object) :
+    __slots__ = ('loaders', 'stale')
+
+    def __init__(self) :
+        self.loaders = 0
+        self.stale = False
+
+########################################
+# TTL + LRU cache
+########################################
+# 이름 -> id/metadata 조회 결과를 잠시 보관하는 thread-safe cache
+#  - ttl 이 지난 항목은 다시 조회한다.
+#  - loader 가 None 을 돌려주면 '없음' 으로 negative_ttl 동안 보관한다. (negative caching)
+#  - max_size 를 넘으면 가장 오래 사용하지 않은 항목부터 버린다. (LRU)
+#  - 조회 중에 무효화된 key 의 조회 결과는 보관하지 않는다. (무효화 이전의 값이 다시 들어가지 않도록)
+class TTLCache(object) :
+    def __init__(self, max_size=1024, ttl=60.0, negative_ttl=10.0) :
+        if max_size < 1 :
+            raise ValueError(f'invalid cache size : {max_size}')
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._negative_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    # (찾았는지 여부, 값) 을 돌려준다. 없음으로 cache 된 항목은 (True, None) 이다.
+    def lookup(self, key) :
+        now = time.monotonic()
+        with self._lock :
+            entry = self._entries.get(key)
+            if entry is not None :
+                value, expires_at = entry
+                if expires_at > now :
+                    self._entries.move_to_end(key)
+                    if value is None :
+                        self._negative_hits += 1
+                    else :
+                        self._hits += 1
+                    return True, value
+                del self._entries[key]
+            self._misses += 1
+            return False, None
+
+    def put(self, key, value) :
+        with self._lock :
+            self._put(key, value)
+
+    def _put(self, key, value) :
+        ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0 :
+            return
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size :
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def get_or_load(self, key, loader) :
+        found, value = self.lookup(key)
+        if found :
+            return value
+
+        with self._lock :
+            flight = self._flights.get(key)
+            if flight is None or flight.stale :
+                flight = self._flights[key] = _Flight()
+            flight.loaders += 1
+
+        stored = False
+        try:
+            value = loader()
+            stored = True
+        finally:
+            with self._lock :
+                flight.loaders -= 1
+                if flight.loaders == 0 and self._flights.get(key) is flight :
+                    del self._flights[key]
+                if stored and not flight.stale :
+                    self._put(key, value)
+        return value
+
+    def invalidate(self, key) :
+        with self._lock :
+            if self._entries.pop(key, None) is not None :
+                self._invalidations += 1
+            flight = self._flights.get(key)
+            if flight is not None :
+                flight.stale = True
+
+    # predicate(key) 가 참인 항목을 모두 무효화한다.
+    def invalidate_if(self, predicate) :
+        with self._lock :
+            for key in [k for k in self._entries if predicate(k)] :
+                del self._entries[key]
+                self._invalidations += 1
+            for key, flight in self._flights.items() :
+                if predicate(key) :
+                    flight.stale = True
+
+    def clear(self) :
+        with self._lock :
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            for flight in self._flights.values() :
+                flight.stale = True
+
+    def stats(self) :
+        with self._lock :
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self._hits,
+                'negative_hits': self._negative_hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+            }
+
+    def __len__(self) :
+        with self._lock :
+            return len(self._entries)
@@ -0,0 +1,351 @@
+import time
+import weakref
+import threading
+from collections import namedtuple
+from mlstudio_sdk import db
+from mlstudio_sdk import instrumentation
+from mlstudio_sdk import permission_index
+from mlstudio_sdk import queries
+from mlstudio_sdk import retry
+
+EXPERIMENTS = 'experiments'
+REGISTERED_MODELS = 'registered_models'
+MODEL_VERSIONS = 'model_versions'
+
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+
+# 변경 한 건
+#   table  : experiments / registered_models / model_versions
+#   action : insert / update / delete
+#   key    : experiment_id, registered model 이름, (model 이름, version)
+#   row    : 컬럼 이름 -> 값 dict (delete 이면 None)
+Change = namedtuple('Change', ['table', 'action', 'key', 'row'])
+
+# 변경을 조회할 테이블
+#   key     : 행을 구분하는 컬럼
+#   mark    : high-water mark 로 사용하는 변경 시각 컬럼 (ms)
+#   deleted : (컬럼, 값) 이 행은 남아 있지만 삭제된 것으로 본다. (MLflow 는 model version 을 지울 때 stage 만 바꾼다.)
+_Table = namedtuple('_Table', ['name', 'key', 'mark', 'columns', 'deleted'])
+
+TABLES = {
+    EXPERIMENTS: _Table(EXPERIMENTS, ('experiment_id',), 'last_update_time',
+                        ('experiment_id', 'name', 'artifact_location', 'lifecycle_stage', 'creation_time', 'last_update_time'), None),
+    REGISTERED_MODELS: _Table(REGISTERED_MODELS, ('name',), 'last_updated_time',
+                              ('name', 'creation_time', 'last_updated_time', 'description'), None),
+    MODEL_VERSIONS: _Table(MODEL_VERSIONS, ('name', 'version'), 'last_updated_time',
+                           ('name', 'version', 'creation_time', 'last_updated_time', 'description', 'user_id',
+                            'current_stage', 'source', 'run_id', 'status', 'run_link'), ('current_stage', 'Deleted_Internal')),
+}
+
+CHECKPOINT_VERSION = 1
+
+# retry.stats() 의 backend 이름
+RETRY_BACKEND = 'changefeed'
+
+class _TableState(object) :
+    __slots__ = ('mark', 'known', 'visible', 'next_verify', 'verify_requested')
+
+    def __init__(self) :
+        self.mark = None            # 지금까지 본 가장 큰 변경 시각. None 이면 아직 적재하지 않음
+        self.known = {}             # key -> 변경 시각 (mirror 에 있는 행)
+        self.visible = None         # 권한으로 볼 수 있는 experiment id / model 이름 (None 이면 전체)
+        self.next_verify = 0.0
+        self.verify_requested = False
+
+_feeds = weakref.WeakSet()
+
+########################################
+# 변경 조회
+########################################
+# experiment / registered model / model version 의 변경분만 조회하여 local mirror 를 유지한다.
+#   feed = ChangeFeed('user1')
+#   for change in feed.poll() :       # 처음에는 볼 수 있는 행 전체가 insert 로 온다.
+#       mirror.apply(change)
+#  - 테이블마다 변경 시각(last_update_time / last_updated_time)의 high-water mark 를 기억하고
+#    그 이후 바뀐 행만 읽으므로 조회 비용은 전체 크기가 아니라 변경량에 비례한다.
+#  - 같은 시각에 여러 행이 바뀌거나 늦게 commit 된 행을 놓치지 않도록 mark 보다 overlap_ms 앞부터 다시 읽고,
+#    이미 본 (key, 변경 시각) 은 건너뛴다.
+#  - 실제로 지워진 행(registered model 삭제, 이름 변경, experiment 영구 삭제)은 변경 시각으로 알 수 없으므로
+#    verify_interval 초마다 key 와 변경 시각만 읽어 비교한다. 이 SDK 로 지운 경우에는 다음 poll 에서 바로 비교한다.
+#  - user_name 을 주면 get_experiments_by_permission / get_registered_model_by_permission 과 같이 권한이 있는 행만
+#    돌려주며, 권한이 생기거나 없어진 행도 insert / delete 로 돌려준다.
+#  - checkpoint() 를 저장해 두었다가 ChangeFeed(checkpoint=...) 로 이어서 조회할 수 있다.
+class ChangeFeed(object) :
+    def __init__(self, user_name=None, tables=(EXPERIMENTS, REGISTERED_MODELS, MODEL_VERSIONS),
+                 overlap_ms=5000, verify_interval=60.0, checkpoint=None) :
+        unknown = [t for t in tables if t not in TABLES]
+        if unknown :
+            raise ValueError(f'unknown tables : {unknown} (use {tuple(TABLES)})')
+
+        self.user_name = user_name
+        self.tables = tuple(tables)
+        self.overlap_ms = overlap_ms
+        self.verify_interval = verify_interval
+        self.polls = 0
+        self.verifies = 0
+
+        self._state = {t: _TableState() for t in self.tables}
+        self._lock = threading.Lock()
+        if checkpoint is not None :
+            self._restore(checkpoint)
+        _feeds.add(self)
+
+    # 마지막 poll 이후의 변경 목록. 조회 중 오류가 나면 상태는 그대로이므로 다시 poll 하면 된다.
+    @instrumentation.operation('changefeed.poll')
+    def poll(self) :
+        with self._lock :
+            return retry.call(RETRY_BACKEND, self._poll, retry.is_transient_db_error)
+
+    def _poll(self) :
+        visible = self._resolve_visible()
+        changes = []
+        updates = {}
+        verified = set()
+        now = time.monotonic()
+
+        with db.tracking_connection() as conn :
+            for name in self.tables :
+                table = TABLES[name]
+                state = self._state[name]
+                pending = updates[name] = {}
+                table_visible = visible.get(name)
+
+                if state.mark is None :
+                    self._load(conn, table, table_visible, changes, pending)
+                    verified.add(name)
+                else :
+                    self._visibility_changes(conn, table, state, table_visible, changes, pending)
+                    self._incremental(conn, table, state, table_visible, changes, pending)
+                    if state.verify_requested or now >= state.next_verify :
+                        self._verify(conn, table, state, table_visible, changes, pending)
+                        verified.add(name)
+
+        # 모두 조회한 뒤에 상태를 바꾼다.
+        for name in self.tables :
+            state = self._state[name]
+            for key, stamp in updates[name].items() :
+                if stamp is None :
+                    state.known.pop(key, None)
+                else :
+                    state.known[key] = stamp
+                    state.mark = stamp if state.mark is None else max(state.mark, stamp)
+            if state.mark is None :
+                state.mark = 0
+            state.visible = visible.get(name)
+            if name in verified :
+                state.verify_requested = False
+                state.next_verify = now + self.verify_interval
+                self.verifies += 1
+        self.polls += 1
+        return changes
+
+    ########################################
+    # 권한
+    ########################################
+    # 테이블별로 볼 수 있는 experiment id / model 이름 집합 (None 이면 전체)
+    def _resolve_visible(self) :
+        if self.user_name is None :
+            return {}
+
+        with db.auth_connection() as conn :
+            visible = {}
+            if EXPERIMENTS in self.tables :
+                r = queries.execute(conn, queries.RESOLVE_EXPERIMENT_PERMISSIONS, (self.user_name,)).fetchone()
+                is_admin, ids = (bool(r[0]), r[1]) if r else (False, [])
+                visible[EXPERIMENTS] = None if is_admin else frozenset(int(i) for i in ids if str(i).isdigit())
+            if REGISTERED_MODELS in self.tables or MODEL_VERSIONS in self.tables :
+                r = queries.execute(conn, queries.RESOLVE_REGISTERED_MODEL_PERMISSIONS, (self.user_name,)).fetchone()
+                is_admin, names = (bool(r[0]), r[1]) if r else (False, [])
+                names = None if is_admin else frozenset(names)
+                visible[REGISTERED_MODELS] = visible[MODEL_VERSIONS] = names
+        return visible
+
+    # 권한이 생긴 행은 insert, 없어진 행은 delete
+    def _visibility_changes(self, conn, table, state, visible, changes, pending) :
+        before = state.visible
+        if visible == before :
+            return
+
+        # 권한 단위는 experiment id / model 이름 (model version 은 model 이름)
+        if visible is not None :
+            for key in state.known :
+                scope = key[0] if len(table.key) > 1 else key
+                if scope not in visible :
+                    changes.append(Change(table.name, DELETE, key, None))
+                    pending[key] = None
+
+        # 전체를 볼 수 있게 되면 (관리자) 전체를 다시 비교한다.
+        if visible is None :
+            state.verify_requested = True
+            return
+        added = visible - (before or frozenset())
+        if added :
+            for row in _select(conn, table, _scope_where(table, added)) :
+                self._apply(table, state, row, changes, pending)
+
+    ########################################
+    # 조회
+    ########################################
+    # 처음 적재 : 볼 수 있는 행 전체 (삭제 상태인 행 제외)
+    def _load(self, conn, table, visible, changes, pending) :
+        if visible is not None and not visible :
+            return
+        for row in _select(conn, table, _scope_where(table, visible)) :
+            if _is_deleted(table, row) :
+                continue
+            key = _key(table, row)
+            changes.append(Change(table.name, INSERT, key, row))
+            pending[key] = _stamp(table, row)
+
+    # high-water mark 이후 (overlap_ms 만큼 앞부터) 바뀐 행
+    def _incremental(self, conn, table, state, visible, changes, pending) :
+        if visible is not None and not visible :
+            return
+        where, params = _scope_where(table, visible)
+        where.append(f'{table.mark} >= %s')
+        params.append(state.mark - self.overlap_ms)
+        for row in _select(conn, table, (where, params), order_by=table.mark) :
+            self._apply(table, state, row, changes, pending)
+
+    # key 와 변경 시각만 읽어 mirror 와 비교한다. 다른 행만 전체 컬럼을 다시 읽는다.
+    def _verify(self, conn, table, state, visible, changes, pending) :
+        current = {}
+        if visible is None or visible :
+            where, params = _scope_where(table, visible)
+            columns = table.key + (table.mark,) + ((table.deleted[0],) if table.deleted else ())
+            sql = f"SELECT {', '.join(columns)} FROM {table.name}" + (f" WHERE {' AND '.join(where)}" if where else '')
+            for r in db.execute(conn, sql, params).fetchall() :
+                if table.deleted and r[-1] == table.deleted[1] :
+                    continue
+                current[r[0] if len(table.key) == 1 else tuple(r[:len(table.key)])] = r[len(table.key)] or 0
+
+        known = dict(state.known)
+        known.update(pending)
+        stale = []
+        for key, stamp in known.items() :
+            if stamp is None :
+                continue
+            if key not in current :
+                changes.append(Change(table.name, DELETE, key, None))
+                pending[key] = None
+            elif current[key] != stamp :
+                stale.append(key)
+        stale.extend(key for key in current if known.get(key) is None)
+
+        if stale :
+            for row in _select(conn, table, _keys_where(table, stale)) :
+                self._apply(table, state, row, changes, pending)
+
+    # 행 하나를 mirror 와 비교하여 변경으로 기록한다.
+    def _apply(self, table, state, row, changes, pending) :
+        key = _key(table, row)
+        stamp = _stamp(table, row)
+        before = pending[key] if key in pending else state.known.get(key)
+
+        if _is_deleted(table, row) :
+            if before is not None :
+                changes.append(Change(table.name, DELETE, key, None))
+                pending[key] = None
+            return
+        if before == stamp :
+            return
+        changes.append(Change(table.name, INSERT if before is None else UPDATE, key, row))
+        pending[key] = stamp
+
+    ########################################
+    # 상태 저장 / 복원
+    ########################################
+    # 이어서 조회하기 위한 상태 (JSON 으로 저장할 수 있는 dict)
+    def checkpoint(self) :
+        with self._lock :
+            return {
+                'version': CHECKPOINT_VERSION,
+                'user_name': self.user_name,
+                'tables': {name: {
+                    'mark': state.mark,
+                    'known': [(list(key) if isinstance(key, tuple) else [key]) + [stamp] for key, stamp in state.known.items()],
+                    'visible': None if state.visible is None else sorted(state.visible),
+                } for name, state in self._state.items()},
+            }
+
+    def _restore(self, checkpoint) :
+        if checkpoint.get('version') != CHECKPOINT_VERSION :
+            raise ValueError(f"unsupported checkpoint version : {checkpoint.get('version')}")
+        if checkpoint.get('user_name') != self.user_name :
+            raise ValueError(f"checkpoint is for user {checkpoint.get('user_name')!r}, not {self.user_name!r}")
+
+        for name, saved in checkpoint['tables'].items() :
+            if name not in self._state :
+                continue
+            state = self._state[name]
+            size = len(TABLES[name].key)
+            state.mark = saved['mark']
+            state.known = {(tuple(k[:size]) if size > 1 else k[0]): k[size] for k in saved['known']}
+            state.visible = None if saved['visible'] is None else frozenset(saved['visible'])
+            # 저장한 뒤에 지워진 행이 있을 수 있으므로 처음 poll 에서 비교한다.
+            state.verify_requested = True
+
+    # 다음 poll 에서 지워진 행을 비교한다.
+    def request_verify(self, table=None) :
+        for name, state in self._state.items() :
+            if table is None or name == table :
+                state.verify_requested = True
+
+    def stats(self) :
+        return {
+            'polls': self.polls,
+            'verifies': self.verifies,
+            'tables': {name: {'rows': len(state.known), 'mark': state.mark} for name, state in self._state.items()},
+        }
+
+########################################
+# SQL
+########################################
+def _key(table, row) :
+    if len(table.key) == 1 :
+        return row[table.key[0]]
+    return tuple(row[c] for c in table.key)
+
+def _stamp(table, row) :
+    return row[table.mark] or 0
+
+def _is_deleted(table, row) :
+    return table.deleted is not None and row[table.deleted[0]] == table.deleted[1]
+
+# 권한 범위 조건 (visible 이 None 이면 전체)
+def _scope_where(table, visible) :
+    if visible is None :
+        return [], []
+    column = table.key[0]
+    if column == 'experiment_id' :
+        return ['experiment_id = ANY(%s::integer[])'], [sorted(visible)]
+    return [f'{column} = ANY(%s::varchar[])'], [sorted(visible)]
+
+def _keys_where(table, keys) :
+    if len(table.key) == 1 :
+        return _scope_where(table, keys)
+    columns = ', '.join(table.key)
+    return [f'({columns}) IN (SELECT * FROM UNNEST(%s::varchar[], %s::integer[]))'], [[k[0] for k in keys], [k[1] for k in keys]]
+
+def _select(conn, table, where_params, order_by=None) :
+    where, params = where_params
+    sql = f"SELECT {', '.join(table.columns)} FROM {table.name}"
+    if where :
+        sql += f" WHERE {' AND '.join(where)}"
+    if order_by :
+        sql += f' ORDER BY {order_by}'
+    cursor = db.execute(conn, sql, params)
+    with instrumentation.phase(instrumentation.MATERIALIZE) :
+        return [dict(zip(table.columns, row)) for row in cursor.fetchall()]
+
+########################################
+# SDK 변경 알림
+########################################
+# 이 SDK 로 experiment / registered model 을 지우면 살아있는 모든 ChangeFeed 가 다음 poll 에서 비교한다.
+def resource_deleted(resource_type=permission_index.EXPERIMENT) :
+    tables = (EXPERIMENTS,) if resource_type == permission_index.EXPERIMENT else (REGISTERED_MODELS, MODEL_VERSIONS)
+    for feed in list(_feeds) :
+        for table in tables :
+            feed.request_verify(table)
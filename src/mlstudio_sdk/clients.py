@@ -0,0 +1,255 @@
+import json
+import threading
+from collections import OrderedDict
+import mlflow
+from mlflow import MlflowClient
+from mlflow.server.auth.client import AuthServiceClient
+from mlflow.exceptions import RestException
+from mlflow.protos.databricks_pb2 import ENDPOINT_NOT_FOUND, ErrorCode
+from mlflow.store.tracking.rest_store import RestStore as TrackingRestStore, _METHOD_TO_INFO
+from mlflow.store.model_registry.rest_store import RestStore as RegistryRestStore
+from mlflow.tracking._tracking_service.client import TrackingServiceClient
+from mlflow.tracking._model_registry.client import ModelRegistryClient
+from mlflow.utils.credentials import get_default_host_creds
+from mlflow.utils.proto_json_utils import parse_dict
+from mlflow.utils.rest_utils import http_request, verify_rest_response
+from mlstudio_sdk import instrumentation, retry
+from mlstudio_sdk.config import Config
+
+MLFLOW_CLIENT = 'mlflow'
+AUTH_CLIENT = 'auth'
+
+# MlflowClient 의 private 속성(_tracking_client, _registry_client_lazy)과 RestStore._call_endpoint 를 바꿔 쓰므로
+# 확인한 MLflow 버전 [이상, 미만) 에서만 로그인 정보가 고정된 client 를 만든다.
+SUPPORTED_MLFLOW_VERSIONS = ((2, 9), (3, 0))
+
+class UnsupportedMlflowVersion(Exception) :
+    pass
+
+def _is_rest_uri(tracking_uri) :
+    return tracking_uri.startswith('http://') or tracking_uri.startswith('https://')
+
+# 환경변수(MLFLOW_TRACKING_USERNAME/PASSWORD) 대신 주어진 로그인 정보를 사용하는 host creds 를 만든다.
+# TLS 등 나머지 설정은 MLflow 기본값(환경변수)을 그대로 따른다.
+def _host_creds_provider(tracking_uri, login_id, login_pwd) :
+    def provider() :
+        creds = get_default_host_creds(tracking_uri)
+        if login_id :
+            creds.username = login_id
+            creds.password = login_pwd
+        return creds
+    return provider
+
+########################################
+# REST 요청
+########################################
+# 다시 보내도 결과가 같은 요청
+_IDEMPOTENT_METHODS = ('GET', 'PATCH')
+_READ_API_PREFIXES = ('Get', 'Search', 'List')
+
+# REST 요청 한번을 보내고 응답을 확인한다. (instrumentation 에 REST 왕복으로 기록, bytes 는 응답 body 크기)
+#  - MLflow 의 자체 재시도는 끄고(max_retries=0) retry.call 로 deadline / 재시도 / 서버 별 circuit breaker 를 적용한다.
+#  - 멱등인 요청은 모든 일시적 오류에서, 아닌 요청(POST, DELETE)은 서버에 닿지 않은 연결 오류에서만 다시 보낸다.
+def _send(host_creds, endpoint, method, idempotent=None, **kwargs) :
+    if idempotent is None :
+        idempotent = method in _IDEMPOTENT_METHODS
+
+    def send() :
+        with instrumentation.phase(instrumentation.REST) as p :
+            response = http_request(host_creds, endpoint, method, max_retries=0, timeout=retry.http_timeout(), **kwargs)
+            response = verify_rest_response(response, endpoint)
+            p.bytes = len(response.content)
+        return response
+
+    return retry.call(f'http:{host_creds.host}', send, retry.is_transient_http_error,
+                      None if idempotent else retry.is_connect_error)
+
+# mlflow.utils.rest_utils.call_endpoint 와 같지만 _send 로 보낸다.
+def _call_endpoint(host_creds, endpoint, method, json_body, response_proto, idempotent=None, extra_headers=None) :
+    body = json.loads(json_body) if json_body else None
+    kwargs = {'params': body} if method == 'GET' else {'json': body}
+    if extra_headers is not None :
+        kwargs['extra_headers'] = extra_headers
+    response = _send(host_creds, endpoint, method, idempotent, **kwargs)
+    parse_dict(js_dict=json.loads(response.text), message=response_proto)
+    return response_proto
+
+# 조회 API 는 POST 라도 (SearchExperiments 등) 다시 보내도 안전하다.
+def _is_read_api(api, method) :
+    return method in _IDEMPOTENT_METHODS or api.__name__.startswith(_READ_API_PREFIXES)
+
+########################################
+# 로그인 정보를 직접 가지는 client
+########################################
+class CredentialAuthServiceClient(AuthServiceClient) :
+    def __init__(self, tracking_uri, login_id='', login_pwd='') :
+        super().__init__(tracking_uri)
+        self._get_host_creds = _host_creds_provider(tracking_uri, login_id, login_pwd)
+
+    def _request(self, endpoint, method, **kwargs) :
+        return _send(self._get_host_creds(), endpoint, method, **kwargs).json()
+
+# REST 호출을 _send 로 보내는 store
+class _TrackingRestStore(TrackingRestStore) :
+    def _call_endpoint(self, api, json_body, endpoint=None) :
+        default_endpoint, method = _METHOD_TO_INFO[api]
+        return _call_endpoint(self.get_host_creds(), endpoint or default_endpoint, method, json_body, api.Response(),
+                              _is_read_api(api, method))
+
+class _RegistryRestStore(RegistryRestStore) :
+    def _call_endpoint(self, api, json_body, call_all_endpoints=False, extra_headers=None) :
+        response_proto = self._get_response_from_method(api)
+        if call_all_endpoints :
+            endpoints = self._get_all_endpoints_from_method(api)
+        else :
+            endpoints = [self._get_endpoint_from_method(api)]
+        # 서버 버전에 따라 없는 endpoint 가 있으면 다음 endpoint 로 시도한다. (mlflow.utils.rest_utils.call_endpoints)
+        for i, (endpoint, method) in enumerate(endpoints) :
+            try:
+                return _call_endpoint(self.get_host_creds(), endpoint, method, json_body, response_proto,
+                                      _is_read_api(api, method), extra_headers)
+            except RestException as e :
+                if e.error_code != ErrorCode.Name(ENDPOINT_NOT_FOUND) or i == len(endpoints) - 1 :
+                    raise
+
+class _CredentialTrackingServiceClient(TrackingServiceClient) :
+    def __init__(self, tracking_uri, get_host_creds) :
+        self._store = _TrackingRestStore(get_host_creds)
+        super().__init__(tracking_uri)
+
+    @property
+    def store(self) :
+        return self._store
+
+class _CredentialModelRegistryClient(ModelRegistryClient) :
+    def __init__(self, registry_uri, tracking_uri, get_host_creds) :
+        self._store = _RegistryRestStore(get_host_creds)
+        super().__init__(registry_uri, tracking_uri)
+
+    @property
+    def store(self) :
+        return self._store
+
+def _mlflow_version(version) :
+    return tuple(int(part) for part in version.split('.')[:2] if part.isdigit())
+
+def _check_mlflow_version(version=None) :
+    version = version or mlflow.__version__
+    low, high = SUPPORTED_MLFLOW_VERSIONS
+    if not low <= _mlflow_version(version) < high :
+        raise UnsupportedMlflowVersion(f'mlflow {version} is not supported '
+                                       f"(use mlflow>={'.'.join(map(str, low))},<{'.'.join(map(str, high))})")
+
+def _build_mlflow_client(tracking_uri, login_id='', login_pwd='') :
+    client = MlflowClient(tracking_uri=tracking_uri)
+    if _is_rest_uri(tracking_uri) :
+        # MlflowClient 는 store 를 만들 때 항상 환경변수의 로그인 정보를 읽으므로
+        # tracking/registry client 를 로그인 정보가 고정된 client 로 바꿔 끼운다.
+        # (로그인 정보가 없으면 환경변수를 그대로 사용하며, REST 호출 기록과 재시도를 위해 항상 바꿔 끼운다.)
+        _check_mlflow_version()
+        get_host_creds = _host_creds_provider(tracking_uri, login_id, login_pwd)
+        tracking_client = _CredentialTrackingServiceClient(tracking_uri, get_host_creds)
+        registry_client = _CredentialModelRegistryClient(tracking_uri, tracking_uri, get_host_creds)
+        client._tracking_client = tracking_client
+        client._registry_client_lazy = registry_client
+        # 속성 이름이 바뀌면 환경변수의 로그인 정보로 요청하게 되므로 바꿔 끼운 client 를 실제로 사용하는지 확인한다.
+        if client._get_registry_client() is not registry_client or client._tracking_client is not tracking_client :
+            raise UnsupportedMlflowVersion(f'mlflow {mlflow.__version__} MlflowClient internals changed')
+    else :
+        instrumentation.install_sqlalchemy_hooks()
+    return client
+
+def _build_auth_client(tracking_uri, login_id='', login_pwd='') :
+    # get_app_client("basic-auth", ...) 도 AuthServiceClient 를 돌려준다.
+    return CredentialAuthServiceClient(tracking_uri, login_id, login_pwd)
+
+_builders = {
+    MLFLOW_CLIENT: _build_mlflow_client,
+    AUTH_CLIENT: _build_auth_client,
+}
+
+def _close_client(client) :
+    # SQL 저장소를 사용하는 MlflowClient 는 SQLAlchemy engine 의 연결을 정리한다.
+    if isinstance(client, MlflowClient) :
+        store = client._tracking_client.store
+        engine = getattr(store, 'engine', None)
+        if engine is not None :
+            engine.dispose()
+
+########################################
+# client registry
+########################################
+# (client 종류, tracking uri, 로그인 정보) 별로 client 를 한번만 만들어 재사용한다.
+#  - client 는 처음 요청될 때 만들어지며, 같은 key 를 동시에 요청해도 한번만 만든다.
+#  - max_size 를 넘으면 가장 오래 사용하지 않은 client 부터 정리한다. (LRU)
+class ClientRegistry(object) :
+    def __init__(self, max_size=32) :
+        if max_size < 1 :
+            raise ValueError(f'invalid registry size : {max_size}')
+
+        self.max_size = max_size
+        self._clients = OrderedDict()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind, tracking_uri, login_id='', login_pwd='') :
+        key = (kind, tracking_uri, login_id or '', login_pwd or '')
+
+        with self._lock :
+            client = self._clients.get(key)
+            if client is not None :
+                self._clients.move_to_end(key)
+                return client
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock :
+            with self._lock :
+                client = self._clients.get(key)
+                if client is not None :
+                    self._clients.move_to_end(key)
+                    return client
+
+            client = _builders[kind](tracking_uri, login_id, login_pwd)
+
+            evicted = []
+            with self._lock :
+                self._clients[key] = client
+                self._key_locks.pop(key, None)
+                while len(self._clients) > self.max_size :
+                    evicted.append(self._clients.popitem(last=False)[1])
+
+        for c in evicted :
+            _close_client(c)
+
+        return client
+
+    def close(self) :
+        with self._lock :
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for c in clients :
+            _close_client(c)
+
+    def __len__(self) :
+        with self._lock :
+            return len(self._clients)
+
+_registry = ClientRegistry()
+
+def get_mlflow_client(tracking_uri, login_id='', login_pwd='') :
+    # SQL 저장소는 로그인 정보를 사용하지 않으므로 모든 사용자가 같은 client 를 공유한다.
+    if not _is_rest_uri(tracking_uri) :
+        login_id = login_pwd = ''
+    return _registry.get(MLFLOW_CLIENT, tracking_uri, login_id, login_pwd)
+
+def get_auth_client(tracking_uri, login_id='', login_pwd='') :
+    return _registry.get(AUTH_CLIENT, tracking_uri, login_id, login_pwd)
+
+def close() :
+    _registry.close()
+
+def _on_config_reload(old, new) :
+    if old.mlflow_tracking_uri != new.mlflow_tracking_uri or old.mlflow_server_url != new.mlflow_server_url :
+        close()
+
+Config.add_reload_listener(_on_config_reload)
@@ -1,3 +1,12 @@
+import threading
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import contextvars
+except ImportError :    # python 3.6
+    contextvars = None
+
 class SingletonType(type):
     def __call__(cls, *args, **kwargs):
         try:
@@ -5,3 +14,107 @@ class SingletonType(type):
         except AttributeError:
             cls.__instance = super(SingletonType, cls).__call__(*args, **kwargs)
             return cls.__instance
+
+class _ThreadLocalVar(threading.local) :
+    def __init__(self, default) :
+        self.value = default
+
+    def get(self) :
+        return self.value
+
+    def set(self, value) :
+        old, self.value = self.value, value
+        return old
+
+    def reset(self, token) :
+        self.value = token
+
+# thread / asyncio task 별 값 (contextvars.ContextVar). python 3.6 에서는 thread 별 값으로 대신한다.
+def context_var(name, default=None) :
+    if contextvars is not None :
+        return contextvars.ContextVar(name, default=default)
+    return _ThreadLocalVar(default)
+
+# 호출한 thread 의 context (instrumentation 작업, deadline 등) 안에서 실행되도록 func 를 감싼다.
+# thread pool 에 넘기는 함수에 사용한다.
+def bind_context(func) :
+    if contextvars is None :
+        return func
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs : context.copy().run(func, *args, **kwargs)
+
+# 처음 속성에 접근할 때 import 하는 module 대리 객체
+# mlflow, psycopg2 처럼 import 가 느린 module 을 package import 시점에 불러오지 않기 위해 사용한다.
+#   psycopg2 = LazyModule('psycopg2')
+#   psycopg2.extras.RealDictCursor   # 이 때 psycopg2, psycopg2.extras 를 import 한다.
+class LazyModule(object) :
+    def __init__(self, name) :
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self) :
+        module = self.__dict__['_module']
+        if module is None :
+            with self.__dict__['_lock'] :
+                module = self.__dict__['_module']
+                if module is None :
+                    module = importlib.import_module(self._name)
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr) :
+        module = self._load()
+        try:
+            return getattr(module, attr)
+        except AttributeError :
+            # 아직 import 되지 않은 하위 module (예: psycopg2.extras)
+            try:
+                return importlib.import_module(f'{self._name}.{attr}')
+            except ImportError :
+                raise AttributeError(f"module '{self._name}' has no attribute '{attr}'")
+
+    def __repr__(self) :
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+# page_token 으로 이어지는 조회 결과를 끝까지 하나씩 돌려주는 generator
+#  - fetch_page(page_token, max_results) 는 (items, next_page_token) 을 돌려준다.
+#  - prefetch 이면 현재 page 를 소비하는 동안 다음 page 를 background thread 에서 미리 가져온다.
+#  - max_results 를 주면 그 개수까지만 가져온다.
+def iter_pages(fetch_page, page_size, max_results=None, prefetch=True) :
+    def request_size(fetched) :
+        if max_results is None :
+            return page_size
+        return min(page_size, max_results - fetched)
+
+    if max_results is not None and max_results <= 0 :
+        return
+
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    future = None
+    try:
+        items, token = fetch_page(None, request_size(0))
+        fetched = len(items)
+        while True :
+            size = request_size(fetched)
+            has_next = bool(token) and size > 0
+            if has_next and executor is not None :
+                future = executor.submit(fetch_page, token, size)
+
+            for item in items :
+                yield item
+
+            if not has_next :
+                return
+            if future is not None :
+                items, token = future.result()
+                future = None
+            else :
+                items, token = fetch_page(token, size)
+            fetched += len(items)
+    finally:
+        if future is not None :
+            future.cancel()
+        if executor is not None :
+            executor.shutdown(wait=False)
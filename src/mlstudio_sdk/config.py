@@ -1,43 +1,301 @@
 import os
 import json
+import time
+import signal
+import threading
+from collections import namedtuple
+from urllib.parse import quote
 from mlstudio_sdk.common import SingletonType
 
+class ConfigError(Exception) :
+    pass
+
+# 검증을 마친 설정 값. 접속 URI 등은 읽을 때 미리 만들어 둔다.
+Settings = namedtuple('Settings', [
+    'raw',
+    'mlflow_tracking_uri',
+    'mlflow_tracking_auth_uri',
+    'mlflow_server_url',
+    'mlflow_artifact_url',
+    'db_pool_options',
+    'mlflow_tracking_replica_uris',
+    'mlflow_tracking_auth_replica_uris',
+    'db_replica_options',
+    'retry_options',
+])
+
+REPLICA_POLICIES = ('round_robin', 'least_latency')
+
+def _require(raw, *path) :
+    value = raw
+    for i, key in enumerate(path) :
+        if not isinstance(value, dict) or key not in value :
+            raise ConfigError(f"missing config value : {'.'.join(path[:i + 1])}")
+        value = value[key]
+    if value is None or value == '' :
+        raise ConfigError(f"empty config value : {'.'.join(path)}")
+    return value
+
+def _postgres_uri(user_id, user_pwd, ip, port, dbname) :
+    return f"postgresql://{quote(str(user_id), safe='')}:{quote(str(user_pwd), safe='')}@{ip}:{port}/{dbname}"
+
+def _pool_options(raw) :
+    pool = raw['db'].get('pool', {})
+    if not isinstance(pool, dict) :
+        raise ConfigError('db.pool must be an object')
+
+    try:
+        options = {
+            'min_size': int(pool.get('min_size', 1)),
+            'max_size': int(pool.get('max_size', 10)),
+            'timeout': float(pool.get('timeout', 30)),
+            'check_interval': float(pool.get('check_interval', 30)),
+        }
+    except (TypeError, ValueError) as e :
+        raise ConfigError(f'invalid db.pool value : {e}')
+
+    if options['min_size'] < 0 or options['max_size'] < 1 or options['min_size'] > options['max_size'] :
+        raise ConfigError(f"invalid db.pool size : min_size={options['min_size']}, max_size={options['max_size']}")
+    return options
+
+# 읽기 전용 replica 목록. primary 와 같은 사용자, database 이름을 사용한다.
+#   "replicas": [{"ip": "10.0.0.2", "port": 5432}, ...]
+def _replicas(raw) :
+    replicas = raw['db'].get('replicas', [])
+    if not isinstance(replicas, list) :
+        raise ConfigError('db.replicas must be a list')
+
+    hosts = []
+    for i, replica in enumerate(replicas) :
+        ip = _require(replica, 'ip') if isinstance(replica, dict) else None
+        port = replica.get('port', 5432) if isinstance(replica, dict) else None
+        if ip is None or not str(port).isdigit() :
+            raise ConfigError(f'invalid config value : db.replicas[{i}]')
+        hosts.append((ip, port))
+    return hosts
+
+#   "replica_options": {"policy": "round_robin" | "least_latency", "max_lag": 10, "check_interval": 5, "retry_after": 30}
+def _replica_options(raw) :
+    options = raw['db'].get('replica_options', {})
+    if not isinstance(options, dict) :
+        raise ConfigError('db.replica_options must be an object')
+
+    try:
+        result = {
+            'policy': options.get('policy', 'round_robin'),
+            'max_lag': float(options.get('max_lag', 10)),
+            'check_interval': float(options.get('check_interval', 5)),
+            'retry_after': float(options.get('retry_after', 30)),
+        }
+    except (TypeError, ValueError) as e :
+        raise ConfigError(f'invalid db.replica_options value : {e}')
+
+    if result['policy'] not in REPLICA_POLICIES :
+        raise ConfigError(f"invalid db.replica_options.policy : {result['policy']} (use one of {REPLICA_POLICIES})")
+    return result
+
+# DB / REST 호출의 deadline, 재시도, circuit breaker 설정 (retry module 참고)
+#   "retry": {"deadline": 30, "connect_timeout": 5, "max_attempts": 3, "base_delay": 0.05, "max_delay": 1.0,
+#             "failure_threshold": 5, "reset_timeout": 10}
+RETRY_DEFAULTS = {
+    'deadline': 30.0,
+    'connect_timeout': 5.0,
+    'max_attempts': 3,
+    'base_delay': 0.05,
+    'max_delay': 1.0,
+    'failure_threshold': 5,
+    'reset_timeout': 10.0,
+}
+
+def _retry_options(raw) :
+    options = raw.get('retry', {})
+    if not isinstance(options, dict) :
+        raise ConfigError('retry must be an object')
+
+    try:
+        result = {key: type(default)(options.get(key, default)) for key, default in RETRY_DEFAULTS.items()}
+    except (TypeError, ValueError) as e :
+        raise ConfigError(f'invalid retry value : {e}')
+
+    if result['max_attempts'] < 1 or result['failure_threshold'] < 1 :
+        raise ConfigError(f"invalid retry value : max_attempts={result['max_attempts']}, failure_threshold={result['failure_threshold']}")
+    if min(result['deadline'], result['connect_timeout']) <= 0 or min(result['base_delay'], result['max_delay'], result['reset_timeout']) < 0 :
+        raise ConfigError('invalid retry value : timeouts must be positive and delays must not be negative')
+    return result
+
+# mlstudio-config.json 내용을 검증하여 Settings 로 만든다.
+def parse_settings(raw) :
+    if not isinstance(raw, dict) :
+        raise ConfigError('config must be a JSON object')
+
+    ip = _require(raw, 'db', 'cluster', 'ip')
+    port = _require(raw, 'db', 'cluster', 'port')
+    if not str(port).isdigit() :
+        raise ConfigError(f'invalid config value : db.cluster.port={port}')
+    user_id = _require(raw, 'db', 'user', 'mlflow', 'id')
+    user_pwd = _require(raw, 'db', 'user', 'mlflow', 'password')
+    tracking_db = _require(raw, 'db', 'database', 'mlflow', 'tracking')
+    auth_db = _require(raw, 'db', 'database', 'mlflow', 'auth')
+    replicas = _replicas(raw)
+
+    return Settings(
+        raw=raw,
+        mlflow_tracking_uri=_postgres_uri(user_id, user_pwd, ip, port, tracking_db),
+        mlflow_tracking_auth_uri=_postgres_uri(user_id, user_pwd, ip, port, auth_db),
+        mlflow_server_url=_require(raw, 'mlflow', 'server_url'),
+        mlflow_artifact_url=_require(raw, 'mlflow', 'artifact_root'),
+        db_pool_options=_pool_options(raw),
+        mlflow_tracking_replica_uris=tuple(_postgres_uri(user_id, user_pwd, r_ip, r_port, tracking_db) for r_ip, r_port in replicas),
+        mlflow_tracking_auth_replica_uris=tuple(_postgres_uri(user_id, user_pwd, r_ip, r_port, auth_db) for r_ip, r_port in replicas),
+        db_replica_options=_replica_options(raw),
+        retry_options=_retry_options(raw),
+    )
+
+########################################
+# 설정
+########################################
+# mlstudio-config.json 을 읽어 검증한 Settings 를 제공한다.
+#  - 처음 사용할 때 파일을 읽는다.
+#  - reload_interval 초마다 파일 mtime 을 확인하여 바뀌었으면 다시 읽고 Settings 를 통째로 바꾼다.
+#    (install_reload_signal() 을 호출하면 SIGHUP 을 받았을 때도 다시 읽는다.)
+#  - 다시 읽은 파일이 잘못되었으면 기존 설정을 유지하고 last_error 에 기록한다.
+#  - 설정이 바뀌면 add_reload_listener() 로 등록한 함수를 호출한다. (connection pool, client 정리 등)
+#  - 값을 읽을 때는 lock 을 잡지 않는다.
 class Config(object, metaclass=SingletonType) :
+    _reload_listeners = []
+
     def __init__(self):
-        self.config = None
+        self._settings = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._reload_requested = False
+        self._lock = threading.RLock()
+        self.reload_interval = 5.0
+        self.last_error = None
         self.config_path = '/opt/mlstudio/config/'
         if 'CONF_PATH' in os.environ:
-            self.config_path = os.environ['CONF_PATH']        
+            self.config_path = os.environ['CONF_PATH']
         self.config_path = os.path.join(self.config_path, 'mlstudio-config.json')
-        self.load()
 
+    @property
+    def settings(self) :
+        settings = self._settings
+        if settings is None or time.monotonic() >= self._next_check :
+            settings = self._check()
+        return settings
+
+    @property
+    def config(self) :
+        return self.settings.raw
+
+    # 설정을 바꾸는 것은 lock 안에서 하고, reload listener (pool, client 정리 등) 는 lock 을 놓은 뒤 호출한다.
+    # (listener 가 끝날 때까지 다른 thread 의 설정 읽기가 기다리지 않도록)
+    def _check(self) :
+        changed = None
+        with self._lock :
+            if self._settings is None :
+                self._load()
+                return self._settings
+
+            if time.monotonic() < self._next_check :
+                return self._settings
+
+            try:
+                force = self._reload_requested
+                self._reload_requested = False
+                if force or os.stat(self.config_path).st_mtime != self._mtime :
+                    changed = self._load()
+            except (OSError, ValueError, ConfigError) as e :
+                self.last_error = e
+            finally:
+                self._schedule_check()
+            settings = self._settings
+
+        if changed is not None :
+            self._notify(*changed)
+        return settings
+
+    def _schedule_check(self) :
+        if self.reload_interval and self.reload_interval > 0 :
+            self._next_check = time.monotonic() + self.reload_interval
+        else :
+            self._next_check = float('inf')
+
+    # 설정 파일을 읽어 검증한 뒤 교체한다. 잘못된 파일이면 ConfigError 등을 발생시키고 기존 설정을 유지한다.
     def load(self) :
-        with open(self.config_path, 'r') as f :
-            self.config = json.loads(f.read())
+        changed = self._load()
+        if changed is not None :
+            self._notify(*changed)
 
-    def get_mlflow_tracking_uri(self) :
-        ip = self.config['db']['cluster']['ip']
-        port = self.config['db']['cluster']['port']
-        user_id = self.config['db']['user']['mlflow']['id']
-        user_pwd = self.config['db']['user']['mlflow']['password']
-        dbname = self.config['db']['database']['mlflow']['tracking']
+    # 설정을 교체하고, 바뀌었으면 (old, new) 를 돌려준다.
+    def _load(self) :
+        with self._lock :
+            mtime = os.stat(self.config_path).st_mtime
+            with open(self.config_path, 'r') as f :
+                settings = parse_settings(json.loads(f.read()))
+
+            old, self._settings = self._settings, settings
+            self._mtime = mtime
+            self.last_error = None
+            self._schedule_check()
 
-        return f"postgresql://{user_id}:{user_pwd}@{ip}:{port}/{dbname}"
+        if old is not None and old != settings :
+            return old, settings
+        return None
+
+    def _notify(self, old, new) :
+        for listener in list(Config._reload_listeners) :
+            listener(old, new)
+
+    # 다음 값을 읽을 때 설정 파일을 다시 읽도록 한다. (signal handler 에서도 안전하게 호출할 수 있다.)
+    def request_reload(self) :
+        self._reload_requested = True
+        self._next_check = 0.0
+
+    def install_reload_signal(self, signum=signal.SIGHUP) :
+        signal.signal(signum, lambda *_ : self.request_reload())
+
+    # listener(old_settings, new_settings) 는 설정이 바뀐 직후 호출된다.
+    @classmethod
+    def add_reload_listener(cls, listener) :
+        if listener not in cls._reload_listeners :
+            cls._reload_listeners.append(listener)
+
+    @classmethod
+    def remove_reload_listener(cls, listener) :
+        if listener in cls._reload_listeners :
+            cls._reload_listeners.remove(listener)
+
+    def get_mlflow_tracking_uri(self) :
+        return self.settings.mlflow_tracking_uri
 
     def get_mlflow_tracking_auth_uri(self) :
-        ip = self.config['db']['cluster']['ip']
-        port = self.config['db']['cluster']['port']
-        user_id = self.config['db']['user']['mlflow']['id']
-        user_pwd = self.config['db']['user']['mlflow']['password']
-        dbname = self.config['db']['database']['mlflow']['auth']
+        return self.settings.mlflow_tracking_auth_uri
+
+    # db connection pool 설정 (config 에 없으면 기본값 사용)
+    def get_db_pool_options(self) :
+        return dict(self.settings.db_pool_options)
+
+    # primary DSN 에 대응하는 읽기 전용 replica DSN 목록 (없으면 빈 tuple)
+    def get_replica_uris(self, primary_uri) :
+        settings = self.settings
+        if primary_uri == settings.mlflow_tracking_uri :
+            return settings.mlflow_tracking_replica_uris
+        if primary_uri == settings.mlflow_tracking_auth_uri :
+            return settings.mlflow_tracking_auth_replica_uris
+        return ()
+
+    def get_db_replica_options(self) :
+        return dict(self.settings.db_replica_options)
 
-        return f"postgresql://{user_id}:{user_pwd}@{ip}:{port}/{dbname}"
+    def get_retry_options(self) :
+        return dict(self.settings.retry_options)
 
     def get_mlflow_server_url(self) :
-        return self.config['mlflow']['server_url']
+        return self.settings.mlflow_server_url
 
     def get_mlflow_artifact_url(self) :
-        return self.config['mlflow']['artifact_root']
+        return self.settings.mlflow_artifact_url
 
 if __name__ == '__main__':
     config = Config()
@@ -0,0 +1,538 @@
+import time
+import atexit
+import itertools
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from mlstudio_sdk import instrumentation, retry
+from mlstudio_sdk.common import LazyModule
+from mlstudio_sdk.config import Config
+
+psycopg2 = LazyModule('psycopg2')
+
+class PoolError(Exception) :
+    pass
+
+class PoolTimeoutError(PoolError) :
+    pass
+
+# 로그/예외 메시지에 노출할 DSN (password 제외)
+def safe_dsn(dsn) :
+    scheme, sep, rest = dsn.partition('://')
+    if sep and '@' in rest :
+        return f"{scheme}://***@{rest.rsplit('@', 1)[1]}"
+    return dsn
+
+########################################
+# PostgreSQL connection pool
+########################################
+# DSN 하나에 대한 thread-safe connection pool
+#  - min_size 만큼 미리 연결하고, max_size 까지 필요할 때 늘린다.
+#  - 빌려줄 때 연결 상태를 확인하고(health check) 끊어진 연결은 버린다.
+#  - 반납 시 열린 transaction 은 rollback 하여 깨끗한 상태로 돌려놓는다.
+class ConnectionPool(object) :
+    def __init__(self, dsn, min_size=1, max_size=10, timeout=30.0, check_interval=30.0, **connect_kwargs) :
+        if min_size < 0 or max_size < 1 or min_size > max_size :
+            raise ValueError(f'invalid pool size : min_size={min_size}, max_size={max_size}')
+
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.connect_kwargs = connect_kwargs
+
+        self._idle = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        try:
+            for _ in range(min_size) :
+                conn = self._connect()
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+        except BaseException :
+            # 일부만 연결된 상태로 실패하면 이미 연결한 것을 닫는다.
+            self.close()
+            raise
+
+    # 연결 실패는 deadline 안에서 jitter backoff 로 재시도하고, DB 별 circuit breaker 에 기록한다.
+    def _connect(self) :
+        return retry.call(f'db:{self._safe_dsn()}', self._open, retry.is_transient_db_error)
+
+    def _open(self) :
+        kwargs = dict(self.connect_kwargs)
+        kwargs.setdefault('connect_timeout', retry.connect_timeout())
+        return psycopg2.connect(self.dsn, **kwargs)
+
+    def _is_healthy(self, conn, last_used) :
+        if conn.closed :
+            return False
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE :
+            return False
+        if time.monotonic() - last_used < self.check_interval :
+            return True
+        # 오래 쉬고 있던 연결은 서버가 끊었을 수 있으므로 실제로 확인한다.
+        try:
+            with conn.cursor() as cursor :
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error :
+            return False
+
+    def _close_quietly(self, conn) :
+        try:
+            conn.close()
+        except psycopg2.Error :
+            pass
+
+    def getconn(self, timeout=None) :
+        with instrumentation.phase(instrumentation.CONNECT) :
+            return self._getconn(timeout)
+
+    def _getconn(self, timeout) :
+        timeout = self.timeout if timeout is None else timeout
+        # pool 대기 시간도 호출의 deadline 을 넘지 않는다.
+        left = retry.remaining()
+        if left is not None :
+            timeout = max(0.0, min(timeout, left))
+        deadline = time.monotonic() + timeout
+
+        while True :
+            conn = None
+            with self._cond :
+                while True :
+                    if self._closed :
+                        raise PoolError(f'connection pool is closed : {self._safe_dsn()}')
+                    if self._idle :
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size :
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 :
+                        raise PoolTimeoutError(f'no connection available within {timeout}s : {self._safe_dsn()}')
+                    self._cond.wait(remaining)
+
+            if conn is None :
+                try:
+                    return self._connect()
+                except Exception :
+                    self._release_slot()
+                    raise
+
+            if self._is_healthy(conn, last_used) :
+                return conn
+
+            self._close_quietly(conn)
+            self._release_slot()
+
+    def putconn(self, conn, discard=False) :
+        if not discard and not conn.closed :
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE :
+                    conn.rollback()
+            except psycopg2.Error :
+                discard = True
+
+        with self._cond :
+            if self._closed or discard or conn.closed :
+                self._close_quietly(conn)
+                self._size -= 1
+            else :
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _release_slot(self) :
+        with self._cond :
+            self._size -= 1
+            self._cond.notify()
+
+    def connection(self, timeout=None) :
+        return self.lease(self.getconn(timeout=timeout))
+
+    # getconn() 으로 빌린 연결을 사용하고 반납한다. (정상 종료 시 commit, 예외 시 rollback)
+    @contextmanager
+    def lease(self, conn) :
+        discard = False
+        try:
+            yield conn
+            if not conn.closed and not conn.autocommit :
+                conn.commit()
+        except BaseException :
+            try:
+                if not conn.closed :
+                    conn.rollback()
+            except psycopg2.Error :
+                discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def close(self) :
+        with self._cond :
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle :
+            self._close_quietly(conn)
+
+    def stats(self) :
+        with self._cond :
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            }
+
+    def _safe_dsn(self) :
+        return safe_dsn(self.dsn)
+
+########################################
+# DSN 별 pool 관리
+########################################
+_pools = {}
+_pool_locks = {}
+_pools_lock = threading.Lock()
+
+# pool 은 DSN 별 lock 안에서 만든다. (min_size 만큼 연결하는 동안 다른 DSN 의 요청을 막지 않는다.)
+def get_pool(dsn) :
+    pool = _pools.get(dsn)
+    if pool is not None :
+        return pool
+
+    with _pools_lock :
+        pool = _pools.get(dsn)
+        if pool is not None :
+            return pool
+        dsn_lock = _pool_locks.setdefault(dsn, threading.Lock())
+
+    with dsn_lock :
+        with _pools_lock :
+            pool = _pools.get(dsn)
+            if pool is not None :
+                return pool
+
+        pool = ConnectionPool(dsn, **Config().get_db_pool_options())
+
+        with _pools_lock :
+            _pools[dsn] = pool
+            _pool_locks.pop(dsn, None)
+        return pool
+
+# pool 에서 연결을 빌려 사용하고 반드시 반납한다.
+#   with connection(dsn) as conn : ...
+def connection(dsn, timeout=None) :
+    return get_pool(dsn).connection(timeout=timeout)
+
+# 읽기 전용 조회용 연결. replica 가 설정되어 있으면 replica 로, 없거나 모두 사용할 수 없으면 primary 로 연결한다.
+def read_connection(dsn, timeout=None) :
+    router = get_router(dsn)
+    if router is None :
+        return connection(dsn, timeout=timeout)
+    return router.connection(timeout=timeout)
+
+def tracking_connection(timeout=None) :
+    return connection(Config().get_mlflow_tracking_uri(), timeout=timeout)
+
+def auth_connection(timeout=None) :
+    return connection(Config().get_mlflow_tracking_auth_uri(), timeout=timeout)
+
+def tracking_read_connection(timeout=None) :
+    return read_connection(Config().get_mlflow_tracking_uri(), timeout=timeout)
+
+def auth_read_connection(timeout=None) :
+    return read_connection(Config().get_mlflow_tracking_auth_uri(), timeout=timeout)
+
+########################################
+# 읽기 전용 replica 분배
+########################################
+# replica 의 복제 지연(초). primary 이거나 받은 WAL 을 모두 반영했으면 0 이다.
+REPLICA_LAG_SQL = """
+SELECT  CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+"""
+
+_BUSY = object()
+
+class _ReplicaState(object) :
+    __slots__ = ('dsn', 'healthy', 'lag', 'latency', 'next_check', 'checking', 'reads', 'failures', 'last_error')
+
+    def __init__(self, dsn) :
+        self.dsn = dsn
+        self.healthy = True
+        self.lag = None
+        self.latency = None
+        self.next_check = 0.0
+        self.checking = False
+        self.reads = 0
+        self.failures = 0
+        self.last_error = None
+
+# primary 하나와 replica 들 사이에서 읽기 연결을 나눠준다.
+#  - policy : round_robin (차례대로) / least_latency (health check 응답 시간이 가장 짧은 replica)
+#  - check_interval 초마다 replica 의 응답 시간과 복제 지연을 확인한다. (확인은 연결을 빌리는 thread 하나가 한다.)
+#  - 복제 지연이 max_lag 초를 넘거나 연결에 실패한 replica 는 retry_after 초 동안 제외한다.
+#  - pool 이 모두 사용 중인 replica 는 제외하지 않는다. 기다리지 않고 다음 replica 를 시도하고,
+#    모두 사용 중이면 첫번째 replica 의 연결을 기다린다.
+#  - 사용할 수 있는 replica 가 없으면 primary 를 사용한다.
+class ReplicaRouter(object) :
+    LATENCY_WEIGHT = 0.3    # 응답 시간 이동 평균에서 새 측정값의 비중
+
+    def __init__(self, primary_dsn, replica_dsns, policy='round_robin', max_lag=10.0, check_interval=5.0, retry_after=30.0) :
+        self.primary_dsn = primary_dsn
+        self.policy = policy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self.primary_reads = 0
+
+        self._replicas = [_ReplicaState(dsn) for dsn in replica_dsns]
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _candidates(self) :
+        now = time.monotonic()
+        for replica in self._replicas :
+            if replica.next_check <= now :
+                self._check(replica)
+
+        candidates = [r for r in self._replicas if r.healthy]
+        if len(candidates) > 1 :
+            if self.policy == 'least_latency' :
+                candidates.sort(key=lambda r : float('inf') if r.latency is None else r.latency)
+            else :
+                start = next(self._counter) % len(candidates)
+                candidates = candidates[start:] + candidates[:start]
+        return candidates
+
+    # replica 상태 확인. 다른 thread 가 확인 중이면 기존 상태를 그대로 사용한다.
+    def _check(self, replica) :
+        with self._lock :
+            if replica.checking or replica.next_check > time.monotonic() :
+                return
+            replica.checking = True
+
+        try:
+            start = time.monotonic()
+            with get_pool(replica.dsn).connection(timeout=self.check_interval) as conn :
+                with conn.cursor() as cursor :
+                    cursor.execute(REPLICA_LAG_SQL)
+                    lag = float(cursor.fetchone()[0])
+            latency = time.monotonic() - start
+
+            replica.lag = lag
+            if replica.latency is None :
+                replica.latency = latency
+            else :
+                replica.latency += self.LATENCY_WEIGHT * (latency - replica.latency)
+
+            if lag > self.max_lag :
+                self._mark_down(replica, f'replication lag {lag:.1f}s exceeds max_lag {self.max_lag}s')
+            else :
+                replica.healthy = True
+                replica.last_error = None
+                replica.next_check = time.monotonic() + self.check_interval
+        except PoolTimeoutError :
+            # 사용 중일 뿐이므로 상태는 그대로 두고 다음에 다시 확인한다.
+            replica.next_check = time.monotonic() + self.check_interval
+        except (psycopg2.Error, PoolError, retry.CircuitOpenError) as e :
+            self._mark_down(replica, e)
+        finally:
+            replica.checking = False
+
+    def _mark_down(self, replica, error) :
+        replica.healthy = False
+        replica.failures += 1
+        replica.last_error = str(error)
+        replica.next_check = time.monotonic() + self.retry_after
+
+    def connection(self, timeout=None) :
+        busy = []
+        for replica in self._candidates() :
+            conn = self._getconn(replica, 0)
+            if conn is _BUSY :
+                busy.append(replica)
+            elif conn is not None :
+                return conn
+
+        if busy :
+            conn = self._getconn(busy[0], timeout)
+            if conn is _BUSY :
+                raise PoolTimeoutError(f'no replica connection available within {timeout}s : {safe_dsn(busy[0].dsn)}')
+            if conn is not None :
+                return conn
+
+        self.primary_reads += 1
+        return connection(self.primary_dsn, timeout=timeout)
+
+    # replica 연결 (lease). pool 이 모두 사용 중이면 _BUSY, 연결할 수 없으면 replica 를 제외하고 None
+    def _getconn(self, replica, timeout) :
+        try:
+            pool = get_pool(replica.dsn)
+            conn = pool.getconn(timeout=timeout)
+        except PoolTimeoutError :
+            return _BUSY
+        except (psycopg2.Error, PoolError, retry.CircuitOpenError) as e :
+            self._mark_down(replica, e)
+            return None
+        replica.reads += 1
+        return pool.lease(conn)
+
+    def stats(self) :
+        return {
+            'policy': self.policy,
+            'primary_reads': self.primary_reads,
+            'replicas': [{
+                'dsn': safe_dsn(r.dsn),
+                'healthy': r.healthy,
+                'lag': r.lag,
+                'latency_ms': None if r.latency is None else r.latency * 1000,
+                'reads': r.reads,
+                'failures': r.failures,
+                'last_error': r.last_error,
+            } for r in self._replicas],
+        }
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+# primary DSN 에 대한 ReplicaRouter. replica 가 설정되지 않았으면 None
+def get_router(dsn) :
+    try:
+        return _routers[dsn]
+    except KeyError :
+        pass
+
+    with _routers_lock :
+        if dsn not in _routers :
+            config = Config()
+            replica_dsns = config.get_replica_uris(dsn)
+            _routers[dsn] = ReplicaRouter(dsn, replica_dsns, **config.get_db_replica_options()) if replica_dsns else None
+        return _routers[dsn]
+
+def replica_stats() :
+    return {safe_dsn(dsn): router.stats() for dsn, router in list(_routers.items()) if router is not None}
+
+########################################
+# query 실행
+########################################
+# conn 에서 sql 을 실행하고 cursor 를 돌려준다. (instrumentation 에 DB 왕복 한번으로 기록)
+#   rows = execute(conn, sql, (name,)).fetchall()
+def execute(conn, sql, params=None, cursor_factory=None) :
+    cursor = conn.cursor(cursor_factory=cursor_factory) if cursor_factory else conn.cursor()
+    with instrumentation.phase(instrumentation.QUERY) as p :
+        cursor.execute(sql, params)
+        p.rows = max(cursor.rowcount, 0)
+    return cursor
+
+########################################
+# 대용량 조회 (server-side cursor)
+########################################
+TUPLE_ROW = 'tuple'
+RECORD_ROW = 'record'
+DICT_ROW = 'dict'
+
+_cursor_ids = itertools.count(1)
+_record_types = {}
+
+# row 하나를 원하는 형태로 바꾸는 함수를 돌려준다. (tuple 이면 None : 변환하지 않음)
+#   tuple  : psycopg2 가 돌려주는 tuple 그대로
+#   record : 컬럼 이름으로 접근할 수 있는 namedtuple (__slots__ = () 로 dict 보다 작다)
+#   dict   : 컬럼 이름 -> 값 dict (기존 RealDictCursor 결과와 같은 형태)
+def row_factory(columns, row_type=TUPLE_ROW) :
+    columns = tuple(columns)
+    if row_type == TUPLE_ROW :
+        return None
+    if row_type == RECORD_ROW :
+        record = _record_types.get(columns)
+        if record is None :
+            record = _record_types.setdefault(columns, namedtuple('Row', columns))
+        return record._make
+    if row_type == DICT_ROW :
+        return lambda row : dict(zip(columns, row))
+    raise ValueError(f'invalid row type : {row_type}')
+
+# named(server-side) cursor 로 결과를 batch_size 건씩 받아 하나씩 돌려준다.
+# 전체 결과를 메모리에 올리지 않으며, generator 를 다 쓰거나 닫으면 연결을 pool 에 반납한다.
+# readonly 이면 read_connection() 으로 replica 에서 조회한다.
+def stream(dsn, sql, params=None, batch_size=1000, factory=None, readonly=False) :
+    with (read_connection(dsn) if readonly else connection(dsn)) as conn :
+        cursor = conn.cursor(name=f'mlstudio_cursor_{next(_cursor_ids)}')
+        try:
+            cursor.itersize = batch_size
+            with instrumentation.phase(instrumentation.QUERY) :
+                cursor.execute(sql, params)
+            while True :
+                # named cursor 는 fetchmany 마다 서버에서 batch_size 건씩 가져온다.
+                with instrumentation.phase(instrumentation.QUERY) as p :
+                    rows = cursor.fetchmany(batch_size)
+                    p.rows = len(rows)
+                if not rows :
+                    break
+                if factory is not None :
+                    rows = map(factory, rows)
+                for row in rows :
+                    yield row
+        finally:
+            cursor.close()
+
+# tuple row 들을 컬럼 단위로 모은다.
+#   dict   : 컬럼 이름 -> list
+#   numpy  : 컬럼 이름 -> numpy array
+#   pandas : pandas DataFrame
+def to_columns(rows, columns, format='dict') :
+    columns = tuple(columns)
+    values = [[] for _ in columns]
+    appends = [v.append for v in values]
+    for row in rows :
+        for append, value in zip(appends, row) :
+            append(value)
+
+    if format == 'dict' :
+        return dict(zip(columns, values))
+    if format == 'numpy' :
+        try:
+            import numpy
+        except ImportError :
+            raise ImportError('numpy is required for format="numpy" (pip install numpy)')
+        return {c: numpy.array(v) for c, v in zip(columns, values)}
+    if format == 'pandas' :
+        try:
+            import pandas
+        except ImportError :
+            raise ImportError('pandas is required for format="pandas" (pip install pandas)')
+        return pandas.DataFrame(dict(zip(columns, values)), columns=list(columns))
+    raise ValueError(f'invalid columnar format : {format}')
+
+def close_all_pools() :
+    with _pools_lock :
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools :
+        pool.close()
+
+# 설정 파일이 바뀌어 접속 정보나 pool 설정이 달라지면 기존 pool 을 정리한다.
+# 새 연결은 다음 요청 때 바뀐 설정으로 만들어진다.
+def _on_config_reload(old, new) :
+    if (old.mlflow_tracking_uri != new.mlflow_tracking_uri
+            or old.mlflow_tracking_auth_uri != new.mlflow_tracking_auth_uri
+            or old.mlflow_tracking_replica_uris != new.mlflow_tracking_replica_uris
+            or old.mlflow_tracking_auth_replica_uris != new.mlflow_tracking_auth_replica_uris
+            or old.db_replica_options != new.db_replica_options
+            or old.db_pool_options != new.db_pool_options) :
+        with _routers_lock :
+            _routers.clear()
+        close_all_pools()
+
+Config.add_reload_listener(_on_config_reload)
+atexit.register(close_all_pools)
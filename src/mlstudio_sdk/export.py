@@ -0,0 +1,156 @@
+import os
+import csv
+import json
+from collections import namedtuple
+from mlstudio_sdk import db
+from mlstudio_sdk.config import Config
+from mlstudio_sdk.permission_index import EXPERIMENT, REGISTERED_MODEL
+
+# 접근권한 한 건
+#   resource_type : experiment / registered_model
+#   resource_id   : experiment id 또는 registered model 이름
+#   resource_name : experiment 이름 또는 registered model 이름 (tracking DB 에 없으면 None)
+PermissionRow = namedtuple('PermissionRow', ['resource_type', 'resource_id', 'resource_name', 'username', 'is_admin', 'permission'])
+
+PERMISSION_COLUMNS = PermissionRow._fields
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+########################################
+# 전체 접근권한 export
+########################################
+# 전체 사용자의 experiment / registered model 접근권한을 이름과 함께 하나씩 돌려준다.
+#  - auth DB 의 권한과 tracking DB 의 이름을 같은 순서로 정렬된 server-side cursor 두 개로 읽어 merge join 한다.
+#  - 한번에 batch_size 건씩만 메모리에 올린다.
+#  - experiment_id 가 숫자가 아닌 권한은 다른 권한 조회와 같이 건너뛴다.
+#  - 순서 : experiment 는 experiment_id 순, registered model 은 이름 순 (DB collation 과 무관하게 byte 순)
+def iter_permission_matrix(resource_types=(EXPERIMENT, REGISTERED_MODEL), batch_size=1000) :
+    for resource_type in resource_types :
+        if resource_type == EXPERIMENT :
+            rows = _iter_experiment_permissions(batch_size)
+        elif resource_type == REGISTERED_MODEL :
+            rows = _iter_registered_model_permissions(batch_size)
+        else :
+            raise ValueError(f'invalid resource type : {resource_type}')
+        for row in rows :
+            yield row
+
+def _iter_experiment_permissions(batch_size) :
+    config = Config()
+    permissions = db.stream(config.get_mlflow_tracking_auth_uri(), """
+        SELECT  CAST(permissions.experiment_id AS BIGINT), users.username, users.is_admin, permissions.permission
+        FROM    experiment_permissions permissions
+        INNER JOIN users
+        ON      permissions.user_id = users.id
+        WHERE   permissions.experiment_id ~ '^[0-9]+$'
+        ORDER BY CAST(permissions.experiment_id AS BIGINT), users.username
+        """, batch_size=batch_size, readonly=True)
+    names = db.stream(config.get_mlflow_tracking_uri(), """
+        SELECT  CAST(experiment_id AS BIGINT), name
+        FROM    experiments
+        ORDER BY experiment_id
+        """, batch_size=batch_size, readonly=True)
+
+    for key, name, username, is_admin, permission in _merge_join(permissions, names) :
+        yield PermissionRow(EXPERIMENT, str(key), name, username, is_admin, permission)
+
+def _iter_registered_model_permissions(batch_size) :
+    config = Config()
+    permissions = db.stream(config.get_mlflow_tracking_auth_uri(), """
+        SELECT  permissions.name, users.username, users.is_admin, permissions.permission
+        FROM    registered_model_permissions permissions
+        INNER JOIN users
+        ON      permissions.user_id = users.id
+        ORDER BY permissions.name COLLATE "C", users.username
+        """, batch_size=batch_size, readonly=True)
+    names = db.stream(config.get_mlflow_tracking_uri(), """
+        SELECT  name, name
+        FROM    registered_models
+        ORDER BY name COLLATE "C"
+        """, batch_size=batch_size, readonly=True)
+
+    for key, name, username, is_admin, permission in _merge_join(permissions, names) :
+        yield PermissionRow(REGISTERED_MODEL, key, name, username, is_admin, permission)
+
+# 첫 컬럼(key) 순으로 정렬된 두 row 흐름을 합친다.
+# permissions 의 각 row 에 names 에서 같은 key 의 이름을 붙여 (key, name, *나머지) 로 돌려준다.
+# (registered model 이름은 "C" collation 으로 정렬하므로 Python 문자열 비교 순서와 같다.)
+def _merge_join(permissions, names) :
+    names = iter(names)
+    name_row = next(names, None)
+    for key, *rest in permissions :
+        while name_row is not None and name_row[0] < key :
+            name_row = next(names, None)
+        name = name_row[1] if name_row is not None and name_row[0] == key else None
+        yield (key, name, *rest)
+
+########################################
+# file 로 저장
+########################################
+# 전체 접근권한을 csv / jsonl / parquet 파일로 저장하고 저장한 건수를 돌려준다.
+# format 을 생략하면 파일 확장자로 정한다. parquet 는 pyarrow 가 필요하다.
+def export_permission_matrix(path, format=None, resource_types=(EXPERIMENT, REGISTERED_MODEL), batch_size=10000) :
+    format = format or os.path.splitext(path)[1].lstrip('.').lower()
+    if format not in FORMATS :
+        raise ValueError(f'invalid export format : {format} (use one of {FORMATS})')
+
+    rows = iter_permission_matrix(resource_types, batch_size=min(batch_size, 10000))
+    if format == 'csv' :
+        return _write_csv(path, rows)
+    if format == 'jsonl' :
+        return _write_jsonl(path, rows)
+    return _write_parquet(path, rows, batch_size)
+
+def _write_csv(path, rows) :
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f :
+        writer = csv.writer(f)
+        writer.writerow(PERMISSION_COLUMNS)
+        for row in rows :
+            writer.writerow(row)
+            count += 1
+    return count
+
+def _write_jsonl(path, rows) :
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f :
+        for row in rows :
+            f.write(json.dumps(row._asdict(), ensure_ascii=False))
+            f.write('\n')
+            count += 1
+    return count
+
+# batch_size 건마다 row group 하나로 쓴다.
+def _write_parquet(path, rows, batch_size) :
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError :
+        raise ImportError('pyarrow is required for format="parquet" (pip install pyarrow)')
+
+    schema = pyarrow.schema([
+        ('resource_type', pyarrow.string()),
+        ('resource_id', pyarrow.string()),
+        ('resource_name', pyarrow.string()),
+        ('username', pyarrow.string()),
+        ('is_admin', pyarrow.bool_()),
+        ('permission', pyarrow.string()),
+    ])
+
+    count = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer :
+        batch = []
+        for row in rows :
+            batch.append(row)
+            if len(batch) >= batch_size :
+                writer.write_table(_to_table(pyarrow, schema, batch))
+                count += len(batch)
+                batch = []
+        if batch or count == 0 :
+            writer.write_table(_to_table(pyarrow, schema, batch))
+            count += len(batch)
+    return count
+
+def _to_table(pyarrow, schema, batch) :
+    columns = db.to_columns(batch, PERMISSION_COLUMNS)
+    return pyarrow.Table.from_pydict(columns, schema=schema)
@@ -0,0 +1,362 @@
+import time
+import bisect
+import inspect
+import threading
+import functools
+from mlstudio_sdk.common import context_var
+
+# 구간 종류
+CONNECT = 'connect'         # pool 에서 연결을 빌리는 시간 (새 연결 포함)
+QUERY = 'query'             # DB 왕복 (query 실행, fetch)
+REST = 'rest'               # REST API 왕복
+MATERIALIZE = 'materialize' # 조회 결과를 dict 등으로 바꾸는 시간
+
+PHASES = (CONNECT, QUERY, REST, MATERIALIZE)
+
+########################################
+# 작업 기록
+########################################
+# SDK 작업 하나 (예: apply_experiment_permission, aio.apply_experiment_permission) 의 측정 결과
+#  - timings : 구간별 누적 시간(초), counts : 구간별 횟수 (query / rest 횟수가 DB / REST 왕복 수)
+#  - 작업 안에서 다른 SDK 작업을 호출하면 바깥 작업 하나로 합쳐서 기록한다.
+class OperationRecord(object) :
+    __slots__ = ('name', 'start', 'duration', 'timings', 'counts', 'rows', 'bytes', 'error', '_lock')
+
+    def __init__(self, name) :
+        self.name = name
+        self.start = time.time()
+        self.duration = None
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(PHASES, 0)
+        self.rows = 0
+        self.bytes = 0
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def db_round_trips(self) :
+        return self.counts[QUERY]
+
+    @property
+    def rest_round_trips(self) :
+        return self.counts[REST]
+
+    def add(self, phase, seconds, rows=0, nbytes=0) :
+        with self._lock :
+            self.timings[phase] += seconds
+            self.counts[phase] += 1
+            self.rows += rows
+            self.bytes += nbytes
+
+    def as_dict(self) :
+        return {
+            'name': self.name,
+            'start': self.start,
+            'duration': self.duration,
+            'timings': dict(self.timings),
+            'counts': dict(self.counts),
+            'db_round_trips': self.db_round_trips,
+            'rest_round_trips': self.rest_round_trips,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'error': self.error,
+        }
+
+    def __repr__(self) :
+        return f'OperationRecord({self.as_dict()})'
+
+########################################
+# 현재 작업 (thread / asyncio task 별)
+########################################
+_current = context_var('mlstudio_operation')
+
+_enabled = False
+_listeners = []
+
+def enable() :
+    global _enabled
+    _enabled = True
+
+def disable() :
+    global _enabled
+    _enabled = False
+
+def is_enabled() :
+    return _enabled
+
+# listener(OperationRecord) 는 작업이 끝날 때마다 호출된다. (작업을 실행한 thread 에서)
+def add_listener(listener) :
+    if listener not in _listeners :
+        _listeners.append(listener)
+
+def remove_listener(listener) :
+    if listener in _listeners :
+        _listeners.remove(listener)
+
+def current() :
+    return _current.get() if _enabled else None
+
+def _finish(record, duration, error) :
+    record.duration = duration
+    if error is not None :
+        record.error = f'{type(error).__name__}: {error}'
+    for listener in list(_listeners) :
+        try:
+            listener(record)
+        except Exception :
+            pass
+
+########################################
+# 작업 / 구간 측정
+########################################
+# 함수 호출 하나를 작업으로 측정한다. 꺼져 있으면 전역 변수 하나만 확인하고 그대로 호출한다.
+#  - coroutine 함수는 await 가 끝날 때까지 측정한다.
+#  - iterator=True 이면 함수가 돌려준 iterator 를 다 쓰거나 닫을 때까지 같은 작업으로 측정한다.
+#    (소요 시간은 SDK 안에서 보낸 시간만 더하며, 호출한 쪽에서 row 를 처리하는 시간은 제외한다.)
+def operation(name, iterator=False) :
+    def decorator(func) :
+        if inspect.iscoroutinefunction(func) :
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs) :
+                if not _enabled or _current.get() is not None :
+                    return await func(*args, **kwargs)
+                record = OperationRecord(name)
+                token = _current.set(record)
+                started = time.perf_counter()
+                error = None
+                try:
+                    return await func(*args, **kwargs)
+                except BaseException as e :
+                    error = e
+                    raise
+                finally:
+                    _current.reset(token)
+                    _finish(record, time.perf_counter() - started, error)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) :
+            if not _enabled or _current.get() is not None :
+                return func(*args, **kwargs)
+            record = OperationRecord(name)
+            token = _current.set(record)
+            started = time.perf_counter()
+            result = error = None
+            try:
+                result = func(*args, **kwargs)
+                return result if not iterator else _iterate(record, time.perf_counter() - started, iter(result))
+            except BaseException as e :
+                error = e
+                raise
+            finally:
+                _current.reset(token)
+                if not iterator or error is not None :
+                    _finish(record, time.perf_counter() - started, error)
+        return wrapper
+    return decorator
+
+# iterator 에서 다음 값을 꺼낼 때마다 record 를 현재 작업으로 두고 시간을 더한다.
+def _iterate(record, elapsed, iterator) :
+    error = None
+    try:
+        while True :
+            token = _current.set(record)
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration :
+                return
+            finally:
+                elapsed += time.perf_counter() - started
+                _current.reset(token)
+            yield item
+    except GeneratorExit :
+        raise
+    except BaseException as e :
+        error = e
+        raise
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None :
+            token = _current.set(record)
+            try:
+                close()
+            finally:
+                _current.reset(token)
+        _finish(record, elapsed, error)
+
+# class 의 public method 전체를 작업으로 측정한다. 작업 이름은 '<prefix>.<method>' (prefix 가 없으면 method 이름)
+def instrument_class(prefix=None) :
+    def decorator(cls) :
+        for attr, value in list(vars(cls).items()) :
+            if not attr.startswith('_') and inspect.isfunction(value) :
+                name = f'{prefix}.{attr}' if prefix else attr
+                setattr(cls, attr, operation(name, iterator=attr.startswith('iter_'))(value))
+        return cls
+    return decorator
+
+class _Phase(object) :
+    __slots__ = ('record', 'phase', 'rows', 'bytes', 'started')
+    active = True
+
+    def __init__(self, record, phase) :
+        self.record = record
+        self.phase = phase
+        self.rows = 0
+        self.bytes = 0
+
+    def __enter__(self) :
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) :
+        self.record.add(self.phase, time.perf_counter() - self.started, self.rows, self.bytes)
+
+class _NoopPhase(object) :
+    __slots__ = ()
+    active = False
+    rows = 0
+    bytes = 0
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) :
+        pass
+
+    def __setattr__(self, name, value) :
+        pass
+
+_NOOP = _NoopPhase()
+
+# 현재 작업 안에서 구간 하나를 측정한다. 측정 중이 아니면 아무것도 하지 않는다.
+#   with instrumentation.phase(instrumentation.QUERY) as p :
+#       cursor.execute(sql)
+#       p.rows = cursor.rowcount
+# 세는 데 비용이 드는 값은 p.active 일 때만 계산한다.
+def phase(kind) :
+    if not _enabled :
+        return _NOOP
+    record = _current.get()
+    if record is None :
+        return _NOOP
+    return _Phase(record, kind)
+
+# 이미 측정한 구간을 현재 작업에 더한다. (SQLAlchemy event 처럼 시작/끝이 다른 함수에 있을 때)
+def record_phase(kind, seconds, rows=0, nbytes=0) :
+    record = current()
+    if record is not None :
+        record.add(kind, seconds, rows, nbytes)
+
+########################################
+# SQLAlchemy (SQL tracking store) 연결
+########################################
+_sqlalchemy_installed = False
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) :
+    if _enabled :
+        conn.info.setdefault('mlstudio_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) :
+    starts = conn.info.get('mlstudio_query_start')
+    if starts :
+        started = starts.pop()
+        record_phase(QUERY, time.perf_counter() - started, max(cursor.rowcount, 0))
+
+# MlflowClient 가 SQL store 로 DB 에 직접 접근하는 경우의 query 도 DB 왕복으로 센다.
+def install_sqlalchemy_hooks() :
+    global _sqlalchemy_installed
+    if _sqlalchemy_installed :
+        return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    _sqlalchemy_installed = True
+
+########################################
+# 메모리 histogram exporter
+########################################
+# 작업별 소요 시간 분포를 log 간격 bucket 으로 모은다. (bucket 경계는 growth 배씩 커지며 오차는 그 이내)
+#   exporter = HistogramExporter()
+#   instrumentation.add_listener(exporter)
+#   instrumentation.enable()
+#   exporter.percentile('apply_experiment_permission', 99)
+class HistogramExporter(object) :
+    def __init__(self, min_seconds=0.0001, max_seconds=120.0, growth=1.2) :
+        bounds = []
+        bound = min_seconds
+        while bound < max_seconds :
+            bounds.append(bound)
+            bound *= growth
+        bounds.append(max_seconds)
+        self.bounds = bounds
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record) :
+        index = bisect.bisect_left(self.bounds, record.duration)
+        with self._lock :
+            stats = self._stats.get(record.name)
+            if stats is None :
+                stats = self._stats[record.name] = {
+                    'buckets': [0] * (len(self.bounds) + 1),
+                    'count': 0,
+                    'errors': 0,
+                    'sum': 0.0,
+                    'max': 0.0,
+                    'db_round_trips': 0,
+                    'rest_round_trips': 0,
+                    'rows': 0,
+                    'bytes': 0,
+                }
+            stats['buckets'][index] += 1
+            stats['count'] += 1
+            stats['errors'] += record.error is not None
+            stats['sum'] += record.duration
+            stats['max'] = max(stats['max'], record.duration)
+            stats['db_round_trips'] += record.db_round_trips
+            stats['rest_round_trips'] += record.rest_round_trips
+            stats['rows'] += record.rows
+            stats['bytes'] += record.bytes
+
+    def _percentile(self, stats, q) :
+        target = stats['count'] * q / 100.0
+        seen = 0
+        for i, n in enumerate(stats['buckets']) :
+            seen += n
+            if n and seen >= target :
+                return min(self.bounds[i], stats['max']) if i < len(self.bounds) else stats['max']
+        return stats['max']
+
+    # q 백분위 소요 시간(초). 기록이 없으면 None
+    def percentile(self, name, q) :
+        with self._lock :
+            stats = self._stats.get(name)
+            if not stats :
+                return None
+            return self._percentile(stats, q)
+
+    def snapshot(self) :
+        with self._lock :
+            result = {}
+            for name, stats in self._stats.items() :
+                count = stats['count']
+                result[name] = {
+                    'count': count,
+                    'errors': stats['errors'],
+                    'mean': stats['sum'] / count,
+                    'p50': self._percentile(stats, 50),
+                    'p90': self._percentile(stats, 90),
+                    'p99': self._percentile(stats, 99),
+                    'max': stats['max'],
+                    'db_round_trips': stats['db_round_trips'] / count,
+                    'rest_round_trips': stats['rest_round_trips'] / count,
+                    'rows': stats['rows'] / count,
+                    'bytes': stats['bytes'] / count,
+                }
+            return result
+
+    def reset(self) :
+        with self._lock :
+            self._stats.clear()
@@ -0,0 +1,193 @@
+import os
+import json
+import time
+from collections import namedtuple
+from mlstudio_sdk import db
+from mlstudio_sdk import mlflow_api
+from mlstudio_sdk import result_cache
+from mlstudio_sdk.common import LazyModule
+from mlstudio_sdk.permission_index import EXPERIMENT
+
+psycopg2 = LazyModule('psycopg2')
+
+class MigrationError(Exception) :
+    pass
+
+# chunk 하나를 처리한 뒤 progress 로 넘겨주는 진행 상황 (누적 값)
+MigrationProgress = namedtuple('MigrationProgress', [
+    'chunks',
+    'experiments_scanned',
+    'experiments_updated',
+    'runs_updated',
+    'last_experiment_id',
+    'dry_run',
+    'seconds',
+])
+
+########################################
+# artifact location 일괄 변경
+########################################
+# experiment (와 그 run) 의 artifact 위치를 tracking DB 에서 일괄 변경한다.
+#  - mapping      : {experiment_id: 새 artifact_location}
+#  - old_prefix / new_prefix : artifact_location 이 old_prefix 이거나 old_prefix 아래 경로인 experiment 의 앞부분을 new_prefix 로 바꾼다.
+#    경로 단위로 비교하므로 old_prefix='s3://bucket/a' 는 s3://bucket/abc 를 바꾸지 않는다.
+#  - include_runs : run 의 artifact_uri 중 experiment 의 예전 위치로 시작하는 것도 같이 바꾼다.
+#  - experiment_id 순서로 chunk_size 개씩 읽어 chunk 마다 하나의 transaction 에서 batch UPDATE 한다.
+#  - dry_run 이면 변경할 건수만 세고 DB 는 바꾸지 않는다.
+#  - checkpoint_path 를 주면 chunk 가 commit 될 때마다 마지막 experiment_id 를 기록하고,
+#    다시 실행하면 그 다음부터 이어서 처리한다. (같은 규칙으로 실행할 때만)
+#  - progress(MigrationProgress) 는 chunk 마다 호출된다.
+def relocate_artifacts(mapping=None, old_prefix=None, new_prefix=None, include_runs=True, chunk_size=1000,
+                       dry_run=False, checkpoint_path=None, progress=None) :
+    if (mapping is None) == (old_prefix is None) :
+        raise ValueError('either mapping or old_prefix/new_prefix is required')
+    if old_prefix is not None and new_prefix is None :
+        raise ValueError('new_prefix is required with old_prefix')
+    if chunk_size < 1 :
+        raise ValueError(f'invalid chunk_size : {chunk_size}')
+
+    if mapping is not None :
+        mapping = {int(experiment_id): location for experiment_id, location in mapping.items()}
+        rule = {'mapping': {str(k): v for k, v in sorted(mapping.items())}}
+    else :
+        rule = {'old_prefix': old_prefix, 'new_prefix': new_prefix}
+        old_prefix, new_prefix = _base(old_prefix), _base(new_prefix)
+    rule['include_runs'] = include_runs
+
+    after_experiment_id = _load_checkpoint(checkpoint_path, rule) if checkpoint_path and not dry_run else None
+
+    start = time.monotonic()
+    chunks = scanned = updated = runs_updated = 0
+    while True :
+        with db.tracking_connection() as conn :
+            rows = _select_chunk(conn, mapping, old_prefix, after_experiment_id, chunk_size)
+            if not rows :
+                break
+
+            changes = []
+            for experiment_id, location in rows :
+                new_location = mapping[experiment_id] if mapping is not None else new_prefix + location[len(old_prefix):]
+                if new_location != location :
+                    changes.append((experiment_id, location, new_location))
+
+            if changes :
+                if dry_run :
+                    runs_updated += _count_runs(conn, changes) if include_runs else 0
+                else :
+                    _update_experiments(conn, changes)
+                    if include_runs :
+                        runs_updated += _update_runs(conn, changes)
+            # with 블록이 끝날 때 chunk 단위로 commit 된다.
+
+        if changes and not dry_run :
+            # 이름 -> Experiment cache 에는 예전 artifact_location 이 들어 있다.
+            mlflow_api.experiment_cache.clear()
+            result_cache.invalidate_resource(EXPERIMENT)
+
+        chunks += 1
+        scanned += len(rows)
+        updated += len(changes)
+        after_experiment_id = rows[-1][0]
+
+        if checkpoint_path and not dry_run :
+            _save_checkpoint(checkpoint_path, rule, after_experiment_id)
+        if progress is not None :
+            progress(MigrationProgress(chunks, scanned, updated, runs_updated, after_experiment_id, dry_run, time.monotonic() - start))
+
+        if len(rows) < chunk_size :
+            break
+
+    return MigrationProgress(chunks, scanned, updated, runs_updated, after_experiment_id, dry_run, time.monotonic() - start)
+
+def _select_chunk(conn, mapping, old_prefix, after_experiment_id, chunk_size) :
+    conditions = []
+    params = []
+    if mapping is not None :
+        conditions.append('experiment_id = ANY(%s)')
+        params.append(list(mapping))
+    else :
+        conditions.append('(artifact_location = %s OR LEFT(artifact_location, LENGTH(%s)) = %s)')
+        params.extend([old_prefix, old_prefix + '/', old_prefix + '/'])
+    if after_experiment_id is not None :
+        conditions.append('experiment_id > %s')
+        params.append(after_experiment_id)
+
+    sql = f"""
+    SELECT  experiment_id, artifact_location
+    FROM    experiments
+    WHERE   {' AND '.join(conditions)}
+    ORDER BY experiment_id
+    LIMIT   %s
+    """
+    params.append(chunk_size)
+
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+def _update_experiments(conn, changes) :
+    sql = """
+    UPDATE  experiments
+    SET     artifact_location = v.new_location
+    FROM    (VALUES %s) AS v(experiment_id, new_location)
+    WHERE   experiments.experiment_id = v.experiment_id
+    """
+    cursor = conn.cursor()
+    psycopg2.extras.execute_values(cursor, sql, [(i, new) for i, _, new in changes],
+                                   template='(%s::integer, %s)', page_size=len(changes))
+
+# 끝의 '/' 하나를 뗀 경로. 'x' 와 'x/' 를 같은 위치로 보고, 아래 경로는 base + '/' 로 시작하는지로 확인한다.
+def _base(location) :
+    return location[:-1] if location.endswith('/') else location
+
+# run 의 artifact_uri 는 <experiment artifact_location>/<run_id>/artifacts 형태이므로 앞부분만 바꾼다.
+# (old_location, new_location 은 _base 로 끝의 '/' 를 뗀 값)
+_RUNS_FROM = """
+    FROM    (VALUES %s) AS v(experiment_id, old_location, new_location)
+    WHERE   runs.experiment_id = v.experiment_id
+    AND     (runs.artifact_uri = v.old_location
+             OR LEFT(runs.artifact_uri, LENGTH(v.old_location) + 1) = v.old_location || '/')
+"""
+
+def _run_changes(changes) :
+    return [(i, _base(old), _base(new)) for i, old, new in changes]
+
+def _update_runs(conn, changes) :
+    sql = f"""
+    UPDATE  runs
+    SET     artifact_uri = v.new_location || SUBSTR(runs.artifact_uri, LENGTH(v.old_location) + 1)
+    {_RUNS_FROM}
+    """
+    cursor = conn.cursor()
+    psycopg2.extras.execute_values(cursor, sql, _run_changes(changes), template='(%s::integer, %s, %s)', page_size=len(changes))
+    return cursor.rowcount
+
+def _count_runs(conn, changes) :
+    sql = f"""
+    SELECT  COUNT(*)
+    FROM    runs
+    WHERE   EXISTS (SELECT 1 {_RUNS_FROM})
+    """
+    cursor = conn.cursor()
+    rows = psycopg2.extras.execute_values(cursor, sql, _run_changes(changes), template='(%s::integer, %s, %s)',
+                                          page_size=len(changes), fetch=True)
+    return rows[0][0]
+
+########################################
+# checkpoint
+########################################
+def _load_checkpoint(checkpoint_path, rule) :
+    if not os.path.exists(checkpoint_path) :
+        return None
+
+    with open(checkpoint_path, 'r') as f :
+        checkpoint = json.loads(f.read())
+    if checkpoint.get('rule') != rule :
+        raise MigrationError(f'checkpoint {checkpoint_path} was written for a different relocation rule')
+    return checkpoint.get('last_experiment_id')
+
+def _save_checkpoint(checkpoint_path, rule, last_experiment_id) :
+    tmp = f'{checkpoint_path}.tmp'
+    with open(tmp, 'w') as f :
+        f.write(json.dumps({'rule': rule, 'last_experiment_id': last_experiment_id}))
+    os.replace(tmp, checkpoint_path)
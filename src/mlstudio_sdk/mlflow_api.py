@@ -1,11 +1,20 @@
 import os
-import mlflow
-from mlflow import MlflowClient
-from mlflow.server import get_app_client
-import psycopg2
+from concurrent.futures import ThreadPoolExecutor
+from mlstudio_sdk import changefeed
+from mlstudio_sdk import db
+from mlstudio_sdk import instrumentation
+from mlstudio_sdk import permission_index
+from mlstudio_sdk import queries
+from mlstudio_sdk import result_cache as result_caches
+from mlstudio_sdk import retry
+from mlstudio_sdk.cache import TTLCache
+from mlstudio_sdk.common import LazyModule, bind_context, iter_pages
 from mlstudio_sdk.config import Config
-from mlflow.exceptions import MlflowException
-from mlflow.server.auth.client import AuthServiceClient
+
+# import 가 느린 module 은 처음 사용할 때 불러온다.
+mlflow = LazyModule('mlflow')
+psycopg2 = LazyModule('psycopg2')
+clients = LazyModule('mlstudio_sdk.clients')
 
 config = Config()
 
@@ -19,83 +28,443 @@ update_permission = ['EDIT', 'MANAGE']
 delete_permission = ['MANAGE']
 manage_permission = ['MANAGE']
 
+# experiment 이름 -> Experiment, registered model 이름 -> 이름 조회 결과 cache
+#  - key 는 (tracking uri, 로그인 id, 이름) 이다. 사용자와 client(REST / SQL) 마다 볼 수 있는 것이 다르므로 따로 보관한다.
+#  - 이 SDK 로 생성/삭제하면 같은 이름의 항목은 모든 사용자에 대해 바로 무효화된다.
+experiment_cache = TTLCache(max_size=4096, ttl=60.0, negative_ttl=5.0)
+registered_model_cache = TTLCache(max_size=4096, ttl=60.0, negative_ttl=5.0)
+
+def _invalidate_name(cache, name) :
+    cache.invalidate_if(lambda key : key[-1] == name)
+
+def get_name_cache_stats() :
+    return {
+        'experiment': experiment_cache.stats(),
+        'registered_model': registered_model_cache.stats(),
+    }
+
+def clear_name_cache() :
+    experiment_cache.clear()
+    registered_model_cache.clear()
+
+# 사용자별 목록 조회 결과 cache (기본은 사용하지 않음)
+#   get_experiments_by_permission / list_experiments_by_permission /
+#   get_registered_model_by_permission / list_registered_models_by_permission 의 결과를 (함수, 사용자, 인자) 별로 보관한다.
+#  - 이 SDK 로 사용자의 권한을 바꾸면 그 사용자의 항목을, experiment / registered model 을 생성/삭제/변경하면
+#    해당 종류의 항목 전체를 바로 무효화한다. 그 외의 변경은 ttl 이 지나야 반영된다.
+#   mlflow_api.enable_result_cache(max_bytes=64 * 1024 * 1024, ttl=30)
+result_cache = None
+
+def enable_result_cache(max_bytes=64 * 1024 * 1024, ttl=30.0) :
+    global result_cache
+    result_cache = result_caches.ResultCache(max_bytes=max_bytes, ttl=ttl)
+    return result_cache
+
+def disable_result_cache() :
+    global result_cache
+    result_cache = None
+
+def get_result_cache_stats() :
+    cache = result_cache
+    return None if cache is None else cache.stats()
+
+# cache 에는 처음 조회한 row 들을 그대로 보관하고, 돌려줄 때는 row 를 복사하여 호출한 쪽에서 바꿔도 cache 는 그대로 둔다.
+def _cached(name, user_name, shape, resource_type, load) :
+    cache = result_cache
+    if cache is None :
+        return load()
+    rows = cache.get_or_load((name, user_name) + shape, load, (result_caches.user_tag(user_name), resource_type))
+    return None if rows is None else [dict(row) for row in rows]
+
+def _on_config_reload(old, new) :
+    if old.mlflow_tracking_uri != new.mlflow_tracking_uri or old.mlflow_server_url != new.mlflow_server_url :
+        clear_name_cache()
+    if (old.mlflow_tracking_uri != new.mlflow_tracking_uri or old.mlflow_tracking_auth_uri != new.mlflow_tracking_auth_uri) and result_cache is not None :
+        result_cache.clear()
+
+Config.add_reload_listener(_on_config_reload)
+
+# 이 SDK 로 사용자 권한을 변경했을 때 메모리 권한 색인 등에 알린다.
+def _permissions_changed(user_id) :
+    permission_index.invalidate_user(user_id)
+    result_caches.invalidate_user(user_id)
+
+def _resource_deleted(resource_id, resource_type=permission_index.EXPERIMENT) :
+    permission_index.invalidate_resource(resource_id, resource_type)
+    changefeed.resource_deleted(resource_type)
+    result_caches.invalidate_resource(resource_type)
+
+# experiment / registered model 을 만들거나 바꿨을 때 알린다.
+def _resource_changed(resource_type=permission_index.EXPERIMENT) :
+    result_caches.invalidate_resource(resource_type)
+
+# 이미 있는 experiment / registered model 을 만들려고 할 때 발생한 오류인지 확인한다.
+# REST 서버는 RESOURCE_ALREADY_EXISTS 를, SQL store 는 버전에 따라 unique 제약 위반(UniqueViolation)을 감싼 오류를 돌려준다.
+# IntegrityError 는 NOT NULL / foreign key 위반일 수도 있으므로 그것만으로는 이미 있다고 보지 않는다.
+def _is_already_exists(e) :
+    if not isinstance(e, mlflow.exceptions.MlflowException) :
+        return False
+    return _is_already_exists_error(e.error_code, str(e))
+
+def _is_already_exists_error(error_code, message) :
+    if error_code == 'RESOURCE_ALREADY_EXISTS' :
+        return True
+    return 'already exists' in message or 'UniqueViolation' in message
+
+# 이름 목록을 max_workers 개의 thread 로 처리하여 이름 -> 결과 dict 로 돌려준다. (입력 순서 유지)
+def _map_names(func, names, max_workers) :
+    names = list(dict.fromkeys(names))
+    if len(names) <= 1 or max_workers <= 1 :
+        return {name: func(name) for name in names}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(names))) as executor :
+        return dict(zip(names, executor.map(bind_context(func), names)))
+
+# 환경변수로 로그인 정보를 설정한다.
+# process 전체에 영향을 주므로 thread 에서 사용할 때는 Session 을 사용한다.
 def set_tracking_user_env(login_id='', login_pwd='') :
     if login_id:
         os.environ['MLFLOW_TRACKING_USERNAME'] = login_id
     if login_pwd:
         os.environ['MLFLOW_TRACKING_PASSWORD'] = login_pwd
 
+########################################
+# Session
+########################################
+# 로그인 정보를 환경변수가 아닌 객체로 가지고 다니는 API 묶음
+# os.environ 을 변경하지 않으므로 사용자별 Session 을 여러 thread 에서 동시에 사용할 수 있다.
+#   session = Session(login_id, login_pwd)
+#   session.create_experiment('my-experiment')
+# public method 는 method 이름으로 instrumentation 작업이 기록된다. (같은 이름의 module 함수도 Session 을 거치므로 같은 이름)
+@instrumentation.instrument_class()
+class Session(object) :
+    def __init__(self, login_id='', login_pwd='') :
+        self.login_id = login_id
+        self.login_pwd = login_pwd
+
+    def _client(self, tracking_uri=None) :
+        tracking_uri = tracking_uri or config.get_mlflow_tracking_uri()
+        return clients.get_mlflow_client(tracking_uri, self.login_id, self.login_pwd)
+
+    def _auth_client(self) :
+        return clients.get_auth_client(config.get_mlflow_server_url(), self.login_id, self.login_pwd)
+
+    def _name_key(self, name, tracking_uri=None) :
+        return (tracking_uri or config.get_mlflow_tracking_uri(), self.login_id or '', name)
+
+    def _get_experiment_by_name(self, experiment_name, tracking_uri=None) :
+        client = self._client(tracking_uri)
+        return experiment_cache.get_or_load(self._name_key(experiment_name, tracking_uri),
+                                            lambda : client.get_experiment_by_name(experiment_name))
+
+    # registered model 이 있으면 이름을, 없으면 None 을 돌려준다.
+    def _get_registered_model_name(self, name) :
+        client = self._client()
+
+        def load() :
+            try:
+                return client.get_registered_model(name).name
+            except mlflow.exceptions.MlflowException as e :
+                # 없는 경우만 cache 하고, 그 외 오류는 cache 하지 않는다.
+                if e.error_code == 'RESOURCE_DOES_NOT_EXIST' :
+                    return None
+                raise
+
+        try:
+            return registered_model_cache.get_or_load(self._name_key(name), load)
+        except mlflow.exceptions.MlflowException :
+            return None
+
+    ########################################
+    # 사용자 관리
+    ########################################
+    def create_user(self, user_id, user_pwd) :
+        try:
+            self._auth_client().create_user(username=user_id, password=user_pwd)
+        finally:
+            _permissions_changed(user_id)
+
+    def delete_user(self, user_id) :
+        try:
+            self._auth_client().delete_user(username=user_id)
+        finally:
+            _permissions_changed(user_id)
+
+    def update_user_admin(self, user_id, is_admin) :
+        try:
+            self._auth_client().update_user_admin(username=user_id, is_admin=is_admin)
+        finally:
+            _permissions_changed(user_id)
+
+    ########################################
+    # experiment 생성/삭제
+    ########################################
+    def delete_experiment(self, experiment_name) :
+        experiment_details = self._get_experiment_by_name(experiment_name)
+
+        if experiment_details :
+            experiment_id = experiment_details.experiment_id
+        else :
+            raise Exception(f'{experiment_name} does not exist.')
+
+        try:
+            self._client().delete_experiment(experiment_id)
+        finally:
+            _invalidate_name(experiment_cache, experiment_name)
+            _resource_deleted(experiment_id)
+
+    def create_experiment(self, name : str, tags : dict = {} ) :
+        try:
+            experiment_id = self._client().create_experiment(
+                name=name,
+                artifact_location=config.get_mlflow_artifact_url(),
+                tags=tags)
+        finally:
+            _invalidate_name(experiment_cache, name)
+            _resource_changed()
+
+        return experiment_id
+
+    def create_experiment_if_not_exists(self, experiment_name : str, tags : dict = {} ) :
+        return self.ensure_experiment(experiment_name, tags)
+
+    # experiment 가 없으면 만들고 id 를 돌려준다.
+    # 먼저 조회하지 않고 바로 생성을 시도하며, 이미 있다는 오류가 나면 그 때만 id 를 조회한다.
+    # 여러 process 가 동시에 같은 이름을 만들어도 모두 같은 id 를 받는다.
+    def ensure_experiment(self, experiment_name : str, tags : dict = None) :
+        found, experiment = experiment_cache.lookup(self._name_key(experiment_name))
+        if found and experiment is not None :
+            return experiment.experiment_id
+
+        client = self._client()
+        try:
+            return client.create_experiment(
+                name=experiment_name,
+                artifact_location=config.get_mlflow_artifact_url(),
+                tags=tags or {})
+        except Exception as e :
+            if not _is_already_exists(e) :
+                raise
+        finally:
+            _invalidate_name(experiment_cache, experiment_name)
+            _resource_changed()
+
+        experiment = self._get_experiment_by_name(experiment_name)
+        if experiment is None :
+            raise Exception(f'{experiment_name} does not exist.')
+        return experiment.experiment_id
+
+    # 여러 experiment 를 동시에 ensure_experiment 하여 이름 -> experiment id dict 를 돌려준다.
+    def ensure_experiments(self, experiment_names, tags : dict = None, max_workers=8) :
+        return _map_names(lambda name : self.ensure_experiment(name, tags), experiment_names, max_workers)
+
+    # 전체 experiment 를 page_token 을 따라 끝까지 하나씩 돌려준다.
+    # 다음 page 는 현재 page 를 소비하는 동안 background 에서 미리 가져오며(prefetch),
+    # max_results 를 주면 그 개수까지만 가져온다.
+    def iter_experiments(self, view_type=None, filter_string=None, order_by=None,
+                         page_size=1000, max_results=None, prefetch=True) :
+        client = self._client()
+        if view_type is None :
+            view_type = mlflow.entities.ViewType.ACTIVE_ONLY
+
+        def fetch_page(page_token, size) :
+            page = client.search_experiments(
+                view_type=view_type,
+                max_results=size,
+                filter_string=filter_string,
+                order_by=order_by,
+                page_token=page_token)
+            return page, page.token
+
+        return iter_pages(bind_context(fetch_page), page_size, max_results=max_results, prefetch=prefetch)
+
+    def get_all_experiments(self) :
+        return list(self.iter_experiments())
+
+    ########################################
+    # registered model 생성/삭제
+    ########################################
+    def create_registered_model(self, name, desc : str = '', tags : dict = {}) :
+        try:
+            self._client().create_registered_model(name, tags, desc)
+        finally:
+            _invalidate_name(registered_model_cache, name)
+            _resource_changed(permission_index.REGISTERED_MODEL)
+
+    def create_registered_model_if_not_exists(self, name, desc : str = '', tags : dict = {}) :
+        return self.ensure_registered_model(name, desc, tags)
+
+    # registered model 이 없으면 만들고 이름을 돌려준다.
+    # 이미 있다는 오류가 나면 실제로 있는지 조회하여 확인한다. (ensure_experiment 와 같음)
+    def ensure_registered_model(self, name, desc : str = '', tags : dict = None) :
+        found, model_name = registered_model_cache.lookup(self._name_key(name))
+        if found and model_name is not None :
+            return model_name
+
+        try:
+            return self._client().create_registered_model(name, tags or {}, desc).name
+        except Exception as e :
+            if not _is_already_exists(e) :
+                raise
+        finally:
+            _invalidate_name(registered_model_cache, name)
+            _resource_changed(permission_index.REGISTERED_MODEL)
+
+        model_name = self._get_registered_model_name(name)
+        if model_name is None :
+            raise Exception(f'{name} does not exist.')
+        return model_name
+
+    # 여러 registered model 을 동시에 ensure_registered_model 하여 이름 -> 이름 dict 를 돌려준다.
+    # specs 의 각 항목은 이름 또는 {'name': ..., 'desc': ..., 'tags': {...}} 이다.
+    def ensure_registered_models(self, specs, max_workers=8) :
+        specs = [spec if isinstance(spec, dict) else {'name': spec} for spec in specs]
+        by_name = {spec['name']: spec for spec in specs}
+
+        def ensure(name) :
+            spec = by_name[name]
+            return self.ensure_registered_model(name, spec.get('desc', ''), spec.get('tags'))
+
+        return _map_names(ensure, by_name, max_workers)
+
+    def get_registered_model(self, name) :
+        return self._get_registered_model_name(name)
+
+    def delete_registered_model(self, registered_model_name) :
+        if self._get_registered_model_name(registered_model_name) is None :
+            return
+
+        try:
+            self._client().delete_registered_model(registered_model_name)
+        finally:
+            _invalidate_name(registered_model_cache, registered_model_name)
+            _resource_deleted(registered_model_name, permission_index.REGISTERED_MODEL)
+
+    ########################################
+    # 접근권한 관리
+    ########################################
+    # Permission      |  Can read | Can update | Can delete | Can manage
+    # READ               Yes          No           No            No
+    # EDIT               Yes          Yes          No            No
+    # MANAGE             Yes          Yes          Yes           Yes
+    # NO_PERMISSIONS     No           No           No            No
+    def apply_registered_model_permission(self, registered_model_name, user_id, perssion) :
+        try:
+            return self._auth_client().create_registered_model_permission(name=registered_model_name, username=user_id, permission=perssion)
+        finally:
+            _permissions_changed(user_id)
+
+    def update_registered_model_permission(self, registered_model_name, user_id, perssion) :
+        try:
+            self._auth_client().update_registered_model_permission(name=registered_model_name, username=user_id, permission=perssion)
+        finally:
+            _permissions_changed(user_id)
+
+    def cancel_registered_model_permission(self, registered_model_name, user_id) :
+        if self._get_registered_model_name(registered_model_name) is None :
+            return
+
+        try:
+            self._auth_client().delete_registered_model_permission(name=registered_model_name, username=user_id)
+        finally:
+            _permissions_changed(user_id)
+
+    def apply_experiment_permission(self, experiment_name, user_id, permission) :
+        experiment_details = self._get_experiment_by_name(experiment_name, config.get_mlflow_server_url())
+
+        if experiment_details :
+            experiment_id = experiment_details.experiment_id
+        else :
+            raise Exception(f'{experiment_name} does not exist.')
+
+        try:
+            return self._auth_client().create_experiment_permission(experiment_id=experiment_id, username=user_id, permission=permission)
+        finally:
+            _permissions_changed(user_id)
+
+    def update_experiment_permission(self, experiment_name, user_id, permission) :
+        experiment_details = self._get_experiment_by_name(experiment_name, config.get_mlflow_server_url())
+
+        if experiment_details :
+            experiment_id = experiment_details.experiment_id
+        else :
+            raise Exception(f'{experiment_name} does not exist.')
+
+        try:
+            self._auth_client().update_experiment_permission(experiment_id=experiment_id, username=user_id, permission=permission)
+        finally:
+            _permissions_changed(user_id)
+
+    def cancel_experiment_permission(self, experiment_name, user_id) :
+        experiment_details = self._get_experiment_by_name(experiment_name)
+
+        if experiment_details :
+            experiment_id = experiment_details.experiment_id
+        else :
+            return
+
+        try:
+            self._auth_client().delete_experiment_permission(experiment_id=experiment_id, username=user_id)
+        finally:
+            _permissions_changed(user_id)
+
+    ########################################
+    # MLFlow Database 직접 접근
+    # user_name 을 생략하면 Session 의 로그인 사용자로 조회한다.
+    ########################################
+    def get_is_admin(self, user_name=None) :
+        return get_is_admin(user_name or self.login_id)
+
+    def get_experiment_permissions(self, user_name=None) :
+        return get_experiment_permissions(user_name or self.login_id)
+
+    def get_experiments_by_permission(self, user_name=None) :
+        return get_experiments_by_permission(user_name or self.login_id)
+
+    def list_experiments_by_permission(self, user_name=None, page_size=None, after_experiment_id=None) :
+        return list_experiments_by_permission(user_name or self.login_id, page_size, after_experiment_id)
+
+    def get_registered_model_permissions(self, user_name=None) :
+        return get_registered_model_permissions(user_name or self.login_id)
+
+    def get_registered_model_by_permission(self, user_name=None) :
+        return get_registered_model_by_permission(user_name or self.login_id)
+
+    def list_registered_models_by_permission(self, user_name=None, page_size=None, after_name=None) :
+        return list_registered_models_by_permission(user_name or self.login_id, page_size, after_name)
+
+    def update_artifact_location(self, experiment_id, artifact_location) :
+        update_artifact_location(experiment_id, artifact_location)
+
 ########################################
 # 사용자 관리
 ########################################
 # ML Flow 사용자를 추가한다.
 def create_user(login_id, login_pwd, user_id, user_pwd) :
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-
-    auth_client = get_app_client("basic-auth", tracking_uri=config.get_mlflow_server_url())
-
-    auth_client.create_user(username=user_id, password=user_pwd)
+    return Session(login_id, login_pwd).create_user(user_id, user_pwd)
 
 # ML Flow 사용자를 삭제한다.
 def delete_user(login_id, login_pwd, user_id) :
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-
-    auth_client = get_app_client("basic-auth", tracking_uri=config.get_mlflow_server_url())
-    auth_client.delete_user(username=user_id)
+    return Session(login_id, login_pwd).delete_user(user_id)
 
 # 사용자 관리자 승격/취소
 def update_user_admin(login_id, login_pwd, user_id, is_admin) :
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-
-    auth_client = get_app_client("basic-auth", tracking_uri=config.get_mlflow_server_url())
-    auth_client.update_user_admin(username=user_id, is_admin=is_admin)
-
+    return Session(login_id, login_pwd).update_user_admin(user_id, is_admin)
 
 ########################################
 # experiment 생성/삭제
 ########################################
 def delete_experiment(login_id, login_pwd, experiment_name) :
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-
-    client = MlflowClient(tracking_uri=config.get_mlflow_tracking_uri())
-    experiment_details = client.get_experiment_by_name(experiment_name)
-    
-    if experiment_details :
-        experiment_id = experiment_details.experiment_id
-    else :
-        raise Exception(f'{experiment_name} does not exist.')
-
-    client.delete_experiment(experiment_id)
+    return Session(login_id, login_pwd).delete_experiment(experiment_name)
 
 def create_experiment(login_id, login_pwd, name : str, tags : dict = {} ) :
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-
-    client = MlflowClient(tracking_uri=config.get_mlflow_tracking_uri())
-    experiment_id = client.create_experiment(
-        name=name,
-        artifact_location=config.get_mlflow_artifact_url(),
-        tags=tags)
-
-    return experiment_id
+    return Session(login_id, login_pwd).create_experiment(name, tags)
 
 def create_experiment_if_not_exists(login_id, login_pwd, experiment_name : str, tags : dict = {} ) :
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
+    return Session(login_id, login_pwd).create_experiment_if_not_exists(experiment_name, tags)
 
-    client = MlflowClient(tracking_uri=config.get_mlflow_tracking_uri())
-
-    try:
-        experiment = mlflow.get_experiment_by_name(experiment_name)
-        return experiment.experiment_id
-    except AttributeError:
-        # raise Exception(f'does not exist experiment : {experiment_name}')
-        pass
-
-    experiment_id = client.create_experiment(
-        name=experiment_name,
-        artifact_location=config.get_mlflow_artifact_url(),
-        tags=tags)
-
-    return experiment_id
+# 여러 experiment 를 없으면 만들고 이름 -> experiment id dict 를 돌려준다.
+def ensure_experiments(login_id, login_pwd, experiment_names, tags : dict = None, max_workers=8) :
+    return Session(login_id, login_pwd).ensure_experiments(experiment_names, tags, max_workers)
 
 ########################################
 # registered model 생성/삭제
@@ -104,356 +473,320 @@ def create_registered_model(login_id, login_pwd, name, desc : str = '', tags : d
     # name = "SocialMediaTextAnalyzer"
     # tags = {"nlp.framework": "Spark NLP"}
     # desc = "This sentiment analysis model classifies the tone-happy, sad, angry."
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-
-    client = MlflowClient(tracking_uri=config.get_mlflow_tracking_uri())
-    client.create_registered_model(name, tags, desc)
+    return Session(login_id, login_pwd).create_registered_model(name, desc, tags)
 
 def create_registered_model_if_not_exists(login_id, login_pwd, name, desc : str = '', tags : dict = {}) :
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-
-    client = MlflowClient(tracking_uri=config.get_mlflow_tracking_uri())
-
-    try:
-        model = client.get_registered_model(name)
-        return model.name
-    except MlflowException :
-        pass
+    return Session(login_id, login_pwd).create_registered_model_if_not_exists(name, desc, tags)
 
-    client.create_registered_model(name, tags, desc)
-    model = client.get_registered_model(name)
-
-    return model.name
+# 여러 registered model 을 없으면 만들고 이름 -> 이름 dict 를 돌려준다.
+def ensure_registered_models(login_id, login_pwd, specs, max_workers=8) :
+    return Session(login_id, login_pwd).ensure_registered_models(specs, max_workers)
 
 def get_registered_model(login_id, login_pwd, name) :
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-
-    client = MlflowClient(tracking_uri=config.get_mlflow_tracking_uri())
-    try:
-        model = client.get_registered_model(name)
-        return model.name
-    except MlflowException :
-        return None
+    return Session(login_id, login_pwd).get_registered_model(name)
 
 def delete_registered_model(login_id, login_pwd, registered_model_name) :
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-
-    client = MlflowClient(tracking_uri=config.get_mlflow_tracking_uri())
-    try:
-        model = client.get_registered_model(registered_model_name)
-    except MlflowException :
-        return
-
-    client.delete_registered_model(registered_model_name)
+    return Session(login_id, login_pwd).delete_registered_model(registered_model_name)
 
 ########################################
 # 접근권한 관리
 ########################################
 # registered model 접근권한 설정
 def apply_registered_model_permission(login_id, login_pwd, registered_model_name, user_id, perssion) :
-    # Permission      |  Can read | Can update | Can delete | Can manage
-    # READ               Yes          No           No            No
-    # EDIT               Yes          Yes          No            No
-    # MANAGE             Yes          Yes          Yes           Yes
-    # NO_PERMISSIONS     No           No           No            No  
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-    auth_client = AuthServiceClient(tracking_uri=config.get_mlflow_server_url())
-
-    return auth_client.create_registered_model_permission(name=registered_model_name, username=user_id, permission=perssion)
+    return Session(login_id, login_pwd).apply_registered_model_permission(registered_model_name, user_id, perssion)
 
 # registered model 접근권한 설정 변경
 def update_registered_model_permission(login_id, login_pwd, registered_model_name, user_id, perssion) :
-    # Permission      |  Can read | Can update | Can delete | Can manage
-    # READ               Yes          No           No            No
-    # EDIT               Yes          Yes          No            No
-    # MANAGE             Yes          Yes          Yes           Yes
-    # NO_PERMISSIONS     No           No           No            No  
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-    auth_client = AuthServiceClient(tracking_uri=config.get_mlflow_server_url())
-
-    auth_client.update_registered_model_permission(name=registered_model_name, username=user_id, permission=perssion)
+    return Session(login_id, login_pwd).update_registered_model_permission(registered_model_name, user_id, perssion)
 
 # registered model 접근권한 취소
 def cancel_registered_model_permission(login_id, login_pwd, registered_model_name, user_id) :
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-
-    client = MlflowClient(tracking_uri=config.get_mlflow_tracking_uri())
-    auth_client = AuthServiceClient(tracking_uri=config.get_mlflow_server_url())
-
-    try:
-        model = client.get_registered_model(registered_model_name)
-    except MlflowException :
-        return
-
-    auth_client.delete_registered_model_permission(name=registered_model_name, username=user_id)
+    return Session(login_id, login_pwd).cancel_registered_model_permission(registered_model_name, user_id)
 
 # experiment 접근권한 설정
 def apply_experiment_permission(login_id, login_pwd, experiment_name, user_id, permission) :
-    # Permission      |  Can read | Can update | Can delete | Can manage
-    # READ               Yes          No           No            No
-    # EDIT               Yes          Yes          No            No
-    # MANAGE             Yes          Yes          Yes           Yes
-    # NO_PERMISSIONS     No           No           No            No
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-
-    client = MlflowClient(tracking_uri=config.get_mlflow_server_url())
-    auth_client = AuthServiceClient(tracking_uri=config.get_mlflow_server_url())
-
-    experiment_details = client.get_experiment_by_name(experiment_name)
-
-    if experiment_details :
-        experiment_id = experiment_details.experiment_id
-    else :
-        raise Exception(f'{experiment_name} does not exist.')
-
-    return auth_client.create_experiment_permission(experiment_id=experiment_id, username=user_id, permission=permission)
+    return Session(login_id, login_pwd).apply_experiment_permission(experiment_name, user_id, permission)
 
 # experiment 접근권한 설정 변경
 def update_experiment_permission(login_id, login_pwd, experiment_name, user_id, permission) :
-    # Permission      |  Can read | Can update | Can delete | Can manage
-    # READ               Yes          No           No            No
-    # EDIT               Yes          Yes          No            No
-    # MANAGE             Yes          Yes          Yes           Yes
-    # NO_PERMISSIONS     No           No           No            No
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-
-    client = MlflowClient(tracking_uri=config.get_mlflow_server_url())
-    auth_client = AuthServiceClient(tracking_uri=config.get_mlflow_server_url())
-
-    experiment_details = client.get_experiment_by_name(experiment_name)
-
-    if experiment_details :
-        experiment_id = experiment_details.experiment_id
-    else :
-        raise Exception(f'{experiment_name} does not exist.')
-
-    auth_client.update_experiment_permission(experiment_id=experiment_id, username=user_id, permission=permission)
-
+    return Session(login_id, login_pwd).update_experiment_permission(experiment_name, user_id, permission)
 
 # experiment 접근권한 취소
 def cancel_experiment_permission(login_id, login_pwd, experiment_name, user_id) :
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
-
-    client = MlflowClient(tracking_uri=config.get_mlflow_tracking_uri())
-    auth_client = AuthServiceClient(tracking_uri=config.get_mlflow_server_url())
-
-    experiment_details = client.get_experiment_by_name(experiment_name)
-
-    if experiment_details :
-        experiment_id = experiment_details.experiment_id
-    else :
-        return
-
-    auth_client.delete_experiment_permission(experiment_id=experiment_id, username=user_id)
+    return Session(login_id, login_pwd).cancel_experiment_permission(experiment_name, user_id)
 
 def get_all_experiments(login_id, login_pwd) :
-    set_tracking_user_env(login_id=login_id, login_pwd=login_pwd)
+    return Session(login_id, login_pwd).get_all_experiments()
 
-    client = MlflowClient(tracking_uri=config.get_mlflow_tracking_uri())
-    return client.search_experiments()
+def iter_experiments(login_id, login_pwd, view_type=None, filter_string=None, order_by=None,
+                     page_size=1000, max_results=None, prefetch=True) :
+    return Session(login_id, login_pwd).iter_experiments(view_type, filter_string, order_by, page_size, max_results, prefetch)
 
 ########################################
 # MLFlosw Dabase 직접 접근
 ########################################
+# 조회 함수는 연결이 끊기는 등 일시적인 DB 오류가 나면 deadline 안에서 다시 실행한다. (retry.stats() 의 backend 이름)
+AUTH_DB = 'auth_db'
+TRACKING_DB = 'tracking_db'
+
 # 관리자인지 확인
+@instrumentation.operation('get_is_admin')
+@retry.idempotent(AUTH_DB, retry.is_transient_db_error)
 def get_is_admin(user_name) :
-    #establishing the connection
-    conn = psycopg2.connect(config.get_mlflow_tracking_auth_uri())
+    with db.auth_read_connection() as conn :
+        r = queries.execute(conn, queries.IS_ADMIN, (user_name,), psycopg2.extras.RealDictCursor).fetchone()
 
-    sql = f"""
-    SELECT  is_admin
-    FROM    users
-    WHERE   username='{user_name}'
-    """
-
-    cursor = conn.cursor(cursor_factory = psycopg2.extras.RealDictCursor)
-    cursor.execute(sql)
-    r = cursor.fetchone()
     if not r : return False
-    
-    #Closing the connection
-    conn.close()
-    
+
     if 'is_admin' in r :
         return r['is_admin']
     return False
 
+# experiment 하나의 artifact location 을 <artifact_location>/<experiment_id> 로 변경한다.
+# 여러 experiment 를 옮길 때는 migration.relocate_artifacts 를 사용한다.
+@instrumentation.operation('update_artifact_location')
 def update_artifact_location(experiment_id, artifact_location) :
-    #establishing the connection
-    conn = psycopg2.connect(
-       database="mlflow", user='mlflow', password='mlflow', host='apache-airflow-postgresql.default.svc.cluster.local', port= '5432'
-    )
-
-    #Setting auto commit false
-    conn.autocommit = True
-
-    #Creating a cursor object using the cursor() method
-    cursor = conn.cursor()
     artifact_location = os.path.join(artifact_location, str(experiment_id))
 
-    update_sql = f"""
+    update_sql = """
     UPDATE experiments
-    SET artifact_location = '{artifact_location}'
-    WHERE experiment_id = {experiment_id}
+    SET artifact_location = %s
+    WHERE experiment_id = %s
     """
 
-    #Doping EMPLOYEE table if already exists.
-    cursor.execute(update_sql)
-
-    #Commit your changes in the database
-    conn.commit()
-    
-    #Closing the connection
-    conn.close()
+    # 정상 종료 시 commit, 예외 발생 시 rollback 후 연결을 pool 에 반납한다.
+    try:
+        with db.tracking_connection() as conn :
+            db.execute(conn, update_sql, (artifact_location, int(experiment_id)))
+    finally:
+        # 이름 -> Experiment cache 에는 예전 artifact_location 이 들어 있다.
+        experiment_cache.clear()
+        _resource_changed()
 
 # 접근권한을 가지고 있는 experiment id 조회
+@instrumentation.operation('get_experiment_permissions')
+@retry.idempotent(AUTH_DB, retry.is_transient_db_error)
 def get_experiment_permissions(user_name) :
-    #establishing the connection
-    conn = psycopg2.connect(config.get_mlflow_tracking_auth_uri())
-    
-    sql = f"""
-    SELECT  experiment_id,
-        user_id,
-        permission
-    FROM   experiment_permissions experiments
-    INNER JOIN (
-        SELECT  id
-        FROM    users
-        WHERE   username='{user_name}'
-    ) users
-    ON experiments.user_id = users.id
-    """
+    with db.auth_read_connection() as conn :
+        records = queries.execute(conn, queries.EXPERIMENT_PERMISSIONS, (user_name,), psycopg2.extras.RealDictCursor).fetchall()
 
-    cursor = conn.cursor(cursor_factory = psycopg2.extras.RealDictCursor)
-    cursor.execute(sql)
-    records = cursor.fetchall()
-    
-    rtn = []
-    for r in records:
-        rtn.append(dict(r))
+    with instrumentation.phase(instrumentation.MATERIALIZE) :
+        rtn = []
+        for r in records:
+            rtn.append(dict(r))
+
+    return rtn
+
+# 관리자 여부와 접근권한을 가지고 있는 experiment id 목록을 한번의 조회로 가져온다.
+# 사용자가 없으면 (False, []) 를 반환한다.
+@instrumentation.operation('resolve_experiment_permissions')
+@retry.idempotent(AUTH_DB, retry.is_transient_db_error)
+def resolve_experiment_permissions(user_name) :
+    with db.auth_read_connection() as conn :
+        r = queries.execute(conn, queries.RESOLVE_EXPERIMENT_PERMISSIONS, (user_name,)).fetchone()
+
+    if not r : return False, []
+
+    # auth DB 는 experiment_id 를 문자열로 저장하므로 tracking DB 의 integer id 로 변환한다.
+    experiment_ids = [int(i) for i in r[1] if str(i).isdigit()]
+    return bool(r[0]), experiment_ids
+
+# 접근권한을 가지고 있는 experiment 를 experiment_id 순으로 page 단위 조회 (keyset pagination)
+# 다음 page 는 이전 page 마지막 row 의 experiment_id 를 after_experiment_id 로 넘겨서 조회한다.
+@instrumentation.operation('list_experiments_by_permission')
+def list_experiments_by_permission(user_name, page_size=None, after_experiment_id=None) :
+    return _cached('list_experiments_by_permission', user_name, (page_size, after_experiment_id), permission_index.EXPERIMENT,
+                   lambda : _list_experiments_by_permission(user_name, page_size, after_experiment_id))
+
+def _list_experiments_by_permission(user_name, page_size, after_experiment_id) :
+    is_admin, experiment_ids = resolve_experiment_permissions(user_name)
+
+    if not is_admin and len(experiment_ids) < 1:
+        return []
+
+    return _select_experiments(is_admin, experiment_ids, page_size, after_experiment_id)
+
+@retry.idempotent(TRACKING_DB, retry.is_transient_db_error)
+def _select_experiments(is_admin, experiment_ids, page_size=None, after_experiment_id=None) :
+    # 처음 page 는 -1 부터 (experiment_id 는 0 부터 시작한다.)
+    after_experiment_id = -1 if after_experiment_id is None else int(after_experiment_id)
+    with db.tracking_read_connection() as conn :
+        if is_admin :
+            cursor = queries.execute(conn, queries.ALL_EXPERIMENTS_PAGE,
+                                     (after_experiment_id, page_size), psycopg2.extras.RealDictCursor)
+        else :
+            cursor = queries.execute(conn, queries.EXPERIMENTS_BY_IDS_PAGE,
+                                     (experiment_ids, after_experiment_id, page_size), psycopg2.extras.RealDictCursor)
+        recoreds = cursor.fetchall()
+
+    with instrumentation.phase(instrumentation.MATERIALIZE) :
+        rtn = []
+        for row in recoreds:
+            rtn.append(dict(row))
 
-    conn.close()
-    
     return rtn
 
 # 접근권한을 가지고 있는 experiment 전체정보 조회
+@instrumentation.operation('get_experiments_by_permission')
 def get_experiments_by_permission(user_name) :
-    
-    is_admin = get_is_admin(user_name)
-    
-    if not is_admin :
-        permissions = get_experiment_permissions(user_name)
+    return list_experiments_by_permission(user_name)
 
-        if len(permissions) < 1:
-            return []
+# 사용자 registered model 권한 조회
+@instrumentation.operation('get_registered_model_permissions')
+@retry.idempotent(AUTH_DB, retry.is_transient_db_error)
+def get_registered_model_permissions(user_name) :
+    with db.auth_read_connection() as conn :
+        records = queries.execute(conn, queries.REGISTERED_MODEL_PERMISSIONS, (user_name,), psycopg2.extras.RealDictCursor).fetchall()
 
-        exps=[]
-        for p in permissions:
-            exps.append(p['experiment_id'])
+    with instrumentation.phase(instrumentation.MATERIALIZE) :
+        rtn = []
+        for r in records:
+            rtn.append(dict(r))
 
-        exps = ', '.join(map(str,exps))
+    return rtn
 
-        sql = f"""
-            SELECT *
-            FROM experiments
-            WHERE experiment_id In ({exps});
-            """
-    else:
-        sql = """
-            SELECT *
-            FROM experiments
-            """
-        
-    conn = psycopg2.connect(config.get_mlflow_tracking_uri())
-    cursor = conn.cursor(cursor_factory = psycopg2.extras.RealDictCursor)
-    cursor.execute(sql)
+# 관리자 여부와 접근권한을 가지고 있는 registered model 이름 목록을 한번의 조회로 가져온다.
+# 사용자가 없으면 (False, []) 를 반환한다.
+@instrumentation.operation('resolve_registered_model_permissions')
+@retry.idempotent(AUTH_DB, retry.is_transient_db_error)
+def resolve_registered_model_permissions(user_name) :
+    with db.auth_read_connection() as conn :
+        r = queries.execute(conn, queries.RESOLVE_REGISTERED_MODEL_PERMISSIONS, (user_name,)).fetchone()
+
+    if not r : return False, []
+
+    return bool(r[0]), list(r[1])
+
+# 사용자 권한으로 볼 수 있는 registered model 을 name 순으로 page 단위 조회 (keyset pagination)
+# 다음 page 는 이전 page 마지막 row 의 name 을 after_name 으로 넘겨서 조회한다.
+@instrumentation.operation('list_registered_models_by_permission')
+def list_registered_models_by_permission(user_name, page_size=None, after_name=None) :
+    return _cached('list_registered_models_by_permission', user_name, (page_size, after_name), permission_index.REGISTERED_MODEL,
+                   lambda : _list_registered_models_by_permission(user_name, page_size, after_name))
+
+def _list_registered_models_by_permission(user_name, page_size, after_name) :
+    is_admin, names = resolve_registered_model_permissions(user_name)
+
+    if not is_admin and len(names) < 1:
+        return []
+
+    return _select_registered_models(is_admin, names, page_size, after_name)
+
+@retry.idempotent(TRACKING_DB, retry.is_transient_db_error)
+def _select_registered_models(is_admin, names, page_size=None, after_name=None) :
+    after_name = '' if after_name is None else after_name
+    with db.tracking_read_connection() as conn :
+        if is_admin :
+            cursor = queries.execute(conn, queries.ALL_REGISTERED_MODELS_PAGE,
+                                     (after_name, page_size), psycopg2.extras.RealDictCursor)
+        else :
+            cursor = queries.execute(conn, queries.REGISTERED_MODELS_BY_NAMES_PAGE,
+                                     (names, after_name, page_size), psycopg2.extras.RealDictCursor)
+        recoreds = cursor.fetchall()
+
+    with instrumentation.phase(instrumentation.MATERIALIZE) :
+        rtn = []
+        for row in recoreds:
+            rtn.append(dict(row))
 
-    recoreds = cursor.fetchall()
+    return rtn
 
-    rtn = []
-    for row in recoreds:
-        rtn.append(dict(row))
+# 사용자 권한으로 볼 수 있는 registered model 조회
+@instrumentation.operation('get_registered_model_by_permission')
+def get_registered_model_by_permission(user_name) :
+    return _cached('get_registered_model_by_permission', user_name, (), permission_index.REGISTERED_MODEL,
+                   lambda : _get_registered_model_by_permission(user_name))
 
-    conn.close()
+def _get_registered_model_by_permission(user_name) :
+    is_admin, names = resolve_registered_model_permissions(user_name)
 
-    return rtn
+    if not is_admin and len(names) < 1:
+        return None
 
-# 사용자 registered model 권한 조회
-def get_registered_model_permissions(user_name) :
-    #establishing the connection
-    conn = psycopg2.connect(config.get_mlflow_tracking_auth_uri())
-    
-    sql = f"""
-    SELECT  registered.id as registered_id,
-            name,
-            user_id,
-            permission
-    FROM   registered_model_permissions registered
-    INNER  JOIN (
-        SELECT  id
-        FROM    users
-        WHERE   username='{user_name}'
-    ) users
-    ON registered.user_id = users.id
-    """
+    return _select_registered_models(is_admin, names)
 
-    cursor = conn.cursor(cursor_factory = psycopg2.extras.RealDictCursor)
-    cursor.execute(sql)
-    records = cursor.fetchall()
-    
-    rtn = []
-    for r in records:
-        rtn.append(dict(r))
+########################################
+# 대용량 조회 (server-side cursor streaming)
+########################################
+EXPERIMENT_COLUMNS = ('experiment_id', 'name', 'artifact_location', 'lifecycle_stage', 'creation_time', 'last_update_time')
+EXPERIMENT_PERMISSION_COLUMNS = ('experiment_id', 'user_id', 'permission')
+
+def _projection(columns, allowed) :
+    columns = tuple(columns) if columns else allowed
+    unknown = [c for c in columns if c not in allowed]
+    if unknown :
+        raise ValueError(f'unknown columns : {unknown} (use {allowed})')
+    return columns
+
+# 접근권한을 가지고 있는 experiment 를 experiment_id 순으로 batch_size 건씩 받아 하나씩 돌려준다.
+#  - columns 로 필요한 컬럼만 조회한다.
+#  - row_type : tuple(기본) / record / dict
+#   for experiment_id, name in iter_experiments_by_permission(user_name, columns=('experiment_id', 'name')) : ...
+@instrumentation.operation('iter_experiments_by_permission', iterator=True)
+def iter_experiments_by_permission(user_name, columns=None, batch_size=1000, row_type=db.TUPLE_ROW) :
+    columns = _projection(columns, EXPERIMENT_COLUMNS)
+    is_admin, experiment_ids = resolve_experiment_permissions(user_name)
+
+    if not is_admin and len(experiment_ids) < 1:
+        return iter(())
+
+    where = ''
+    params = None
+    if not is_admin :
+        where = 'WHERE experiment_id = ANY(%s)'
+        params = (experiment_ids,)
 
-    #Closing the connection
-    conn.close()
+    sql = f"""
+        SELECT {', '.join(columns)}
+        FROM experiments
+        {where}
+        ORDER BY experiment_id
+        """
+    return db.stream(config.get_mlflow_tracking_uri(), sql, params, batch_size, db.row_factory(columns, row_type), readonly=True)
 
-    return rtn
+# 접근권한을 가지고 있는 experiment 를 컬럼 단위로 조회한다. (format : dict / numpy / pandas)
+@instrumentation.operation('get_experiments_by_permission_columns')
+def get_experiments_by_permission_columns(user_name, columns=None, format='dict', batch_size=1000) :
+    columns = _projection(columns, EXPERIMENT_COLUMNS)
+    rows = iter_experiments_by_permission(user_name, columns, batch_size)
+    return db.to_columns(rows, columns, format)
 
-# 사용자 권한으로 볼 수 있는 registered model 조회
-def get_registered_model_by_permission(user_name) :
-    
-    is_admin = get_is_admin(user_name)
-    
-    if not is_admin :
-        permissions = get_registered_model_permissions(user_name)
-        print(permissions)
-        if len(permissions) < 1:
-            return None
+# 사용자 권한으로 볼 수 있는 registered model 이름을 name 순으로 하나씩 돌려준다.
+@instrumentation.operation('iter_registered_models_by_permission', iterator=True)
+def iter_registered_models_by_permission(user_name, batch_size=1000, row_type=db.TUPLE_ROW) :
+    is_admin, names = resolve_registered_model_permissions(user_name)
 
-        exps=''
+    if not is_admin and len(names) < 1:
+        return iter(())
 
-        for p in permissions:
-            name = p['name']
-            if exps :
-                exps = exps + f", '{name}'"
-            else:
-                exps = f"'{name}'"
+    where = ''
+    params = None
+    if not is_admin :
+        where = 'WHERE name = ANY(%s)'
+        params = (names,)
 
-        sql = f"""
-        SELECT DISTINCT name
-        FROM model_versions
-        WHERE name In ({exps});
-        """
-    else:
-        sql = f"""
+    sql = f"""
         SELECT DISTINCT name
         FROM model_versions
+        {where}
+        ORDER BY name
         """
+    return db.stream(config.get_mlflow_tracking_uri(), sql, params, batch_size, db.row_factory(('name',), row_type), readonly=True)
 
-    conn = psycopg2.connect(config.get_mlflow_tracking_uri())
-    cursor = conn.cursor(cursor_factory = psycopg2.extras.RealDictCursor)
-    cursor.execute(sql)
-
-    recoreds = cursor.fetchall()
-
-    rtn = []
-    for row in recoreds:
-        rtn.append(dict(row))
-
-    conn.close()
+# 사용자의 experiment 접근권한을 하나씩 돌려준다.
+@instrumentation.operation('iter_experiment_permissions', iterator=True)
+def iter_experiment_permissions(user_name, columns=None, batch_size=1000, row_type=db.TUPLE_ROW) :
+    columns = _projection(columns, EXPERIMENT_PERMISSION_COLUMNS)
 
-    return rtn
+    sql = f"""
+    SELECT  {', '.join('permissions.' + c for c in columns)}
+    FROM    experiment_permissions permissions
+    INNER JOIN users
+    ON      permissions.user_id = users.id
+    WHERE   users.username = %s
+    ORDER BY permissions.id
+    """
+    return db.stream(config.get_mlflow_tracking_auth_uri(), sql, (user_name,), batch_size, db.row_factory(columns, row_type), readonly=True)
 
 if __name__ == "__main__":
     login_id='tes1'
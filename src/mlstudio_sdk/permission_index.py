@@ -0,0 +1,274 @@
+import threading
+import weakref
+from mlstudio_sdk import db
+
+EXPERIMENT = 'experiment'
+REGISTERED_MODEL = 'registered_model'
+
+CAN_READ = 1
+CAN_UPDATE = 2
+CAN_DELETE = 4
+CAN_MANAGE = 8
+ALL_PERMISSIONS = CAN_READ | CAN_UPDATE | CAN_DELETE | CAN_MANAGE
+
+# Permission      |  Can read | Can update | Can delete | Can manage
+# READ               Yes          No           No            No
+# EDIT               Yes          Yes          No            No
+# MANAGE             Yes          Yes          Yes           Yes
+# NO_PERMISSIONS     No           No           No            No
+PERMISSION_MASKS = {
+    'READ': CAN_READ,
+    'EDIT': CAN_READ | CAN_UPDATE,
+    'MANAGE': ALL_PERMISSIONS,
+    'NO_PERMISSIONS': 0,
+}
+
+def permission_mask(permission) :
+    return PERMISSION_MASKS.get(permission, 0)
+
+# 사용자 한명의 권한 정보. 갱신할 때는 새 객체로 통째로 바꾼다.
+class _UserPermissions(object) :
+    __slots__ = ('user_id', 'is_admin', 'experiments', 'registered_models')
+
+    def __init__(self, user_id, is_admin) :
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.experiments = {}
+        self.registered_models = {}
+
+_indexes = weakref.WeakSet()
+
+########################################
+# 메모리 권한 색인
+########################################
+# auth DB 의 users / experiment_permissions / registered_model_permissions 를 읽어
+# (사용자, experiment 또는 registered model) 별 권한 bitmask 를 메모리에 보관한다.
+#   index = PermissionIndex()
+#   index.can_read('user1', experiment_id)
+#   index.can_read_many('user1', experiment_ids)
+#  - 관리자는 모든 권한을 가진다.
+#  - 권한 행이 없으면 default_permission 을 적용한다. (MLflow basic-auth 의 default_permission)
+#  - refresh() 는 새로 추가된 사용자/권한 행과 무효화된 사용자만 다시 읽는다.
+#  - 이 SDK 로 권한을 변경하면 해당 사용자는 무효화되어 다음 확인 시 다시 읽는다.
+class PermissionIndex(object) :
+    def __init__(self, default_permission=None, load=True) :
+        self.default_mask = permission_mask(default_permission)
+
+        self._users = {}
+        self._names_by_id = {}
+        self._dirty = set()
+        self._last_user_id = 0
+        self._last_experiment_permission_id = 0
+        self._last_registered_model_permission_id = 0
+        self._lock = threading.RLock()
+
+        _indexes.add(self)
+        if load :
+            self.rebuild()
+
+    ########################################
+    # 권한 확인
+    ########################################
+    def mask(self, user_name, resource_id, resource_type=EXPERIMENT) :
+        user = self._user(user_name)
+        if user is None :
+            return 0
+        if user.is_admin :
+            return ALL_PERMISSIONS
+
+        if resource_type == EXPERIMENT :
+            return user.experiments.get(str(resource_id), self.default_mask)
+        return user.registered_models.get(resource_id, self.default_mask)
+
+    def check(self, user_name, resource_id, required, resource_type=EXPERIMENT) :
+        return self.mask(user_name, resource_id, resource_type) & required == required
+
+    def can_read(self, user_name, resource_id, resource_type=EXPERIMENT) :
+        return self.check(user_name, resource_id, CAN_READ, resource_type)
+
+    def can_update(self, user_name, resource_id, resource_type=EXPERIMENT) :
+        return self.check(user_name, resource_id, CAN_UPDATE, resource_type)
+
+    def can_delete(self, user_name, resource_id, resource_type=EXPERIMENT) :
+        return self.check(user_name, resource_id, CAN_DELETE, resource_type)
+
+    def can_manage(self, user_name, resource_id, resource_type=EXPERIMENT) :
+        return self.check(user_name, resource_id, CAN_MANAGE, resource_type)
+
+    # 한 사용자의 여러 resource 를 한번에 확인한다. resource_ids 와 같은 순서의 bool list 를 돌려준다.
+    def check_many(self, user_name, resource_ids, required, resource_type=EXPERIMENT) :
+        user = self._user(user_name)
+        if user is None :
+            return [False] * len(resource_ids)
+        if user.is_admin :
+            return [True] * len(resource_ids)
+
+        default = self.default_mask
+        if resource_type == EXPERIMENT :
+            get = user.experiments.get
+            return [get(str(i), default) & required == required for i in resource_ids]
+        get = user.registered_models.get
+        return [get(i, default) & required == required for i in resource_ids]
+
+    def can_read_many(self, user_name, resource_ids, resource_type=EXPERIMENT) :
+        return self.check_many(user_name, resource_ids, CAN_READ, resource_type)
+
+    def can_update_many(self, user_name, resource_ids, resource_type=EXPERIMENT) :
+        return self.check_many(user_name, resource_ids, CAN_UPDATE, resource_type)
+
+    def can_delete_many(self, user_name, resource_ids, resource_type=EXPERIMENT) :
+        return self.check_many(user_name, resource_ids, CAN_DELETE, resource_type)
+
+    def can_manage_many(self, user_name, resource_ids, resource_type=EXPERIMENT) :
+        return self.check_many(user_name, resource_ids, CAN_MANAGE, resource_type)
+
+    def _user(self, user_name) :
+        if self._dirty and user_name in self._dirty :
+            self._reload_users([user_name])
+        return self._users.get(user_name)
+
+    ########################################
+    # 적재 / 갱신
+    ########################################
+    # auth DB 전체를 다시 읽는다.
+    def rebuild(self) :
+        with self._lock :
+            with db.auth_connection() as conn :
+                cursor = conn.cursor()
+                user_rows = _fetch_users(cursor, 'WHERE id > %s', (0,))
+                experiment_rows = _fetch_experiment_permissions(cursor, 'WHERE id > %s', (0,))
+                model_rows = _fetch_registered_model_permissions(cursor, 'WHERE id > %s', (0,))
+
+            users = {}
+            self._names_by_id = {}
+            self._add_users(users, user_rows)
+            self._apply_permissions(users, experiment_rows, 'experiments', copy=False)
+            self._apply_permissions(users, model_rows, 'registered_models', copy=False)
+
+            self._users = users
+            self._dirty = set()
+            self._last_user_id = max([r[0] for r in user_rows], default=0)
+            self._last_experiment_permission_id = max([r[0] for r in experiment_rows], default=0)
+            self._last_registered_model_permission_id = max([r[0] for r in model_rows], default=0)
+
+    # 마지막 적재 이후 추가된 사용자/권한 행과 무효화된 사용자만 다시 읽는다.
+    # 권한 행의 변경/삭제는 auth DB 에서 알 수 없으므로 무효화(invalidate_user) 또는 rebuild() 로 반영한다.
+    def refresh(self) :
+        with self._lock :
+            if self._dirty :
+                self._reload_users(list(self._dirty))
+
+            with db.auth_connection() as conn :
+                cursor = conn.cursor()
+                user_rows = _fetch_users(cursor, 'WHERE id > %s', (self._last_user_id,))
+                experiment_rows = _fetch_experiment_permissions(cursor, 'WHERE id > %s', (self._last_experiment_permission_id,))
+                model_rows = _fetch_registered_model_permissions(cursor, 'WHERE id > %s', (self._last_registered_model_permission_id,))
+
+            if not user_rows and not experiment_rows and not model_rows :
+                return
+
+            users = dict(self._users)
+            self._add_users(users, user_rows)
+            self._apply_permissions(users, experiment_rows, 'experiments', copy=True)
+            self._apply_permissions(users, model_rows, 'registered_models', copy=True)
+            self._users = users
+
+            self._last_user_id = max([self._last_user_id] + [r[0] for r in user_rows])
+            self._last_experiment_permission_id = max([self._last_experiment_permission_id] + [r[0] for r in experiment_rows])
+            self._last_registered_model_permission_id = max([self._last_registered_model_permission_id] + [r[0] for r in model_rows])
+
+    def invalidate_user(self, user_name) :
+        with self._lock :
+            self._dirty.add(user_name)
+
+    # resource 권한을 가진 사용자 전체를 무효화한다. (experiment / registered model 삭제 시)
+    def invalidate_resource(self, resource_id, resource_type=EXPERIMENT) :
+        key = str(resource_id) if resource_type == EXPERIMENT else resource_id
+        with self._lock :
+            for name, user in self._users.items() :
+                permissions = user.experiments if resource_type == EXPERIMENT else user.registered_models
+                if key in permissions :
+                    self._dirty.add(name)
+
+    def _reload_users(self, user_names) :
+        with self._lock :
+            user_names = [name for name in user_names if name in self._dirty]
+            if not user_names :
+                return
+
+            with db.auth_connection() as conn :
+                cursor = conn.cursor()
+                user_rows = _fetch_users(cursor, 'WHERE username = ANY(%s)', (user_names,))
+                ids = [r[0] for r in user_rows]
+                experiment_rows = _fetch_experiment_permissions(cursor, 'WHERE user_id = ANY(%s)', (ids,)) if ids else []
+                model_rows = _fetch_registered_model_permissions(cursor, 'WHERE user_id = ANY(%s)', (ids,)) if ids else []
+
+            users = dict(self._users)
+            for name in user_names :
+                user = users.pop(name, None)
+                if user is not None :
+                    self._names_by_id.pop(user.user_id, None)
+            self._add_users(users, user_rows)
+            self._apply_permissions(users, experiment_rows, 'experiments', copy=False)
+            self._apply_permissions(users, model_rows, 'registered_models', copy=False)
+
+            self._users = users
+            self._dirty.difference_update(user_names)
+
+    def _add_users(self, users, user_rows) :
+        for user_id, user_name, is_admin in user_rows :
+            users[user_name] = _UserPermissions(user_id, bool(is_admin))
+            self._names_by_id[user_id] = user_name
+
+    # 권한 행을 반영한다. copy 이면 이미 공개된 사용자 객체는 복사본을 만들어 바꾼다. (읽기는 lock 없이 수행)
+    def _apply_permissions(self, users, rows, attr, copy) :
+        copied = set()
+        for _, user_id, resource_id, permission in rows :
+            name = self._names_by_id.get(user_id)
+            user = users.get(name) if name is not None else None
+            if user is None :
+                continue
+            if copy and name not in copied :
+                user = _copy_user(user)
+                users[name] = user
+                copied.add(name)
+            getattr(user, attr)[resource_id] = permission_mask(permission)
+
+    def stats(self) :
+        users = self._users
+        return {
+            'users': len(users),
+            'experiment_permissions': sum(len(u.experiments) for u in users.values()),
+            'registered_model_permissions': sum(len(u.registered_models) for u in users.values()),
+            'dirty_users': len(self._dirty),
+        }
+
+def _copy_user(user) :
+    copied = _UserPermissions(user.user_id, user.is_admin)
+    copied.experiments = dict(user.experiments)
+    copied.registered_models = dict(user.registered_models)
+    return copied
+
+def _fetch_users(cursor, where, params) :
+    cursor.execute(f'SELECT id, username, is_admin FROM users {where}', params)
+    return cursor.fetchall()
+
+def _fetch_experiment_permissions(cursor, where, params) :
+    cursor.execute(f'SELECT id, user_id, experiment_id, permission FROM experiment_permissions {where}', params)
+    return cursor.fetchall()
+
+def _fetch_registered_model_permissions(cursor, where, params) :
+    cursor.execute(f'SELECT id, user_id, name, permission FROM registered_model_permissions {where}', params)
+    return cursor.fetchall()
+
+########################################
+# SDK 변경 알림
+########################################
+# 살아있는 모든 PermissionIndex 에서 사용자를 무효화한다.
+def invalidate_user(user_name) :
+    for index in list(_indexes) :
+        index.invalidate_user(user_name)
+
+def invalidate_resource(resource_id, resource_type=EXPERIMENT) :
+    for index in list(_indexes) :
+        index.invalidate_resource(resource_id, resource_type)
@@ -0,0 +1,226 @@
+import os
+import csv
+import json
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from mlstudio_sdk import db
+from mlstudio_sdk import instrumentation
+from mlstudio_sdk import retry
+from mlstudio_sdk.common import bind_context
+from mlstudio_sdk.mlflow_api import AUTH_DB, Session, _permissions_changed
+
+CREATE = 'create'
+DELETE = 'delete'
+GRANT_ADMIN = 'grant_admin'
+REVOKE_ADMIN = 'revoke_admin'
+SKIP = 'skip'
+
+FORMATS = ('csv', 'jsonl')
+
+# 있어야 하는 사용자 한명
+#   password      : 비밀번호 (생성할 때만 사용)
+#   password_env  : 비밀번호를 읽을 환경변수 이름 (password 가 없을 때)
+#   password_file : 비밀번호를 읽을 파일 경로 (password, password_env 가 없을 때, 앞뒤 공백 제거)
+UserSpec = namedtuple('UserSpec', ['username', 'is_admin', 'password', 'password_env', 'password_file'])
+
+# 사용자 한명의 처리 결과
+#   action : create / delete / grant_admin / revoke_admin / skip
+#   status : ok / skipped / failed
+UserResult = namedtuple('UserResult', ['username', 'action', 'status', 'error'])
+
+class ProvisioningError(Exception) :
+    pass
+
+def user_spec(username, is_admin=False, password=None, password_env=None, password_file=None) :
+    return UserSpec(username, is_admin, password, password_env, password_file)
+
+########################################
+# 사용자 일괄 동기화
+########################################
+# auth DB 의 사용자를 desired 와 같게 맞춘다.
+#  - desired : UserSpec / dict 의 iterable, 또는 JSONL / CSV 파일 경로 (read_users 참고)
+#  - 현재 사용자는 한번의 조회로 읽고, 필요한 생성 / 삭제 / 관리자 변경만 max_workers 개의 thread 에서 동시에 처리한다.
+#  - delete_missing 이면 desired 에 없는 사용자를 지운다. (기본은 지우지 않음)
+#    잘린 입력 등으로 많은 사용자가 지워지지 않도록 max_deletes 를 같이 주어야 하며, 넘게 지워야 하면 아무것도 바꾸지 않고 ProvisioningError
+#    로그인한 사용자(login_id)와 keep 의 사용자는 지우지 않는다.
+#    관리자는 delete_admins 에 이름을 직접 준 경우에만 지운다.
+#  - dry_run 이면 바꾸지 않고 할 일만 돌려준다. (status : skipped)
+#  - progress(done, total, result) 는 생성 / 삭제 / 관리자 변경이 하나 끝날 때마다 호출된다.
+#  - 결과는 사용자 이름 순의 UserResult list (바꿀 것이 없는 사용자는 skip)
+#   results = provisioning.reconcile_users(login_id, login_pwd, 'users.jsonl', keep=['admin'])
+@instrumentation.operation('reconcile_users')
+def reconcile_users(login_id, login_pwd, desired, delete_missing=False, keep=(), max_deletes=None,
+                    delete_admins=(), dry_run=False, max_workers=8, progress=None) :
+    if delete_missing and max_deletes is None :
+        raise ValueError('max_deletes is required when delete_missing is set')
+
+    if isinstance(desired, (str, os.PathLike)) :
+        desired = read_users(desired)
+    specs = {}
+    for item in desired :
+        spec = _spec(item)
+        specs[spec.username] = spec
+
+    current = _current_users()
+    plan = _plan(specs, current, delete_missing, set(keep) | ({login_id} if login_id else set()), set(delete_admins))
+
+    deletes = sum(1 for _, action, _ in plan if action == DELETE)
+    if max_deletes is not None and deletes > max_deletes :
+        raise ProvisioningError(f'{deletes} users would be deleted (max_deletes={max_deletes})')
+
+    results = {}
+    jobs = []
+    for username, action, spec in plan :
+        if action == SKIP :
+            results[username] = UserResult(username, SKIP, 'skipped', None)
+        elif dry_run :
+            results[username] = UserResult(username, action, 'skipped', 'dry run')
+        else :
+            jobs.append((username, action, spec))
+
+    # 바꿀 것이 없는 사용자는 처리된 것으로 센다.
+    done = len(results)
+    total = len(plan)
+
+    if jobs :
+        auth_client = Session(login_id, login_pwd)._auth_client()
+
+        def work(job) :
+            username, action, spec = job
+            try:
+                _apply(auth_client, action, spec, username)
+                return UserResult(username, action, 'ok', None)
+            except Exception as e :
+                return UserResult(username, action, 'failed', str(e))
+            finally:
+                _permissions_changed(username)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as executor :
+            futures = [executor.submit(bind_context(work), job) for job in jobs]
+            for future in as_completed(futures) :
+                result = future.result()
+                results[result.username] = result
+                done += 1
+                if progress is not None :
+                    progress(done, total, result)
+
+    return [results[username] for username, _, _ in plan]
+
+# 현재 사용자 -> 관리자 여부 (한번의 조회)
+# 직전에 바꾼 사용자도 보이도록 replica 가 아닌 primary 에서 읽는다.
+@retry.idempotent(AUTH_DB, retry.is_transient_db_error)
+def _current_users() :
+    with db.auth_connection() as conn :
+        rows = db.execute(conn, 'SELECT username, is_admin FROM users').fetchall()
+    return {username: bool(is_admin) for username, is_admin in rows}
+
+def _plan(specs, current, delete_missing, keep, delete_admins=frozenset()) :
+    plan = []
+    for username in sorted(set(specs) | set(current)) :
+        spec = specs.get(username)
+        if spec is None :
+            deletable = username not in keep and (not current[username] or username in delete_admins)
+            action = DELETE if delete_missing and deletable else SKIP
+        elif username not in current :
+            action = CREATE
+        elif spec.is_admin != current[username] :
+            action = GRANT_ADMIN if spec.is_admin else REVOKE_ADMIN
+        else :
+            action = SKIP
+        plan.append((username, action, spec))
+    return plan
+
+def _apply(auth_client, action, spec, username) :
+    if action == CREATE :
+        auth_client.create_user(username=username, password=_password(spec))
+        if spec.is_admin :
+            auth_client.update_user_admin(username=username, is_admin=True)
+    elif action == DELETE :
+        auth_client.delete_user(username=username)
+    else :
+        auth_client.update_user_admin(username=username, is_admin=action == GRANT_ADMIN)
+
+# 비밀번호는 생성할 때만 읽는다.
+def _password(spec) :
+    if spec.password :
+        return spec.password
+    if spec.password_env :
+        password = os.environ.get(spec.password_env)
+        if not password :
+            raise ProvisioningError(f'environment variable {spec.password_env} is not set')
+        return password
+    if spec.password_file :
+        with open(spec.password_file, 'r', encoding='utf-8') as f :
+            password = f.read().strip()
+        if not password :
+            raise ProvisioningError(f'password file {spec.password_file} is empty')
+        return password
+    raise ProvisioningError('no password, password_env or password_file')
+
+_TRUE = ('1', 'true', 'yes', 'y', 't')
+_FALSE = ('', '0', 'false', 'no', 'n', 'f')
+
+def _bool(value) :
+    if isinstance(value, bool) :
+        return value
+    if value is None :
+        return False
+    text = str(value).strip().lower()
+    if text in _TRUE :
+        return True
+    if text in _FALSE :
+        return False
+    raise ValueError(f'invalid is_admin value : {value!r}')
+
+def _spec(item) :
+    if isinstance(item, UserSpec) :
+        spec = item._replace(is_admin=_bool(item.is_admin))
+    elif isinstance(item, dict) :
+        unknown = set(item) - set(UserSpec._fields)
+        if unknown :
+            raise ValueError(f'unknown user fields : {sorted(unknown)} (use {UserSpec._fields})')
+        spec = UserSpec(item.get('username'), _bool(item.get('is_admin')), item.get('password') or None,
+                        item.get('password_env') or None, item.get('password_file') or None)
+    else :
+        raise TypeError(f'invalid user : {item!r} (use UserSpec or dict)')
+
+    if not spec.username or not str(spec.username).strip() :
+        raise ValueError(f'username is required : {item!r}')
+    return spec._replace(username=str(spec.username).strip())
+
+########################################
+# JSONL / CSV 입력
+########################################
+# 파일 경로 또는 열린 text file 에서 UserSpec 을 하나씩 읽는다. (format 을 생략하면 확장자로 정한다.)
+#   jsonl : {"username": "user1", "password_env": "USER1_PASSWORD", "is_admin": false}
+#   csv   : username,is_admin,password,password_env,password_file 중 필요한 컬럼만 header 로 둔다.
+def read_users(source, format=None) :
+    if format is None :
+        name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', '')
+        format = os.path.splitext(str(name))[1].lstrip('.').lower()
+        format = 'jsonl' if format in ('json', 'ndjson') else format
+    if format not in FORMATS :
+        raise ValueError(f'invalid format : {format} (use one of {FORMATS})')
+
+    if isinstance(source, (str, os.PathLike)) :
+        with open(source, 'r', newline='', encoding='utf-8') as f :
+            for spec in _read(f, format) :
+                yield spec
+    else :
+        for spec in _read(source, format) :
+            yield spec
+
+def _read(f, format) :
+    if format == 'csv' :
+        for row in csv.DictReader(f) :
+            yield _spec({key: value for key, value in row.items() if key})
+        return
+    for line_no, line in enumerate(f, 1) :
+        line = line.strip()
+        if not line :
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e :
+            raise ValueError(f'invalid JSON at line {line_no} : {e}')
+        yield _spec(item)
@@ -0,0 +1,234 @@
+import weakref
+import threading
+from collections import namedtuple
+from mlstudio_sdk import instrumentation
+from mlstudio_sdk.common import LazyModule
+
+psycopg2 = LazyModule('psycopg2')
+
+# 자주 사용하는 조회 query
+#   name : prepared statement 이름 (mlstudio_<name>)
+#   sql  : PostgreSQL 의 $1, $2 ... parameter 를 사용한다. (PREPARE 와 asyncpg 에서 그대로 사용)
+Query = namedtuple('Query', ['name', 'sql'])
+
+########################################
+# auth DB
+########################################
+IS_ADMIN = Query('is_admin', """
+    SELECT  is_admin
+    FROM    users
+    WHERE   username = $1
+""")
+
+EXPERIMENT_PERMISSIONS = Query('experiment_permissions', """
+    SELECT  permissions.experiment_id,
+            permissions.user_id,
+            permissions.permission
+    FROM    experiment_permissions permissions
+    INNER JOIN users
+    ON      permissions.user_id = users.id
+    WHERE   users.username = $1
+""")
+
+REGISTERED_MODEL_PERMISSIONS = Query('registered_model_permissions', """
+    SELECT  permissions.id AS registered_id,
+            permissions.name,
+            permissions.user_id,
+            permissions.permission
+    FROM    registered_model_permissions permissions
+    INNER JOIN users
+    ON      permissions.user_id = users.id
+    WHERE   users.username = $1
+""")
+
+# 관리자 여부와 권한이 있는 experiment id 목록 (사용자가 없으면 row 없음)
+RESOLVE_EXPERIMENT_PERMISSIONS = Query('resolve_experiment_permissions', """
+    SELECT  users.is_admin,
+            COALESCE(
+                ARRAY_AGG(permissions.experiment_id) FILTER (WHERE permissions.experiment_id IS NOT NULL),
+                '{}'
+            ) AS experiment_ids
+    FROM    users
+    LEFT JOIN experiment_permissions permissions
+    ON      permissions.user_id = users.id
+    WHERE   users.username = $1
+    GROUP BY users.id, users.is_admin
+""")
+
+RESOLVE_REGISTERED_MODEL_PERMISSIONS = Query('resolve_registered_model_permissions', """
+    SELECT  users.is_admin,
+            COALESCE(
+                ARRAY_AGG(permissions.name) FILTER (WHERE permissions.name IS NOT NULL),
+                '{}'
+            ) AS names
+    FROM    users
+    LEFT JOIN registered_model_permissions permissions
+    ON      permissions.user_id = users.id
+    WHERE   users.username = $1
+    GROUP BY users.id, users.is_admin
+""")
+
+########################################
+# tracking DB (keyset pagination)
+# LIMIT NULL 은 LIMIT 이 없는 것과 같다.
+########################################
+# $1 : 이 id 보다 큰 experiment 부터 (처음이면 -1), $2 : page size
+ALL_EXPERIMENTS_PAGE = Query('all_experiments_page', """
+    SELECT  *
+    FROM    experiments
+    WHERE   experiment_id > $1
+    ORDER BY experiment_id
+    LIMIT   $2
+""")
+
+# $1 : experiment id 목록, $2 : 이 id 보다 큰 experiment 부터, $3 : page size
+EXPERIMENTS_BY_IDS_PAGE = Query('experiments_by_ids_page', """
+    SELECT  *
+    FROM    experiments
+    WHERE   experiment_id = ANY($1::integer[])
+    AND     experiment_id > $2
+    ORDER BY experiment_id
+    LIMIT   $3
+""")
+
+# $1 : 이 이름보다 뒤의 model 부터 (처음이면 ''), $2 : page size
+ALL_REGISTERED_MODELS_PAGE = Query('all_registered_models_page', """
+    SELECT  DISTINCT name
+    FROM    model_versions
+    WHERE   name > $1
+    ORDER BY name
+    LIMIT   $2
+""")
+
+# $1 : model 이름 목록, $2 : 이 이름보다 뒤의 model 부터, $3 : page size
+REGISTERED_MODELS_BY_NAMES_PAGE = Query('registered_models_by_names_page', """
+    SELECT  DISTINCT name
+    FROM    model_versions
+    WHERE   name = ANY($1::varchar[])
+    AND     name > $2
+    ORDER BY name
+    LIMIT   $3
+""")
+
+QUERIES = {q.name: q for q in (
+    IS_ADMIN,
+    EXPERIMENT_PERMISSIONS,
+    REGISTERED_MODEL_PERMISSIONS,
+    RESOLVE_EXPERIMENT_PERMISSIONS,
+    RESOLVE_REGISTERED_MODEL_PERMISSIONS,
+    ALL_EXPERIMENTS_PAGE,
+    EXPERIMENTS_BY_IDS_PAGE,
+    ALL_REGISTERED_MODELS_PAGE,
+    REGISTERED_MODELS_BY_NAMES_PAGE,
+)}
+
+########################################
+# 권장 index
+########################################
+# 위 query 들이 사용하는 index 중 MLflow 가 만들지 않는 것. (users.username, experiments / model_versions 의
+# primary key 처럼 MLflow schema 에 이미 있는 것은 넣지 않는다. 이름이 배포마다 달라 중복 index 가 생길 수 있다.)
+# 운영 중인 테이블의 쓰기를 막지 않도록 CONCURRENTLY 로 만든다.
+#   (database, 설명, CREATE INDEX 문)  database : auth / tracking
+RECOMMENDED_INDEXES = [
+    ('auth', '사용자별 experiment 권한 조회 (MLflow 의 unique index 는 experiment_id 가 앞이라 사용할 수 없음)',
+     'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_experiment_permissions_user_id ON experiment_permissions (user_id, experiment_id)'),
+    ('auth', '사용자별 registered model 권한 조회',
+     'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_registered_model_permissions_user_id ON registered_model_permissions (user_id, name)'),
+    ('tracking', 'experiment 별 run 조회 (artifact location 일괄 변경)',
+     'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_runs_experiment_id ON runs (experiment_id)'),
+    ('tracking', 'changefeed 의 experiment 변경 조회 (last_update_time high-water mark)',
+     'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_experiments_last_update_time ON experiments (last_update_time)'),
+    ('tracking', 'changefeed 의 registered model 변경 조회',
+     'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_registered_models_last_updated_time ON registered_models (last_updated_time)'),
+    ('tracking', 'changefeed 의 model version 변경 조회',
+     'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_model_versions_last_updated_time ON model_versions (last_updated_time)'),
+]
+
+# CONCURRENTLY 로 만들다 실패하면 INVALID index 가 남고, IF NOT EXISTS 는 그것을 건너뛴다.
+INVALID_INDEX_SQL = 'SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)'
+
+def _index_name(sql) :
+    return sql.split(' ON ', 1)[0].split()[-1]
+
+# 권장 index 를 만든다. dry_run 이면 실행할 문장만 돌려준다.
+#  - CREATE INDEX CONCURRENTLY 는 transaction 안에서 실행할 수 없으므로 autocommit 으로 실행한다.
+#  - 이전에 실패하여 INVALID 로 남은 index 는 지우고 다시 만든다.
+def create_recommended_indexes(dry_run=False) :
+    from mlstudio_sdk import db
+
+    statements = []
+    for database, _, sql in RECOMMENDED_INDEXES :
+        statements.append((database, sql))
+        if dry_run :
+            continue
+        with (db.auth_connection() if database == 'auth' else db.tracking_connection()) as conn :
+            conn.autocommit = True
+            try:
+                cursor = conn.cursor()
+                name = _index_name(sql)
+                cursor.execute(INVALID_INDEX_SQL, (name,))
+                row = cursor.fetchone()
+                if row is not None and row[0] :
+                    cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+                cursor.execute(sql)
+            finally:
+                conn.autocommit = False
+    return statements
+
+########################################
+# prepared statement 실행 (psycopg2)
+########################################
+# 연결마다 PREPARE 한 query 이름을 기억해 두고, 처음 실행할 때만 PREPARE 한다.
+# pool 이 새로 연결하면 새 연결 객체이므로 다시 PREPARE 한다.
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+# 서버에 prepared statement 가 없거나 (DISCARD ALL, pgbouncer 등) 테이블 구조가 바뀌어
+# 다시 만들어야 하는 오류인지 확인한다.
+def _needs_reprepare(e) :
+    if e.pgcode == '26000' :
+        return True
+    return e.pgcode == '0A000' and 'cached plan' in str(e)
+
+def _statement_name(query) :
+    return f'mlstudio_{query.name}'
+
+def _prepared_names(conn) :
+    with _prepared_lock :
+        names = _prepared.get(conn)
+        if names is None :
+            names = _prepared[conn] = set()
+        return names
+
+def _prepare(cursor, query) :
+    with instrumentation.phase(instrumentation.QUERY) :
+        cursor.execute(f'PREPARE {_statement_name(query)} AS {query.sql}')
+
+# query 를 conn 에서 prepared statement 로 실행하고 cursor 를 돌려준다.
+#   cursor = execute(conn, IS_ADMIN, (user_name,))
+#   row = cursor.fetchone()
+# prepared statement 를 다시 만들어야 하면 transaction 을 rollback 하고 한번 더 실행하므로
+# 같은 transaction 에서 쓰기 작업과 섞어 쓰지 않는다.
+def execute(conn, query, params=(), cursor_factory=None) :
+    names = _prepared_names(conn)
+    cursor = conn.cursor(cursor_factory=cursor_factory) if cursor_factory else conn.cursor()
+    placeholders = ', '.join(['%s'] * len(params))
+    execute_sql = f'EXECUTE {_statement_name(query)}({placeholders})' if params else f'EXECUTE {_statement_name(query)}'
+
+    for attempt in range(2) :
+        try:
+            if query.name not in names :
+                _prepare(cursor, query)
+                names.add(query.name)
+            # client 쪽 cursor 는 execute 에서 결과 전체를 받아 온다.
+            with instrumentation.phase(instrumentation.QUERY) as p :
+                cursor.execute(execute_sql, params)
+                p.rows = max(cursor.rowcount, 0)
+            return cursor
+        except psycopg2.Error as e :
+            if attempt or not _needs_reprepare(e) :
+                raise
+            conn.rollback()
+            names.discard(query.name)
+            if e.pgcode != '26000' :
+                cursor.execute(f'DEALLOCATE {_statement_name(query)}')
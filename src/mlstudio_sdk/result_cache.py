@@ -0,0 +1,203 @@
+import sys
+import time
+import weakref
+import threading
+from collections import OrderedDict
+
+_caches = weakref.WeakSet()
+
+def user_tag(user_name) :
+    return ('user', user_name)
+
+# 값이 차지하는 대략의 메모리 크기(byte). list / tuple / dict / set 은 안의 값까지 더한다.
+def estimate_size(value) :
+    size = sys.getsizeof(value)
+    if isinstance(value, dict) :
+        for k, v in value.items() :
+            size += estimate_size(k) + estimate_size(v)
+    elif isinstance(value, (list, tuple, set, frozenset)) :
+        for v in value :
+            size += estimate_size(v)
+    return size
+
+class _Entry(object) :
+    __slots__ = ('value', 'size', 'expires_at', 'tags')
+
+    def __init__(self, value, size, expires_at, tags) :
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.tags = tags
+
+# 같은 key 를 조회 중인 요청 (single-flight)
+class _Flight(object) :
+    __slots__ = ('event', 'value', 'error', 'tags', 'stale')
+
+    def __init__(self, tags) :
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.tags = tags
+        self.stale = False
+
+########################################
+# 조회 결과 cache
+########################################
+# 사용자별 목록 조회 결과를 잠시 보관하는 thread-safe cache
+#  - 항목 수가 아니라 값의 크기(byte, estimate_size) 합계가 max_bytes 를 넘으면 가장 오래 사용하지 않은 항목부터 버린다. (LRU)
+#  - ttl 이 지난 항목은 다시 조회한다.
+#  - 같은 key 를 동시에 조회하면 한 thread 만 loader 를 실행하고 나머지는 그 결과를 같이 받는다. (single-flight)
+#  - 항목마다 tag (사용자, resource 종류) 를 달아 두고 tag 단위로 무효화한다.
+#    조회 중에 무효화되면 그 결과는 요청한 thread 들에게만 돌려주고 보관하지 않는다.
+class ResultCache(object) :
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=30.0, sizeof=estimate_size) :
+        if max_bytes < 1 :
+            raise ValueError(f'invalid cache size : {max_bytes}')
+
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._flights = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._shared = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+        self._oversized = 0
+
+        _caches.add(self)
+
+    def get_or_load(self, key, loader, tags=()) :
+        now = time.monotonic()
+        with self._lock :
+            entry = self._entries.get(key)
+            if entry is not None :
+                if entry.expires_at > now :
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry.value
+                self._remove(key)
+                self._expirations += 1
+
+            flight = self._flights.get(key)
+            if flight is not None :
+                self._shared += 1
+                leader = False
+            else :
+                flight = self._flights[key] = _Flight(tuple(tags))
+                self._misses += 1
+                leader = True
+
+        if not leader :
+            flight.event.wait()
+            if flight.error is not None :
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as e :
+            flight.error = e
+            raise
+        finally:
+            with self._lock :
+                self._flights.pop(key, None)
+                if flight.error is None and not flight.stale :
+                    self._put(key, flight.value, flight.tags)
+            flight.event.set()
+        return flight.value
+
+    def _put(self, key, value, tags) :
+        if self.ttl <= 0 :
+            return
+        size = self.sizeof(value)
+        if size > self.max_bytes :
+            self._oversized += 1
+            return
+
+        if key in self._entries :
+            self._remove(key)
+        self._entries[key] = _Entry(value, size, time.monotonic() + self.ttl, tags)
+        self._bytes += size
+        for tag in tags :
+            self._tags.setdefault(tag, set()).add(key)
+
+        while self._bytes > self.max_bytes :
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._evictions += 1
+
+    def _remove(self, key) :
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for tag in entry.tags :
+            keys = self._tags.get(tag)
+            if keys is not None :
+                keys.discard(key)
+                if not keys :
+                    del self._tags[tag]
+
+    def invalidate(self, key) :
+        with self._lock :
+            if key in self._entries :
+                self._remove(key)
+                self._invalidations += 1
+            flight = self._flights.get(key)
+            if flight is not None :
+                flight.stale = True
+
+    def invalidate_tag(self, tag) :
+        with self._lock :
+            for key in list(self._tags.get(tag, ())) :
+                self._remove(key)
+                self._invalidations += 1
+            for flight in self._flights.values() :
+                if tag in flight.tags :
+                    flight.stale = True
+
+    def clear(self) :
+        with self._lock :
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+            for flight in self._flights.values() :
+                flight.stale = True
+
+    def stats(self) :
+        with self._lock :
+            return {
+                'size': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'shared': self._shared,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+                'oversized': self._oversized,
+            }
+
+    def __len__(self) :
+        with self._lock :
+            return len(self._entries)
+
+########################################
+# SDK 변경 알림
+########################################
+# 살아있는 모든 ResultCache 에서 사용자의 항목을 무효화한다. (권한 변경, 관리자 변경, 삭제)
+def invalidate_user(user_name) :
+    for cache in list(_caches) :
+        cache.invalidate_tag(user_tag(user_name))
+
+# resource 종류(experiment / registered model) 의 항목을 모든 사용자에 대해 무효화한다. (생성, 삭제, 변경)
+def invalidate_resource(resource_type) :
+    for cache in list(_caches) :
+        cache.invalidate_tag(resource_type)
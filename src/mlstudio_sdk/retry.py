@@ -0,0 +1,337 @@
+import math
+import time
+import random
+import functools
+import threading
+from contextlib import contextmanager
+from mlstudio_sdk.common import context_var
+from mlstudio_sdk.config import Config, ConfigError, RETRY_DEFAULTS
+
+class DeadlineExceeded(TimeoutError) :
+    pass
+
+# backend 가 비정상이라 호출하지 않고 바로 실패시킨 경우
+class CircuitOpenError(Exception) :
+    pass
+
+def _options() :
+    try:
+        return Config().get_retry_options()
+    except (OSError, ValueError, ConfigError) :
+        return dict(RETRY_DEFAULTS)
+
+########################################
+# deadline
+########################################
+# 호출 하나에 쓸 수 있는 시간. 안쪽에서 다시 정하면 바깥 deadline 과 비교해 짧은 쪽을 사용한다.
+#   with retry.deadline(2.0) :
+#       mlflow_api.apply_experiment_permission(...)   # 연결, 재시도, 대기 시간을 모두 합쳐 2초 안에 끝나거나 실패한다.
+# seconds 를 생략하면 설정(retry.deadline)의 기본값을 사용한다.
+_deadline = context_var('mlstudio_deadline')
+
+@contextmanager
+def deadline(seconds=None) :
+    if seconds is None :
+        seconds = _options()['deadline']
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None and outer <= at :
+        yield outer
+        return
+    token = _deadline.set(at)
+    try:
+        yield at
+    finally:
+        _deadline.reset(token)
+
+# 남은 시간(초). deadline 이 없으면 None
+def remaining() :
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+def check_deadline() :
+    left = remaining()
+    if left is not None and left <= 0 :
+        raise DeadlineExceeded('deadline exceeded')
+    return left
+
+# psycopg2 connect_timeout (정수 초, 남은 deadline 이내)
+def connect_timeout() :
+    timeout = _options()['connect_timeout']
+    left = check_deadline()
+    if left is not None :
+        timeout = min(timeout, left)
+    return max(1, int(math.ceil(timeout)))
+
+# requests 의 (connect, read) timeout (남은 deadline 이내)
+def http_timeout(default=120.0) :
+    connect = _options()['connect_timeout']
+    left = check_deadline()
+    if left is None :
+        return (connect, default)
+    return (min(connect, left), left)
+
+########################################
+# circuit breaker
+########################################
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# backend 하나의 circuit breaker
+#  - 연속으로 failure_threshold 번 실패하면 open 되어 reset_timeout 초 동안 호출하지 않고 바로 실패시킨다.
+#  - reset_timeout 이 지나면 (half open) 한번만 시험 삼아 호출하여 성공하면 닫고, 실패하면 다시 연다.
+class CircuitBreaker(object) :
+    def __init__(self, name, failure_threshold=5, reset_timeout=10.0) :
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) :
+        with self._lock :
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout :
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) :
+        with self._lock :
+            if self._state == CLOSED :
+                return True
+            if self._state == OPEN :
+                if time.monotonic() - self._opened_at < self.reset_timeout :
+                    return False
+                self._state = HALF_OPEN
+                self._trial = False
+            if self._trial :
+                return False
+            self._trial = True
+            return True
+
+    # 결과를 판단할 수 없이 끝난 호출(deadline 초과 등)의 half open 시험 기회를 돌려준다.
+    def release(self) :
+        with self._lock :
+            self._trial = False
+
+    def record_success(self) :
+        with self._lock :
+            self._state = CLOSED
+            self._failures = 0
+            self._trial = False
+
+    def record_failure(self) :
+        with self._lock :
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold :
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+    def retry_after(self) :
+        with self._lock :
+            if self._state != OPEN :
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+########################################
+# 재시도
+########################################
+class _BackendStats(object) :
+    __slots__ = ('calls', 'attempts', 'retries', 'successes', 'failures', 'rejected', 'deadline_exceeded')
+
+    def __init__(self) :
+        for name in self.__slots__ :
+            setattr(self, name, 0)
+
+    def as_dict(self) :
+        return {name: getattr(self, name) for name in self.__slots__}
+
+_breakers = {}
+_stats = {}
+_lock = threading.Lock()
+
+# retry.call 안에서 다시 retry.call 을 부르면 (조회 함수 -> 연결) 안쪽은 한번만 시도하고 재시도는 바깥에서 한다.
+_retrying = context_var('mlstudio_retrying', False)
+
+def get_breaker(backend) :
+    breaker = _breakers.get(backend)
+    if breaker is None :
+        options = _options()
+        with _lock :
+            breaker = _breakers.setdefault(backend, CircuitBreaker(backend, options['failure_threshold'], options['reset_timeout']))
+    return breaker
+
+def _backend_stats(backend) :
+    stats = _stats.get(backend)
+    if stats is None :
+        with _lock :
+            stats = _stats.setdefault(backend, _BackendStats())
+    return stats
+
+def _count(stats, name) :
+    with _lock :
+        setattr(stats, name, getattr(stats, name) + 1)
+
+# full jitter : 0 ~ min(max_delay, base_delay * 2^(attempt-1)) 사이에서 고른다.
+def backoff(attempt, base_delay, max_delay) :
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+# backend 에 대한 호출 func() 를 deadline, 재시도, circuit breaker 를 적용해 실행한다.
+#  - is_transient(e) : backend 상태 때문에 실패했는지 (circuit breaker 에 실패로 기록하고 재시도 대상이 된다.)
+#  - can_retry(e)    : 다시 보내도 안전한지 (기본은 모든 transient 오류). 멱등이 아닌 요청은 서버에 닿지 않은 오류만 재시도한다.
+#  - deadline 이 없으면 설정의 기본 deadline 을 적용하고, 다음 시도까지 기다릴 시간이 남아 있지 않으면 DeadlineExceeded
+def call(backend, func, is_transient, can_retry=None) :
+    options = _options()
+    stats = _backend_stats(backend)
+    breaker = get_breaker(backend)
+    _count(stats, 'calls')
+
+    max_attempts = 1 if _retrying.get() else options['max_attempts']
+    token = _retrying.set(True)
+    try:
+        with deadline(options['deadline']) :
+            return _attempt(backend, func, is_transient, can_retry, options, max_attempts, stats, breaker)
+    finally:
+        _retrying.reset(token)
+
+def _attempt(backend, func, is_transient, can_retry, options, max_attempts, stats, breaker) :
+    attempt = 0
+    while True :
+        left = remaining()
+        if left is not None and left <= 0 :
+            _count(stats, 'deadline_exceeded')
+            _count(stats, 'failures')
+            raise DeadlineExceeded(f'deadline exceeded before calling {backend}')
+        if not breaker.allow() :
+            _count(stats, 'rejected')
+            raise CircuitOpenError(f'circuit open for {backend} (retry after {breaker.retry_after():.1f}s)')
+
+        attempt += 1
+        _count(stats, 'attempts')
+        try:
+            result = func()
+        except (CircuitOpenError, DeadlineExceeded) :
+            # 안쪽 호출이 막혔거나 시간이 다 된 경우. backend 상태는 알 수 없다.
+            breaker.release()
+            _count(stats, 'failures')
+            raise
+        except Exception as e :
+            transient = is_transient(e)
+            if transient :
+                breaker.record_failure()
+            else :
+                # 서버가 응답한 오류(권한 없음, 이미 있음 등)는 backend 가 정상이라는 뜻이다.
+                breaker.record_success()
+
+            # 이번 실패로 circuit 이 열렸으면 더 시도하지 않고 원래 오류를 돌려준다.
+            if not transient or attempt >= max_attempts or not (can_retry or is_transient)(e) or breaker.state == OPEN :
+                _count(stats, 'failures')
+                raise
+
+            delay = backoff(attempt, options['base_delay'], options['max_delay'])
+            left = remaining()
+            if left is not None and delay >= left :
+                _count(stats, 'deadline_exceeded')
+                _count(stats, 'failures')
+                raise DeadlineExceeded(f'deadline exceeded calling {backend} after {attempt} attempt(s) : {e}') from e
+            _count(stats, 'retries')
+            time.sleep(delay)
+            continue
+        except BaseException :
+            # KeyboardInterrupt, 취소 등. half open 시험 기회를 돌려주지 않으면 circuit 이 계속 막힌다.
+            breaker.release()
+            _count(stats, 'failures')
+            raise
+
+        breaker.record_success()
+        _count(stats, 'successes')
+        return result
+
+# 멱등인 함수 전체를 transient 오류에서 다시 실행한다. (DB 조회 등)
+#   @retry.idempotent('auth_db', retry.is_transient_db_error)
+def idempotent(backend, is_transient) :
+    def decorator(func) :
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) :
+            return call(backend, lambda : func(*args, **kwargs), is_transient)
+        return wrapper
+    return decorator
+
+########################################
+# 오류 분류
+########################################
+def _chain(e) :
+    seen = set()
+    while e is not None and id(e) not in seen :
+        seen.add(id(e))
+        yield e
+        e = e.__cause__ or e.__context__
+
+# 서버에 연결하지 못한 DB 오류 (연결 실패, 끊어진 연결). 인증 실패, 없는 database 는 재시도하지 않는다.
+_PERMANENT_DB_MESSAGES = ('password authentication failed', 'does not exist', 'no pg_hba.conf entry')
+
+def is_transient_db_error(e) :
+    import psycopg2
+    if isinstance(e, CircuitOpenError) :
+        return False
+    if isinstance(e, psycopg2.InterfaceError) :
+        return True
+    if isinstance(e, psycopg2.OperationalError) and e.pgcode is None :
+        message = str(e)
+        return not any(m in message for m in _PERMANENT_DB_MESSAGES)
+    # 서버가 재시작 중이거나 연결을 끊은 경우 (admin_shutdown, cannot_connect_now 등)
+    return isinstance(e, psycopg2.OperationalError) and (e.pgcode or '').startswith('57P')
+
+# 요청이 서버에 닿기 전에 실패한 HTTP 오류 (연결 거부, 연결 timeout). 어떤 요청이든 다시 보내도 안전하다.
+def is_connect_error(e) :
+    import requests
+    from urllib3.exceptions import NewConnectionError
+    for error in _chain(e) :
+        if isinstance(error, requests.exceptions.ConnectTimeout) :
+            return True
+        if isinstance(error, requests.exceptions.ConnectionError) :
+            reason = getattr(error.args[0], 'reason', None) if error.args else None
+            if isinstance(reason, NewConnectionError) :
+                return True
+    return False
+
+# 연결 오류, timeout, 일시적인 오류 응답(429, 5xx 재시도 대상)으로 실패한 HTTP 요청
+def is_transient_http_error(e) :
+    import requests
+    if isinstance(e, (CircuitOpenError, DeadlineExceeded)) :
+        return False
+    for error in _chain(e) :
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.RetryError)) :
+            return True
+    return False
+
+########################################
+# 통계
+########################################
+# backend 별 재시도 / circuit breaker 통계
+#   {backend: {'calls', 'attempts', 'retries', 'successes', 'failures', 'rejected', 'deadline_exceeded', 'state'}}
+def stats() :
+    with _lock :
+        result = {backend: s.as_dict() for backend, s in _stats.items()}
+        breakers = dict(_breakers)
+    for backend, breaker in breakers.items() :
+        result.setdefault(backend, _BackendStats().as_dict())['state'] = breaker.state
+    return result
+
+# 통계와 circuit breaker 상태를 모두 지운다.
+def reset() :
+    with _lock :
+        _stats.clear()
+        _breakers.clear()
+
+def _on_config_reload(old, new) :
+    if old.retry_options != new.retry_options :
+        with _lock :
+            _breakers.clear()
+
+Config.add_reload_listener(_on_config_reload)
@@ -0,0 +1,278 @@
+import time
+import atexit
+import weakref
+import threading
+from collections import deque
+from mlstudio_sdk import retry
+from mlstudio_sdk.common import LazyModule
+from mlstudio_sdk.config import Config
+
+mlflow = LazyModule('mlflow')
+clients = LazyModule('mlstudio_sdk.clients')
+
+# MLflow log_batch 한번에 보낼 수 있는 최대 개수 (mlflow.utils.validation 과 같은 값)
+MAX_METRICS_PER_BATCH = 1000
+MAX_PARAMS_TAGS_PER_BATCH = 100
+MAX_ENTITIES_PER_BATCH = 1000
+
+class RunLoggerClosed(Exception) :
+    pass
+
+########################################
+# 비동기 metric / param / tag 기록
+########################################
+# log_metric / log_param / set_tag 를 메모리에 모았다가 background thread 에서 log_batch 로 보낸다.
+#  - flush_size 개가 모이거나 flush_interval 초가 지나면 보낸다. (한번에 보내는 개수는 MLflow 제한을 따른다.)
+#  - 대기 중인 값이 max_queue 개를 넘으면 block 이면 자리가 날 때까지 기다리고 (block_timeout 초),
+#    아니면 버리고 dropped 로 센다.
+#  - param, tag 는 같은 key 를 다시 기록하면 마지막 값만 보낸다.
+#  - 연결 오류, timeout 같은 일시적인 오류는 max_retries 번 다시 시도하고, 그래도 실패하면 failed 로 센다.
+#  - 서버가 거절한 batch(잘못된 값, 이미 다른 값으로 기록된 param 등)는 다시 보내지 않고 metric 과 param / tag 를
+#    따로 한번씩 보내 정상인 쪽은 기록되게 하며, 거절된 쪽만 failed 로 센다.
+#  - close() 또는 프로그램 종료 시 남은 값을 모두 보낸다.
+#
+#   with mlflow.start_run() as run :
+#       with RunLogger(run.info.run_id, login_id, login_pwd) as run_logger :
+#           for step in range(epochs) :
+#               run_logger.log_metric('loss', loss, step=step)
+class RunLogger(object) :
+    def __init__(self, run_id, login_id='', login_pwd='', tracking_uri=None, client=None,
+                 flush_size=MAX_METRICS_PER_BATCH, flush_interval=1.0, max_queue=100000,
+                 block=True, block_timeout=None, max_retries=2) :
+        if flush_size < 1 or max_queue < 1 :
+            raise ValueError(f'invalid RunLogger size : flush_size={flush_size}, max_queue={max_queue}')
+
+        self.run_id = run_id
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.block = block
+        self.block_timeout = block_timeout
+        self.max_retries = max_retries
+
+        if client is None :
+            client = clients.get_mlflow_client(tracking_uri or Config().get_mlflow_tracking_uri(), login_id, login_pwd)
+        self._client = client
+
+        self._metrics = deque()
+        self._params = {}
+        self._tags = {}
+        self._in_flight = 0
+        self._flush_requested = False
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        self._counts = {
+            'metrics': 0,
+            'params': 0,
+            'tags': 0,
+            'batches': 0,
+            'dropped': 0,
+            'failed': 0,
+            'retries': 0,
+        }
+        self.last_error = None
+
+        self._thread = threading.Thread(target=self._worker, name=f'mlstudio-run-logger-{run_id}', daemon=True)
+        self._thread.start()
+        _loggers.add(self)
+
+    ########################################
+    # 기록
+    ########################################
+    def log_metric(self, key, value, step=None, timestamp=None) :
+        timestamp = int(time.time() * 1000) if timestamp is None else timestamp
+        self._put(lambda : self._metrics.append((key, float(value), timestamp, step or 0)), 1)
+
+    def log_metrics(self, metrics, step=None, timestamp=None) :
+        timestamp = int(time.time() * 1000) if timestamp is None else timestamp
+        items = [(key, float(value), timestamp, step or 0) for key, value in metrics.items()]
+        self._put(lambda : self._metrics.extend(items), len(items))
+
+    def log_param(self, key, value) :
+        self._put(lambda : self._params.__setitem__(key, str(value)), 0 if key in self._params else 1)
+
+    def log_params(self, params) :
+        for key, value in params.items() :
+            self.log_param(key, value)
+
+    def set_tag(self, key, value) :
+        self._put(lambda : self._tags.__setitem__(key, str(value)), 0 if key in self._tags else 1)
+
+    def set_tags(self, tags) :
+        for key, value in tags.items() :
+            self.set_tag(key, value)
+
+    def _pending(self) :
+        return len(self._metrics) + len(self._params) + len(self._tags)
+
+    def _put(self, add, count) :
+        with self._cond :
+            if self._closed :
+                raise RunLoggerClosed(f'RunLogger is closed : {self.run_id}')
+
+            if count and self._pending() + count > self.max_queue :
+                if not self.block :
+                    self._counts['dropped'] += count
+                    return
+                # 자리가 날 때까지 background thread 에 flush 를 요청하고 기다린다.
+                self._flush_requested = True
+                self._cond.notify_all()
+                deadline = None if self.block_timeout is None else time.monotonic() + self.block_timeout
+                while self._pending() + count > self.max_queue and self._pending() > 0 and not self._closed :
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0 :
+                        self._counts['dropped'] += count
+                        return
+                    self._cond.wait(remaining)
+
+            add()
+            if self._pending() >= self.flush_size :
+                self._cond.notify_all()
+
+    ########################################
+    # 전송
+    ########################################
+    # MLflow 제한 안에서 한번에 보낼 만큼 꺼낸다. (lock 을 잡은 상태에서 호출)
+    def _take_batch(self) :
+        params = []
+        while self._params and len(params) < MAX_PARAMS_TAGS_PER_BATCH :
+            key = next(iter(self._params))
+            params.append((key, self._params.pop(key)))
+
+        tags = []
+        while self._tags and len(params) + len(tags) < MAX_PARAMS_TAGS_PER_BATCH :
+            key = next(iter(self._tags))
+            tags.append((key, self._tags.pop(key)))
+
+        metrics = []
+        limit = min(MAX_METRICS_PER_BATCH, MAX_ENTITIES_PER_BATCH - len(params) - len(tags))
+        while self._metrics and len(metrics) < limit :
+            metrics.append(self._metrics.popleft())
+        return metrics, params, tags
+
+    def _worker(self) :
+        while True :
+            with self._cond :
+                deadline = time.monotonic() + self.flush_interval
+                while not (self._closed or self._flush_requested or self._pending() >= self.flush_size) :
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 :
+                        break
+                    self._cond.wait(remaining)
+
+                if not self._pending() :
+                    self._flush_requested = False
+                    self._cond.notify_all()
+                    if self._closed :
+                        return
+                    continue
+
+                metrics, params, tags = self._take_batch()
+                self._in_flight = len(metrics) + len(params) + len(tags)
+                # 자리가 났으므로 기다리는 log_* 호출을 깨운다.
+                self._cond.notify_all()
+
+            try:
+                sent = self._send(metrics, params, tags)
+            except Exception as e :
+                self.last_error = e
+                sent = (0, 0, 0)
+
+            with self._cond :
+                self._in_flight = 0
+                self._counts['batches'] += 1
+                self._counts['metrics'] += sent[0]
+                self._counts['params'] += sent[1]
+                self._counts['tags'] += sent[2]
+                self._counts['failed'] += len(metrics) + len(params) + len(tags) - sum(sent)
+                self._cond.notify_all()
+
+    # batch 를 보내고 기록된 (metric, param, tag) 개수를 돌려준다.
+    def _send(self, metrics, params, tags) :
+        entities = mlflow.entities
+        metrics = [entities.Metric(key, value, timestamp, step) for key, value, timestamp, step in metrics]
+        params = [entities.Param(key, value) for key, value in params]
+        tags = [entities.RunTag(key, value) for key, value in tags]
+
+        try:
+            self._log_batch(metrics, params, tags)
+            return len(metrics), len(params), len(tags)
+        except Exception as e :
+            self.last_error = e
+            if retry.is_transient_http_error(e) or not metrics or not (params or tags) :
+                return 0, 0, 0
+
+        # 거절된 쪽을 알 수 없으므로 metric 과 param / tag 를 따로 보낸다. (last_error 는 처음 오류를 유지)
+        sent = (0, 0, 0)
+        for part in ((metrics, [], []), ([], params, tags)) :
+            try:
+                self._log_batch(*part)
+            except Exception :
+                continue
+            sent = tuple(count + len(values) for count, values in zip(sent, part))
+        return sent
+
+    # 일시적인 오류만 max_retries 번까지 다시 보낸다.
+    def _log_batch(self, metrics, params, tags) :
+        for attempt in range(self.max_retries + 1) :
+            try:
+                self._client.log_batch(self.run_id, metrics=metrics, params=params, tags=tags)
+                return
+            except Exception as e :
+                if attempt == self.max_retries or not retry.is_transient_http_error(e) :
+                    raise
+                self.last_error = e
+                with self._cond :
+                    self._counts['retries'] += 1
+                time.sleep(min(0.1 * 2 ** attempt, 2.0))
+
+    # 지금까지 기록한 값을 모두 보낼 때까지 기다린다. timeout 안에 끝나면 True
+    def flush(self, timeout=None) :
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond :
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending() or self._in_flight :
+                if not self._thread.is_alive() :
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0 :
+                    return False
+                self._flush_requested = True
+                self._cond.notify_all()
+                self._cond.wait(remaining)
+            return True
+
+    # 남은 값을 모두 보내고 background thread 를 종료한다.
+    def close(self, timeout=None) :
+        with self._cond :
+            if self._closed :
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        _loggers.discard(self)
+
+    def stats(self) :
+        with self._cond :
+            stats = dict(self._counts)
+            stats['queued'] = self._pending()
+            stats['in_flight'] = self._in_flight
+            stats['closed'] = self._closed
+            return stats
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) :
+        self.close()
+
+# 프로그램 종료 시 닫히지 않은 RunLogger 의 남은 값을 보낸다.
+_loggers = weakref.WeakSet()
+
+def close_all_loggers(timeout=None) :
+    for run_logger in list(_loggers) :
+        run_logger.close(timeout)
+
+atexit.register(close_all_loggers)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 설치하지 않아도 src 의 mlstudio_sdk 를 test 할 수 있게 한다.
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+if SRC_PATH not in sys.path :
+    sys.path.insert(0, SRC_PATH)
@@ -4,7 +4,7 @@
 import mlflow
 import os
 from mlstudio_sdk.config import Config
-from mlstudio_sdk.mlflow.api import create_experiment_if_not_exists, get_registered_model
+from mlstudio_sdk.mlflow_api import create_experiment_if_not_exists, get_registered_model
 
 config = Config()
 print(config.get_mlflow_tracking_uri())
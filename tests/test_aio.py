@@ -0,0 +1,119 @@
+#################################################
+# aio 의 event loop 별 pool 관리 확인 (asyncpg 없이 가짜 pool 로)
+#################################################
+import asyncio
+import pytest
+from mlstudio_sdk import aio
+
+class FakePool(object) :
+    def __init__(self, dsn) :
+        self.dsn = dsn
+        self.loop = asyncio.get_running_loop()
+        self.closed = False
+
+    async def close(self) :
+        self.closed = True
+
+class FakeAsyncpg(object) :
+    def __init__(self) :
+        self.created = 0
+
+    async def create_pool(self, dsn, **kwargs) :
+        self.created += 1
+        await asyncio.sleep(0.01)
+        return FakePool(dsn)
+
+class FakeConfig(object) :
+    def get_db_pool_options(self) :
+        return {'min_size': 1, 'max_size': 2, 'check_interval': 30.0}
+
+@pytest.fixture
+def asyncpg(monkeypatch) :
+    fake = FakeAsyncpg()
+    monkeypatch.setattr(aio, '_import_asyncpg', lambda : fake)
+    monkeypatch.setattr(aio, 'Config', FakeConfig)
+    monkeypatch.setattr(aio, '_pools', {})
+    monkeypatch.setattr(aio, '_connectors', {})
+    return fake
+
+def test_concurrent_get_pool_creates_one_pool(asyncpg) :
+    async def main() :
+        pools = await asyncio.gather(*[aio.get_pool('postgresql://db/a') for _ in range(5)])
+        await aio.close()
+        return pools
+
+    pools = asyncio.run(main())
+    assert asyncpg.created == 1
+    assert all(pool is pools[0] for pool in pools)
+    assert pools[0].closed
+    assert aio._pools == {}
+
+def test_new_loop_never_gets_pool_of_closed_loop(asyncpg) :
+    async def main() :
+        pool = await aio.get_pool('postgresql://db/a')
+        assert pool.loop is asyncio.get_running_loop()
+        return pool
+
+    # aio.close() 없이 loop 를 여러번 새로 만든다. (id 가 다시 쓰이더라도 이전 loop 의 pool 을 돌려주면 안 된다.)
+    pools = [asyncio.run(main()) for _ in range(5)]
+    assert asyncpg.created == 5
+    assert len({id(pool) for pool in pools}) == 5
+    # 닫힌 loop 의 것은 다음 요청 때 버린다.
+    assert len(aio._pools) == 1
+
+########################################
+# AsyncSession 의 생성/삭제가 동기 Session 의 이름 cache 를 무효화하는지
+########################################
+from mlstudio_sdk import mlflow_api
+from mlstudio_sdk.cache import TTLCache
+
+class FakeArtifactConfig(object) :
+    def get_mlflow_artifact_url(self) :
+        return '/tmp/artifacts'
+
+@pytest.fixture
+def name_caches(monkeypatch) :
+    monkeypatch.setattr(mlflow_api, 'experiment_cache', TTLCache(ttl=60, negative_ttl=60))
+    monkeypatch.setattr(mlflow_api, 'registered_model_cache', TTLCache(ttl=60, negative_ttl=60))
+    monkeypatch.setattr(aio, 'Config', FakeArtifactConfig)
+    monkeypatch.setattr(aio, '_resource_changed', lambda *args : None)
+    monkeypatch.setattr(aio, '_resource_deleted', lambda *args : None)
+
+    responses = {
+        'experiments/create': {'experiment_id': '7'},
+        'experiments/get-by-name': {'experiment': {'experiment_id': '7'}},
+        'experiments/delete': {},
+        'registered-models/create': {'registered_model': {'name': 'model'}},
+        'registered-models/get': {'registered_model': {'name': 'model'}},
+        'registered-models/delete': {},
+    }
+    async def request(self, endpoint, method, **kwargs) :
+        return responses[endpoint]
+    monkeypatch.setattr(aio.AsyncSession, '_request', request)
+
+    # 여러 사용자 / tracking uri 에 같은 이름이 cache 되어 있다.
+    for cache, name, value in ((mlflow_api.experiment_cache, 'exp', 'old-experiment'),
+                               (mlflow_api.registered_model_cache, 'model', 'model')) :
+        for key in (('http://mlflow', 'admin', name), ('postgresql://db/mlflow', 'user1', name), ('http://mlflow', 'user1', 'other')) :
+            cache.put(key, value)
+    return mlflow_api.experiment_cache, mlflow_api.registered_model_cache
+
+def cached_names(cache) :
+    return sorted(key[-1] for key in list(cache._entries))
+
+@pytest.mark.parametrize('call, cache_index, name', [
+    (lambda session : session.create_experiment('exp'), 0, 'exp'),
+    (lambda session : session.delete_experiment('exp'), 0, 'exp'),
+    (lambda session : session.create_registered_model('model'), 1, 'model'),
+    (lambda session : session.delete_registered_model('model'), 1, 'model'),
+])
+def test_async_create_delete_invalidates_sync_name_cache(name_caches, call, cache_index, name) :
+    async def main() :
+        session = aio.AsyncSession('admin', 'pwd')
+        session._semaphore = asyncio.Semaphore(1)
+        await call(session)
+
+    asyncio.run(main())
+    assert cached_names(name_caches[cache_index]) == ['other']
+    other = name_caches[1 - cache_index]
+    assert len(cached_names(other)) == 3
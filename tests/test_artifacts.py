@@ -0,0 +1,105 @@
+#################################################
+# artifacts.upload_directory 의 local 저장소 dedup 확인
+#  - 대상 파일을 덮어써도 blob 과 다른 run 의 파일은 바뀌지 않아야 한다.
+#################################################
+import os
+import errno
+import shutil
+import pytest
+from mlstudio_sdk import artifacts
+
+def write(path, text) :
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f :
+        f.write(text)
+
+def read(path) :
+    with open(path) as f :
+        return f.read()
+
+def blobs(cas_root) :
+    return [os.path.join(root, name) for root, _, files in os.walk(cas_root) for name in files]
+
+def upload_twice(tmp_path) :
+    src = str(tmp_path / 'src')
+    write(os.path.join(src, 'model.txt'), 'weights')
+    write(os.path.join(src, 'sub', 'same.txt'), 'weights')
+    cas_root = str(tmp_path / 'cas')
+    first = artifacts.upload_directory(src, artifact_uri=str(tmp_path / 'run1'), cas_root=cas_root, max_workers=1)
+    second = artifacts.upload_directory(src, artifact_uri=str(tmp_path / 'run2'), cas_root=cas_root, max_workers=1)
+    return first, second, cas_root
+
+def check_overwrite_is_isolated(tmp_path, cas_root) :
+    # MLflow local repository 처럼 기존 경로에 그대로 덮어쓴다.
+    other = str(tmp_path / 'other.txt')
+    write(other, 'changed')
+    shutil.copy2(other, str(tmp_path / 'run1' / 'model.txt'))
+
+    assert read(str(tmp_path / 'run1' / 'model.txt')) == 'changed'
+    assert read(str(tmp_path / 'run1' / 'sub' / 'same.txt')) == 'weights'
+    assert read(str(tmp_path / 'run2' / 'model.txt')) == 'weights'
+    for blob in blobs(cas_root) :
+        assert read(blob) == 'weights'
+        assert os.stat(blob).st_mode & 0o222 == 0
+
+def test_overwrite_does_not_change_other_copies(tmp_path) :
+    first, second, cas_root = upload_twice(tmp_path)
+    assert all(f.status != 'failed' for f in first.files + second.files)
+    check_overwrite_is_isolated(tmp_path, cas_root)
+
+def test_dedup_with_clone(tmp_path, monkeypatch) :
+    # reflink 를 지원하는 파일 시스템처럼 inode 가 다른 복사본을 만든다.
+    monkeypatch.setattr(artifacts, '_clone_atomic', lambda src, dst : artifacts._copy_atomic(src, dst, 1024))
+    first, second, cas_root = upload_twice(tmp_path)
+
+    assert [f.status for f in first.files] == ['uploaded', 'deduplicated']
+    assert [f.status for f in second.files] == ['deduplicated', 'deduplicated']
+    assert second.bytes_deduplicated == first.bytes_total
+    assert (first.dedup, first.dedup_disabled_reason) == (True, None)
+    assert len(blobs(cas_root)) == 1
+    check_overwrite_is_isolated(tmp_path, cas_root)
+
+def test_without_clone_support_no_blob_is_kept(tmp_path, monkeypatch) :
+    def unsupported(src, dst) :
+        raise OSError(95, 'Operation not supported')
+    monkeypatch.setattr(artifacts, '_clone_atomic', unsupported)
+    first, second, cas_root = upload_twice(tmp_path)
+
+    assert [f.status for f in first.files + second.files] == ['uploaded'] * 4
+    assert blobs(cas_root) == []
+    # dedup 을 하지 못한 이유를 결과로 알린다.
+    for result in (first, second) :
+        assert result.dedup is False
+        assert 'reflink not supported' in result.dedup_disabled_reason
+    check_overwrite_is_isolated(tmp_path, cas_root)
+
+def test_clone_import_error_disables_dedup(tmp_path, monkeypatch) :
+    def no_fcntl(src, dst) :
+        raise ImportError('No module named fcntl')
+    monkeypatch.setattr(artifacts, '_clone_atomic', no_fcntl)
+    first, _, _ = upload_twice(tmp_path)
+    assert first.dedup is False and 'fcntl' in first.dedup_disabled_reason
+
+def test_other_clone_error_keeps_dedup(tmp_path, monkeypatch) :
+    # 공간 부족처럼 파일 하나에서만 난 오류로는 dedup 을 끄지 않는다.
+    calls = []
+    def clone(src, dst) :
+        calls.append(dst)
+        if len(calls) == 1 :
+            raise OSError(errno.ENOSPC, 'No space left on device')
+        artifacts._copy_atomic(src, dst, 1024)
+    monkeypatch.setattr(artifacts, '_clone_atomic', clone)
+    first, second, cas_root = upload_twice(tmp_path)
+
+    assert [f.status for f in first.files] == ['uploaded', 'deduplicated']
+    assert [f.status for f in second.files] == ['deduplicated', 'deduplicated']
+    assert (first.dedup, first.dedup_disabled_reason) == (True, None)
+    assert len(calls) == 4
+    check_overwrite_is_isolated(tmp_path, cas_root)
+
+def test_dedup_off_reports_reason(tmp_path) :
+    src = str(tmp_path / 'src')
+    write(os.path.join(src, 'model.txt'), 'weights')
+    result = artifacts.upload_directory(src, artifact_uri=str(tmp_path / 'run1'), dedup=False)
+    assert [f.status for f in result.files] == ['uploaded']
+    assert (result.dedup, result.dedup_disabled_reason) == (False, 'dedup=False')
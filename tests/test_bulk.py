@@ -0,0 +1,109 @@
+#################################################
+# bulk 권한 처리의 계획(_plan)과 실행(_run) 확인 (서버 없이)
+#################################################
+import threading
+import pytest
+from mlflow.exceptions import MlflowException
+from mlstudio_sdk import bulk, retry
+from mlstudio_sdk.bulk import CREATE, UPDATE, UPSERT, DELETE
+
+@pytest.mark.parametrize('mode, current, expected', [
+    (UPSERT, None, CREATE),
+    (UPSERT, 'READ', UPDATE),
+    (UPSERT, 'EDIT', None),     # 같은 권한이면 건너뛴다.
+    (DELETE, None, None),       # 없는 권한은 지우지 않는다.
+    (DELETE, 'READ', DELETE),
+    (CREATE, None, CREATE),
+    (UPDATE, 'READ', UPDATE),
+])
+def test_plan(mode, current, expected) :
+    assert bulk._plan(mode, 'EDIT', current) == expected
+
+def test_check_mode() :
+    with pytest.raises(ValueError) :
+        bulk._check_mode('merge', 'READ')
+    with pytest.raises(ValueError) :
+        bulk._check_mode(UPSERT, None)
+    bulk._check_mode(DELETE, None)
+
+class Server(object) :
+    def __init__(self, existing=()) :
+        self.permissions = dict(existing)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def actions(self, permission) :
+        def create(key, user_id) :
+            with self.lock :
+                self.calls.append((CREATE, key, user_id))
+                if (user_id, key) in self.permissions :
+                    raise MlflowException('already exists', error_code='RESOURCE_ALREADY_EXISTS')
+                self.permissions[(user_id, key)] = permission
+
+        def update(key, user_id) :
+            with self.lock :
+                self.calls.append((UPDATE, key, user_id))
+                self.permissions[(user_id, key)] = permission
+
+        def delete(key, user_id) :
+            with self.lock :
+                self.calls.append((DELETE, key, user_id))
+                del self.permissions[(user_id, key)]
+
+        return {CREATE: create, UPDATE: update, DELETE: delete}
+
+@pytest.fixture
+def changed(monkeypatch) :
+    users = []
+    monkeypatch.setattr(bulk, '_permissions_changed', users.append)
+    retry.reset()
+    return users
+
+def test_run_upsert(changed) :
+    server = Server({('alice', 1): 'READ', ('bob', 1): 'EDIT'})
+    current = dict(server.permissions)
+    results = bulk._run(['exp-1', 'missing'], {'exp-1': 1}, ['alice', 'bob', 'carol'], 'EDIT', UPSERT,
+                        current, server.actions('EDIT'), max_workers=4)
+
+    assert [(r.user_id, r.resource, r.action, r.status) for r in results] == [
+        ('alice', 'exp-1', UPDATE, 'ok'),
+        ('bob', 'exp-1', 'skip', 'skipped'),
+        ('carol', 'exp-1', CREATE, 'ok'),
+        ('alice', 'missing', 'skip', 'failed'),
+        ('bob', 'missing', 'skip', 'failed'),
+        ('carol', 'missing', 'skip', 'failed'),
+    ]
+    assert server.permissions == {('alice', 1): 'EDIT', ('bob', 1): 'EDIT', ('carol', 1): 'EDIT'}
+    assert sorted(changed) == ['alice', 'carol']
+
+def test_upsert_create_that_already_exists_becomes_update(changed) :
+    # 조회한 뒤 다른 곳에서 권한이 만들어진 경우
+    server = Server({('alice', 1): 'READ'})
+    results = bulk._run(['exp-1'], {'exp-1': 1}, ['alice'], 'EDIT', UPSERT, {}, server.actions('EDIT'), max_workers=1)
+
+    assert results[0].status == 'ok'
+    assert server.calls == [(CREATE, 1, 'alice'), (UPDATE, 1, 'alice')]
+    assert server.permissions[('alice', 1)] == 'EDIT'
+
+def test_run_delete_skips_missing(changed) :
+    server = Server({('alice', 1): 'READ'})
+    results = bulk._run(['exp-1', 'missing'], {'exp-1': 1}, ['alice', 'bob'], None, DELETE,
+                        dict(server.permissions), server.actions(None), max_workers=2)
+
+    assert [(r.user_id, r.resource, r.action, r.status) for r in results] == [
+        ('alice', 'exp-1', DELETE, 'ok'),
+        ('bob', 'exp-1', 'skip', 'skipped'),
+        ('alice', 'missing', 'skip', 'skipped'),
+        ('bob', 'missing', 'skip', 'skipped'),
+    ]
+    assert server.permissions == {}
+
+def test_run_reports_failures_per_item(changed) :
+    def fail(key, user_id) :
+        raise MlflowException('permission denied', error_code='PERMISSION_DENIED')
+    actions = {CREATE: fail, UPDATE: fail, DELETE: fail}
+    results = bulk._run(['exp-1'], {'exp-1': 1}, ['alice', 'bob'], 'READ', CREATE, {}, actions, max_workers=2)
+
+    assert [r.status for r in results] == ['failed', 'failed']
+    assert all('permission denied' in r.error for r in results)
+    assert sorted(changed) == ['alice', 'bob']
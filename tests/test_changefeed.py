@@ -0,0 +1,302 @@
+#################################################
+# changefeed.ChangeFeed 의 변경 계산 확인 (DB 없이)
+#################################################
+import re
+import json
+from contextlib import contextmanager
+import pytest
+from mlstudio_sdk import changefeed, permission_index
+from mlstudio_sdk.changefeed import Change, EXPERIMENTS, REGISTERED_MODELS, MODEL_VERSIONS, INSERT, UPDATE, DELETE
+
+# changefeed 가 만드는 SELECT 만 해석하는 tracking DB
+class FakeTracking(object) :
+    def __init__(self) :
+        self.rows = {EXPERIMENTS: [], REGISTERED_MODELS: [], MODEL_VERSIONS: []}
+        self.sqls = []
+
+    def experiment(self, experiment_id, stamp, lifecycle_stage='active') :
+        self._upsert(EXPERIMENTS, ('experiment_id',), {'experiment_id': experiment_id, 'name': f'exp-{experiment_id}',
+                     'artifact_location': f's3://b/{experiment_id}', 'lifecycle_stage': lifecycle_stage,
+                     'creation_time': 1, 'last_update_time': stamp})
+
+    def model(self, name, stamp) :
+        self._upsert(REGISTERED_MODELS, ('name',), {'name': name, 'creation_time': 1, 'last_updated_time': stamp, 'description': None})
+
+    def version(self, name, version, stamp, current_stage='None') :
+        self._upsert(MODEL_VERSIONS, ('name', 'version'), {'name': name, 'version': version, 'creation_time': 1,
+                     'last_updated_time': stamp, 'description': None, 'user_id': None, 'current_stage': current_stage,
+                     'source': None, 'run_id': None, 'status': 'READY', 'run_link': None})
+
+    def drop(self, table, **match) :
+        self.rows[table] = [r for r in self.rows[table] if any(r[c] != v for c, v in match.items())]
+
+    def _upsert(self, table, key, row) :
+        self.drop(table, **{c: row[c] for c in key})
+        self.rows[table].append(row)
+
+    def execute(self, conn, sql, params=None) :
+        self.sqls.append(sql)
+        m = re.match(r'SELECT (.+?) FROM (\w+)(?: WHERE (.+?))?(?: ORDER BY (\w+))?$', sql)
+        columns, table, where, order_by = m.group(1).split(', '), m.group(2), m.group(3), m.group(4)
+        conditions = self._conditions(where, list(params or []))
+        rows = [r for r in self.rows[table] if all(self._match(r, cond, values) for cond, values in conditions)]
+        if order_by :
+            rows.sort(key=lambda r : r[order_by])
+        return FakeCursor([tuple(r[c] for c in columns) for r in rows])
+
+    # 조건마다 사용하는 parameter 를 앞에서부터 나눠 준다.
+    def _conditions(self, where, params) :
+        conditions = []
+        for cond in (where.split(' AND ') if where else []) :
+            count = cond.count('%s')
+            conditions.append((cond, params[:count]))
+            del params[:count]
+        return conditions
+
+    def _match(self, row, cond, values) :
+        m = re.match(r'(\w+) = ANY', cond)
+        if m :
+            return row[m.group(1)] in values[0]
+        m = re.match(r'(\w+) >= %s', cond)
+        if m :
+            return row[m.group(1)] >= values[0]
+        assert cond.startswith('(name, version) IN')
+        return (row['name'], row['version']) in set(zip(values[0], values[1]))
+
+class FakeCursor(object) :
+    def __init__(self, rows) :
+        self.rows = rows
+
+    def fetchall(self) :
+        return self.rows
+
+    def fetchone(self) :
+        return self.rows[0] if self.rows else None
+
+@pytest.fixture
+def tracking(monkeypatch) :
+    fake = FakeTracking()
+    permissions = {'is_admin': False, 'experiments': [], 'models': []}
+
+    @contextmanager
+    def connection() :
+        yield None
+
+    def resolve(conn, query, params=()) :
+        if query is changefeed.queries.RESOLVE_EXPERIMENT_PERMISSIONS :
+            return FakeCursor([(permissions['is_admin'], [str(i) for i in permissions['experiments']])])
+        return FakeCursor([(permissions['is_admin'], list(permissions['models']))])
+
+    monkeypatch.setattr(changefeed.db, 'tracking_connection', connection)
+    monkeypatch.setattr(changefeed.db, 'auth_connection', connection)
+    monkeypatch.setattr(changefeed.db, 'execute', fake.execute)
+    monkeypatch.setattr(changefeed.queries, 'execute', resolve)
+    fake.permissions = permissions
+    return fake
+
+def by_key(changes) :
+    return {(c.table, c.key): c.action for c in changes}
+
+########################################
+# 처음 적재 / 증분 조회
+########################################
+def test_initial_load_inserts_visible_rows(tracking) :
+    tracking.experiment(1, 100)
+    tracking.experiment(2, 200, lifecycle_stage='deleted')
+    tracking.model('m', 100)
+    tracking.version('m', 1, 100)
+    tracking.version('m', 2, 100, current_stage='Deleted_Internal')
+
+    feed = changefeed.ChangeFeed(verify_interval=3600)
+    assert by_key(feed.poll()) == {
+        (EXPERIMENTS, 1): INSERT,
+        (EXPERIMENTS, 2): INSERT,      # experiment 삭제는 lifecycle_stage 로 구분한다.
+        (REGISTERED_MODELS, 'm'): INSERT,
+        (MODEL_VERSIONS, ('m', 1)): INSERT,
+    }
+    assert feed.stats()['tables'][EXPERIMENTS] == {'rows': 2, 'mark': 200}
+    assert feed.poll() == []
+
+def test_empty_tables_start_from_zero(tracking) :
+    feed = changefeed.ChangeFeed(verify_interval=3600)
+    assert feed.poll() == []
+    assert all(t['mark'] == 0 for t in feed.stats()['tables'].values())
+    tracking.experiment(1, 10)
+    assert by_key(feed.poll()) == {(EXPERIMENTS, 1): INSERT}
+
+def test_changes_within_overlap_are_reported_once(tracking) :
+    tracking.experiment(1, 1000)
+    tracking.experiment(2, 1000)
+    feed = changefeed.ChangeFeed(tables=(EXPERIMENTS,), overlap_ms=500, verify_interval=3600)
+    feed.poll()
+
+    # mark 와 같은 시각에 늦게 commit 된 행, mark 직후에 바뀐 행
+    tracking.experiment(3, 1000)
+    tracking.experiment(1, 1200, lifecycle_stage='deleted')
+    changes = feed.poll()
+    assert by_key(changes) == {(EXPERIMENTS, 3): INSERT, (EXPERIMENTS, 1): UPDATE}
+    assert [c.row['lifecycle_stage'] for c in changes if c.key == 1] == ['deleted']
+
+    # overlap 구간을 다시 읽어도 이미 본 (key, 변경 시각) 은 다시 돌려주지 않는다.
+    assert feed.poll() == []
+    assert any('last_update_time >= %s' in sql for sql in tracking.sqls)
+
+def test_model_version_deleted_internal_is_delete(tracking) :
+    tracking.model('m', 100)
+    tracking.version('m', 1, 100)
+    tracking.version('m', 2, 100)
+    feed = changefeed.ChangeFeed(tables=(MODEL_VERSIONS,), verify_interval=3600)
+    feed.poll()
+
+    tracking.version('m', 1, 150, current_stage='Deleted_Internal')
+    assert feed.poll() == [Change(MODEL_VERSIONS, DELETE, ('m', 1), None)]
+    assert feed.poll() == []
+    assert feed.stats()['tables'][MODEL_VERSIONS]['rows'] == 1
+
+########################################
+# 실제로 지워진 행
+########################################
+def test_hard_deleted_registered_model_is_found_by_verify(tracking) :
+    tracking.model('a', 100)
+    tracking.model('b', 100)
+    tracking.version('a', 1, 100)
+    feed = changefeed.ChangeFeed(tables=(REGISTERED_MODELS, MODEL_VERSIONS), verify_interval=3600)
+    feed.poll()
+
+    tracking.drop(REGISTERED_MODELS, name='a')
+    tracking.drop(MODEL_VERSIONS, name='a')
+    assert feed.poll() == []       # 변경 시각으로는 알 수 없다.
+
+    feed.request_verify(REGISTERED_MODELS)
+    assert feed.poll() == [Change(REGISTERED_MODELS, DELETE, 'a', None)]
+    feed.request_verify()
+    assert feed.poll() == [Change(MODEL_VERSIONS, DELETE, ('a', 1), None)]
+    assert feed.poll() == []
+
+def test_verify_rereads_rows_with_different_stamp(tracking) :
+    tracking.model('a', 100)
+    feed = changefeed.ChangeFeed(tables=(REGISTERED_MODELS,), overlap_ms=0, verify_interval=0)
+    feed.poll()
+
+    # 이름 변경 : 옛 이름은 지워지고, 새 이름은 mark 보다 앞선 시각으로 남는다.
+    tracking.drop(REGISTERED_MODELS, name='a')
+    tracking.model('b', 50)
+    assert by_key(feed.poll()) == {(REGISTERED_MODELS, 'a'): DELETE, (REGISTERED_MODELS, 'b'): INSERT}
+    assert feed.verifies == 2
+
+def test_resource_deleted_forces_verify(tracking) :
+    tracking.experiment(1, 100)
+    tracking.model('m', 100)
+    tracking.version('m', 1, 100)
+    feed = changefeed.ChangeFeed(verify_interval=3600)
+    feed.poll()
+
+    tracking.drop(EXPERIMENTS, experiment_id=1)
+    tracking.drop(REGISTERED_MODELS, name='m')
+    tracking.drop(MODEL_VERSIONS, name='m')
+    changefeed.resource_deleted(permission_index.REGISTERED_MODEL)
+    assert by_key(feed.poll()) == {(REGISTERED_MODELS, 'm'): DELETE, (MODEL_VERSIONS, ('m', 1)): DELETE}
+
+    changefeed.resource_deleted(permission_index.EXPERIMENT)
+    assert feed.poll() == [Change(EXPERIMENTS, DELETE, 1, None)]
+
+def test_failed_poll_keeps_state(tracking, monkeypatch) :
+    tracking.experiment(1, 100)
+    feed = changefeed.ChangeFeed(tables=(EXPERIMENTS,), verify_interval=3600)
+    feed.poll()
+    tracking.experiment(2, 200)
+
+    def fail(conn, sql, params=None) :
+        raise RuntimeError('query failed')
+    monkeypatch.setattr(changefeed.db, 'execute', fail)
+    with pytest.raises(RuntimeError) :
+        feed.poll()
+    monkeypatch.setattr(changefeed.db, 'execute', tracking.execute)
+    assert by_key(feed.poll()) == {(EXPERIMENTS, 2): INSERT}
+
+########################################
+# 권한
+########################################
+def test_visibility_grant_and_revoke(tracking) :
+    for i in (1, 2, 3) :
+        tracking.experiment(i, 100)
+    tracking.model('a', 100)
+    tracking.model('b', 100)
+    tracking.version('b', 1, 100)
+    tracking.permissions['experiments'] = [1]
+    tracking.permissions['models'] = ['a']
+
+    feed = changefeed.ChangeFeed('alice', verify_interval=3600)
+    assert by_key(feed.poll()) == {(EXPERIMENTS, 1): INSERT, (REGISTERED_MODELS, 'a'): INSERT}
+
+    # 권한이 생기면 그 행 전체를 insert 로 돌려준다. (변경 시각이 mark 보다 앞서도)
+    tracking.permissions['experiments'] = [1, 2]
+    tracking.permissions['models'] = ['a', 'b']
+    assert by_key(feed.poll()) == {(EXPERIMENTS, 2): INSERT, (REGISTERED_MODELS, 'b'): INSERT, (MODEL_VERSIONS, ('b', 1)): INSERT}
+
+    tracking.permissions['experiments'] = [2]
+    tracking.permissions['models'] = ['a']
+    assert by_key(feed.poll()) == {(EXPERIMENTS, 1): DELETE, (REGISTERED_MODELS, 'b'): DELETE, (MODEL_VERSIONS, ('b', 1)): DELETE}
+    assert feed.poll() == []
+
+    # 권한이 없는 행의 변경은 돌려주지 않는다.
+    tracking.experiment(1, 300)
+    tracking.experiment(2, 300)
+    assert by_key(feed.poll()) == {(EXPERIMENTS, 2): UPDATE}
+
+def test_visibility_admin_sees_everything(tracking) :
+    for i in (1, 2) :
+        tracking.experiment(i, 100)
+    tracking.permissions['experiments'] = [1]
+    feed = changefeed.ChangeFeed('alice', tables=(EXPERIMENTS,), verify_interval=3600)
+    feed.poll()
+
+    tracking.permissions['is_admin'] = True
+    assert by_key(feed.poll()) == {(EXPERIMENTS, 2): INSERT}
+    assert feed.checkpoint()['tables'][EXPERIMENTS]['visible'] is None
+
+    tracking.permissions['is_admin'] = False
+    assert by_key(feed.poll()) == {(EXPERIMENTS, 2): DELETE}
+
+def test_no_visible_rows_reads_nothing(tracking) :
+    tracking.experiment(1, 100)
+    feed = changefeed.ChangeFeed('alice', tables=(EXPERIMENTS,), verify_interval=0)
+    assert feed.poll() == []
+    assert feed.poll() == []
+    assert tracking.sqls == []
+
+########################################
+# 상태 저장 / 복원
+########################################
+def test_checkpoint_round_trip_through_json(tracking) :
+    tracking.experiment(1, 100)
+    tracking.model('m', 100)
+    tracking.version('m', 1, 100)
+    tracking.version('m', 2, 120)
+    tracking.permissions['experiments'] = [1]
+    tracking.permissions['models'] = ['m']
+    feed = changefeed.ChangeFeed('alice', verify_interval=3600)
+    feed.poll()
+
+    saved = json.loads(json.dumps(feed.checkpoint()))
+    restored = changefeed.ChangeFeed('alice', verify_interval=3600, checkpoint=saved)
+    assert restored.checkpoint() == feed.checkpoint()
+    assert restored._state[MODEL_VERSIONS].known == {('m', 1): 100, ('m', 2): 120}
+    assert restored._state[EXPERIMENTS].visible == frozenset([1])
+
+    # 복원한 뒤 처음 poll 에서 저장 이후 지워진 행을 비교한다.
+    tracking.drop(MODEL_VERSIONS, name='m', version=2)
+    tracking.version('m', 1, 130)
+    assert by_key(restored.poll()) == {(MODEL_VERSIONS, ('m', 1)): UPDATE, (MODEL_VERSIONS, ('m', 2)): DELETE}
+    assert restored.poll() == []
+
+def test_checkpoint_rejects_other_user_or_version() :
+    saved = changefeed.ChangeFeed('alice').checkpoint()
+    with pytest.raises(ValueError) :
+        changefeed.ChangeFeed('bob', checkpoint=saved)
+    with pytest.raises(ValueError) :
+        changefeed.ChangeFeed('alice', checkpoint=dict(saved, version=0))
+
+def test_unknown_table_is_rejected() :
+    with pytest.raises(ValueError) :
+        changefeed.ChangeFeed(tables=('runs',))
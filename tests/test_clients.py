@@ -0,0 +1,156 @@
+#################################################
+# clients 의 로그인별 client 생성과 ClientRegistry (한번만 생성, LRU) 확인 (서버 없이)
+#################################################
+import time
+import threading
+import pytest
+from mlstudio_sdk import clients
+from mlstudio_sdk.clients import ClientRegistry, MLFLOW_CLIENT, AUTH_CLIENT
+
+SERVER = 'http://mlflow.local:5000'
+
+@pytest.fixture
+def registry(monkeypatch) :
+    registry = ClientRegistry()
+    monkeypatch.setattr(clients, '_registry', registry)
+    return registry
+
+class FakeBuilder(object) :
+    def __init__(self, delay=0.0) :
+        self.delay = delay
+        self.built = []
+        self.lock = threading.Lock()
+
+    def __call__(self, tracking_uri, login_id='', login_pwd='') :
+        time.sleep(self.delay)
+        with self.lock :
+            self.built.append((tracking_uri, login_id, login_pwd))
+        return object()
+
+@pytest.fixture
+def builder(monkeypatch) :
+    builder = FakeBuilder()
+    closed = []
+    monkeypatch.setitem(clients._builders, MLFLOW_CLIENT, builder)
+    monkeypatch.setattr(clients, '_close_client', closed.append)
+    builder.closed = closed
+    return builder
+
+def creds(client) :
+    tracking = client._tracking_client.store.get_host_creds()
+    registry = client._get_registry_client().store.get_host_creds()
+    return (tracking.username, tracking.password), (registry.username, registry.password)
+
+########################################
+# 로그인별 client
+########################################
+def test_logins_get_distinct_clients_with_own_creds(registry, monkeypatch) :
+    monkeypatch.setenv('MLFLOW_TRACKING_USERNAME', 'env-user')
+    monkeypatch.setenv('MLFLOW_TRACKING_PASSWORD', 'env-pwd')
+    alice = clients.get_mlflow_client(SERVER, 'alice', 'pwd-a')
+    bob = clients.get_mlflow_client(SERVER, 'bob', 'pwd-b')
+
+    assert alice is not bob
+    assert creds(alice) == (('alice', 'pwd-a'), ('alice', 'pwd-a'))
+    assert creds(bob) == (('bob', 'pwd-b'), ('bob', 'pwd-b'))
+    assert clients.get_mlflow_client(SERVER, 'alice', 'pwd-a') is alice
+    # 비밀번호가 바뀌면 다른 client
+    assert clients.get_mlflow_client(SERVER, 'alice', 'new') is not alice
+
+    # 로그인 정보가 없으면 환경변수를 사용한다.
+    assert creds(clients.get_mlflow_client(SERVER)) == (('env-user', 'env-pwd'), ('env-user', 'env-pwd'))
+
+def test_auth_client_uses_login(registry) :
+    client = clients.get_auth_client(SERVER, 'alice', 'pwd-a')
+    assert client._get_host_creds().username == 'alice'
+    assert clients.get_auth_client(SERVER, 'alice', 'pwd-a') is client
+    assert clients.get_auth_client(SERVER, 'bob', 'pwd-b') is not client
+
+def test_sql_store_client_is_shared(registry, builder) :
+    a = clients.get_mlflow_client('postgresql://db/mlflow', 'alice', 'pwd-a')
+    b = clients.get_mlflow_client('postgresql://db/mlflow', 'bob', 'pwd-b')
+    assert a is b
+    assert builder.built == [('postgresql://db/mlflow', '', '')]
+
+########################################
+# MLflow 버전 확인
+########################################
+@pytest.mark.parametrize('version, supported', [
+    ('2.13.2', True), ('2.9.0', True), ('2.20.1rc0', True), ('2.8.1', False), ('3.0.0', False), ('1.30.0', False),
+])
+def test_check_mlflow_version(version, supported) :
+    if supported :
+        clients._check_mlflow_version(version)
+    else :
+        with pytest.raises(clients.UnsupportedMlflowVersion) :
+            clients._check_mlflow_version(version)
+
+def test_build_fails_on_unsupported_version(monkeypatch) :
+    monkeypatch.setattr(clients.mlflow, '__version__', '3.1.0')
+    with pytest.raises(clients.UnsupportedMlflowVersion) :
+        clients._build_mlflow_client(SERVER, 'alice', 'pwd-a')
+
+def test_build_fails_if_registry_client_is_not_used(monkeypatch) :
+    # MlflowClient 가 _registry_client_lazy 를 더 이상 읽지 않는 경우
+    monkeypatch.setattr(clients.MlflowClient, '_get_registry_client', lambda self : object())
+    with pytest.raises(clients.UnsupportedMlflowVersion) :
+        clients._build_mlflow_client(SERVER, 'alice', 'pwd-a')
+
+########################################
+# ClientRegistry
+########################################
+def test_concurrent_get_builds_once(registry, builder) :
+    builder.delay = 0.05
+    results = []
+    barrier = threading.Barrier(8)
+
+    def get() :
+        barrier.wait()
+        results.append(clients.get_mlflow_client(SERVER, 'alice', 'pwd-a'))
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for t in threads :
+        t.start()
+    for t in threads :
+        t.join()
+
+    assert builder.built == [(SERVER, 'alice', 'pwd-a')]
+    assert len(results) == 8 and all(r is results[0] for r in results)
+    assert registry._key_locks == {}
+
+def test_different_keys_build_in_parallel(registry, builder) :
+    builder.delay = 0.2
+    threads = [threading.Thread(target=clients.get_mlflow_client, args=(SERVER, f'user{i}', 'pwd')) for i in range(4)]
+    started = time.monotonic()
+    for t in threads :
+        t.start()
+    for t in threads :
+        t.join()
+    assert len(builder.built) == 4
+    assert time.monotonic() - started < 0.6
+
+def test_lru_eviction_closes_least_recently_used(monkeypatch, builder) :
+    registry = ClientRegistry(max_size=2)
+    a = registry.get(MLFLOW_CLIENT, SERVER, 'a', 'p')
+    b = registry.get(MLFLOW_CLIENT, SERVER, 'b', 'p')
+    assert registry.get(MLFLOW_CLIENT, SERVER, 'a', 'p') is a     # a 를 최근 사용으로
+    c = registry.get(MLFLOW_CLIENT, SERVER, 'c', 'p')
+
+    assert builder.closed == [b]
+    assert len(registry) == 2
+    assert registry.get(MLFLOW_CLIENT, SERVER, 'a', 'p') is a
+    assert registry.get(MLFLOW_CLIENT, SERVER, 'c', 'p') is c
+    assert registry.get(MLFLOW_CLIENT, SERVER, 'b', 'p') is not b   # 다시 만든다.
+    assert len(builder.built) == 4
+
+    registry.close()
+    assert len(registry) == 0
+    assert len(builder.closed) == 4
+
+def test_registry_keys_include_kind(registry, builder, monkeypatch) :
+    monkeypatch.setitem(clients._builders, AUTH_CLIENT, FakeBuilder())
+    assert registry.get(MLFLOW_CLIENT, SERVER, 'a', 'p') is not registry.get(AUTH_CLIENT, SERVER, 'a', 'p')
+
+def test_invalid_registry_size() :
+    with pytest.raises(ValueError) :
+        ClientRegistry(max_size=0)
@@ -0,0 +1,69 @@
+#################################################
+# common.iter_pages 확인
+#################################################
+import time
+import threading
+import pytest
+from mlstudio_sdk.common import iter_pages
+
+class Pages(object) :
+    def __init__(self, total) :
+        self.total = total
+        self.requests = []
+        self.threads = set()
+
+    def __call__(self, page_token, size) :
+        self.requests.append((page_token, size))
+        self.threads.add(threading.current_thread().name)
+        start = int(page_token or 0)
+        end = min(self.total, start + size)
+        return list(range(start, end)), (str(end) if end < self.total else None)
+
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_reads_every_page(prefetch) :
+    pages = Pages(25)
+    assert list(iter_pages(pages, 10, prefetch=prefetch)) == list(range(25))
+    assert pages.requests == [(None, 10), ('10', 10), ('20', 10)]
+
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_max_results_limits_requests(prefetch) :
+    pages = Pages(100)
+    assert list(iter_pages(pages, 10, max_results=23, prefetch=prefetch)) == list(range(23))
+    assert pages.requests == [(None, 10), ('10', 10), ('20', 3)]
+
+def test_max_results_zero() :
+    pages = Pages(10)
+    assert list(iter_pages(pages, 10, max_results=0)) == []
+    assert pages.requests == []
+
+def test_empty_result() :
+    assert list(iter_pages(Pages(0), 10)) == []
+
+def test_prefetch_fetches_next_page_in_background() :
+    pages = Pages(30)
+    items = iter_pages(pages, 10, prefetch=True)
+    assert next(items) == 0
+    list(items)
+    assert len(pages.threads) == 2
+
+def test_prefetch_requests_next_page_before_current_is_consumed() :
+    pages = Pages(30)
+    items = iter_pages(pages, 10, prefetch=True)
+    next(items)
+    # 첫 page 를 소비하는 동안 다음 page 요청이 나간다.
+    deadline = time.monotonic() + 5
+    while len(pages.requests) < 2 and time.monotonic() < deadline :
+        time.sleep(0.001)
+    assert pages.requests == [(None, 10), ('10', 10)]
+    items.close()
+
+def test_error_in_next_page_is_raised() :
+    def fetch(page_token, size) :
+        if page_token :
+            raise RuntimeError('server error')
+        return [1, 2], 'next'
+    items = iter_pages(fetch, 2)
+    assert next(items) == 1
+    assert next(items) == 2
+    with pytest.raises(RuntimeError) :
+        next(items)
@@ -0,0 +1,96 @@
+#################################################
+# Config 다시 읽기 확인
+#################################################
+import os
+import json
+import threading
+import pytest
+from mlstudio_sdk.config import Config
+
+RAW = {
+    'db': {
+        'cluster': {'ip': '127.0.0.1', 'port': 5432},
+        'user': {'mlflow': {'id': 'postgres', 'password': 'pw'}},
+        'database': {'mlflow': {'tracking': 'mlflow', 'auth': 'mlflow_auth'}},
+    },
+    'mlflow': {'server_url': 'http://127.0.0.1:5000', 'artifact_root': '/tmp/artifacts'},
+}
+
+def write_config(path, port) :
+    raw = json.loads(json.dumps(RAW))
+    raw['db']['cluster']['port'] = port
+    with open(path, 'w') as f :
+        f.write(json.dumps(raw))
+
+# singleton 과 별개인 Config
+def new_config(tmp_path) :
+    config = object.__new__(Config)
+    config.__init__()
+    config.config_path = str(tmp_path / 'mlstudio-config.json')
+    return config
+
+@pytest.fixture
+def listeners() :
+    added = []
+    yield added
+    for listener in added :
+        Config.remove_reload_listener(listener)
+
+def test_reload_notifies_listeners(tmp_path, listeners) :
+    config = new_config(tmp_path)
+    write_config(config.config_path, 5432)
+    assert ':5432/' in config.get_mlflow_tracking_uri()
+
+    changes = []
+    listeners.append(lambda old, new : changes.append((old.mlflow_tracking_uri, new.mlflow_tracking_uri)))
+    Config.add_reload_listener(listeners[-1])
+
+    write_config(config.config_path, 6543)
+    config.request_reload()
+    assert ':6543/' in config.get_mlflow_tracking_uri()
+    assert len(changes) == 1 and ':5432/' in changes[0][0] and ':6543/' in changes[0][1]
+
+def test_invalid_file_keeps_settings(tmp_path) :
+    config = new_config(tmp_path)
+    write_config(config.config_path, 5432)
+    uri = config.get_mlflow_tracking_uri()
+
+    with open(config.config_path, 'w') as f :
+        f.write('{')
+    config.request_reload()
+    assert config.get_mlflow_tracking_uri() == uri
+    assert config.last_error is not None
+
+def test_listeners_run_outside_config_lock(tmp_path, listeners) :
+    config = new_config(tmp_path)
+    write_config(config.config_path, 5432)
+    config.settings
+
+    entered = threading.Event()
+    release = threading.Event()
+    def slow_listener(old, new) :
+        entered.set()
+        release.wait(5)
+    listeners.append(slow_listener)
+    Config.add_reload_listener(slow_listener)
+
+    write_config(config.config_path, 6543)
+    config.request_reload()
+    reloader = threading.Thread(target=lambda : config.settings)
+    reloader.start()
+    try:
+        assert entered.wait(5)
+        # listener 가 끝나지 않았어도 다른 thread 는 lock 을 잡고 설정을 읽을 수 있다.
+        acquired = []
+        def read() :
+            if config._lock.acquire(timeout=1) :
+                acquired.append(True)
+                config._lock.release()
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join()
+        assert acquired == [True]
+        assert ':6543/' in config.get_mlflow_tracking_uri()
+    finally:
+        release.set()
+        reloader.join()
@@ -0,0 +1,258 @@
+#################################################
+# db 의 connection pool 확인 (실제 DB 없이 가짜 연결로)
+#################################################
+import time
+import threading
+from contextlib import contextmanager
+import pytest
+from mlstudio_sdk import db, retry
+
+class FakeConn(object) :
+    def __init__(self, dsn) :
+        self.dsn = dsn
+        self.closed = 0
+        self.autocommit = False
+
+    def close(self) :
+        self.closed = 1
+
+    def commit(self) :
+        pass
+
+    def rollback(self) :
+        pass
+
+    def get_transaction_status(self) :
+        return 0    # psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+class FakeConfig(object) :
+    def get_db_pool_options(self) :
+        return {'min_size': 1, 'max_size': 2, 'timeout': 1.0}
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch) :
+    monkeypatch.setattr(db, 'Config', FakeConfig)
+    monkeypatch.setattr(db, '_pools', {})
+    monkeypatch.setattr(db, '_pool_locks', {})
+    retry.reset()
+    yield
+    retry.reset()
+
+def test_pool_init_failure_closes_opened_connections(monkeypatch) :
+    opened = []
+    def open_conn(self) :
+        if len(opened) == 2 :
+            raise ValueError('connect failed')
+        opened.append(FakeConn(self.dsn))
+        return opened[-1]
+    monkeypatch.setattr(db.ConnectionPool, '_open', open_conn)
+
+    with pytest.raises(ValueError) :
+        db.ConnectionPool('postgresql://db/a', min_size=3, max_size=3)
+    assert len(opened) == 2
+    assert all(conn.closed for conn in opened)
+
+def test_slow_pool_does_not_block_other_dsns(monkeypatch) :
+    slow_started = threading.Event()
+    release = threading.Event()
+    def open_conn(self) :
+        if self.dsn.endswith('/slow') :
+            slow_started.set()
+            release.wait(5)
+        return FakeConn(self.dsn)
+    monkeypatch.setattr(db.ConnectionPool, '_open', open_conn)
+
+    slow = threading.Thread(target=db.get_pool, args=('postgresql://db/slow',))
+    slow.start()
+    try:
+        assert slow_started.wait(5)
+        start = time.monotonic()
+        pool = db.get_pool('postgresql://db/fast')
+        assert time.monotonic() - start < 1.0
+        assert pool.stats()['idle'] == 1
+    finally:
+        release.set()
+        slow.join()
+    assert db.get_pool('postgresql://db/slow') is db._pools['postgresql://db/slow']
+
+def test_get_pool_builds_once_per_dsn(monkeypatch) :
+    built = []
+    original = db.ConnectionPool.__init__
+    def init(self, dsn, **kwargs) :
+        built.append(dsn)
+        time.sleep(0.05)
+        original(self, dsn, **kwargs)
+    monkeypatch.setattr(db.ConnectionPool, '__init__', init)
+    monkeypatch.setattr(db.ConnectionPool, '_open', lambda self : FakeConn(self.dsn))
+
+    pools = []
+    threads = [threading.Thread(target=lambda : pools.append(db.get_pool('postgresql://db/a'))) for _ in range(8)]
+    for t in threads :
+        t.start()
+    for t in threads :
+        t.join()
+    assert built == ['postgresql://db/a']
+    assert all(pool is pools[0] for pool in pools)
+
+########################################
+# ReplicaRouter
+########################################
+def make_router(monkeypatch, fail=()) :
+    def open_conn(self) :
+        if self.dsn in fail :
+            raise db.PoolError('connect failed')
+        return FakeConn(self.dsn)
+    monkeypatch.setattr(db.ConnectionPool, '_open', open_conn)
+    monkeypatch.setattr(db.ConnectionPool, '_is_healthy', lambda self, conn, last_used : True)
+    for dsn in ('postgresql://db/r1', 'postgresql://db/r2', 'postgresql://db/primary') :
+        if dsn not in fail :
+            db._pools[dsn] = db.ConnectionPool(dsn, min_size=0, max_size=1, timeout=0.1)
+    router = db.ReplicaRouter('postgresql://db/primary', ['postgresql://db/r1', 'postgresql://db/r2'])
+    for replica in router._replicas :
+        replica.next_check = float('inf')
+    return router
+
+def leased_dsn(lease) :
+    with lease as conn :
+        return conn.dsn
+
+def test_busy_replica_is_skipped_without_marking_down(monkeypatch) :
+    router = make_router(monkeypatch)
+    held = db._pools['postgresql://db/r1'].getconn()
+
+    assert {leased_dsn(router.connection(timeout=0.1)) for _ in range(4)} == {'postgresql://db/r2'}
+    assert all(r['healthy'] and r['failures'] == 0 for r in router.stats()['replicas'])
+    assert router.primary_reads == 0
+    db._pools['postgresql://db/r1'].putconn(held)
+
+def test_all_replicas_busy_waits_instead_of_using_primary(monkeypatch) :
+    router = make_router(monkeypatch)
+    held = [db._pools[dsn].getconn() for dsn in ('postgresql://db/r1', 'postgresql://db/r2')]
+
+    with pytest.raises(db.PoolTimeoutError) :
+        router.connection(timeout=0.05)
+    assert all(r['healthy'] for r in router.stats()['replicas'])
+    assert router.primary_reads == 0
+    assert held
+
+def test_unreachable_replica_is_marked_down(monkeypatch) :
+    router = make_router(monkeypatch, fail=('postgresql://db/r1', 'postgresql://db/r2'))
+    monkeypatch.setattr(db.retry, 'call', lambda backend, func, *args : func())
+
+    assert leased_dsn(router.connection(timeout=0.1)) == 'postgresql://db/primary'
+    assert [r['healthy'] for r in router.stats()['replicas']] == [False, False]
+    assert router.primary_reads == 1
+
+########################################
+# 대용량 조회 (server-side cursor)
+########################################
+class FakeNamedCursor(object) :
+    def __init__(self, name, rows) :
+        self.name = name
+        self.rows = list(rows)
+        self.itersize = None
+        self.executed = None
+        self.fetches = []
+        self.closed = False
+
+    def execute(self, sql, params) :
+        self.executed = (sql, params)
+
+    def fetchmany(self, size) :
+        self.fetches.append(size)
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self) :
+        self.closed = True
+
+class FakeStreamConn(object) :
+    def __init__(self, rows) :
+        self.rows = rows
+        self.cursors = []
+
+    def cursor(self, name=None) :
+        assert name is not None      # server-side cursor 만 사용한다.
+        cursor = FakeNamedCursor(name, self.rows)
+        self.cursors.append(cursor)
+        return cursor
+
+@pytest.fixture
+def streaming(monkeypatch) :
+    conn = FakeStreamConn([(i, f'exp-{i}') for i in range(5)])
+    used = []
+
+    def lease(kind) :
+        @contextmanager
+        def connection(dsn, timeout=None) :
+            used.append(kind)
+            try:
+                yield conn
+            finally:
+                used.append('returned')
+        return connection
+
+    monkeypatch.setattr(db, 'connection', lease('primary'))
+    monkeypatch.setattr(db, 'read_connection', lease('read'))
+    conn.used = used
+    return conn
+
+def test_stream_fetches_in_batches(streaming) :
+    rows = list(db.stream('postgresql://db/t', 'SELECT 1', ('p',), batch_size=2))
+    assert rows == [(i, f'exp-{i}') for i in range(5)]
+    cursor = streaming.cursors[0]
+    assert cursor.executed == ('SELECT 1', ('p',))
+    assert cursor.itersize == 2
+    assert cursor.fetches == [2, 2, 2, 2]      # 마지막 빈 batch 로 끝을 안다.
+    assert cursor.closed
+    assert streaming.used == ['primary', 'returned']
+
+def test_stream_uses_unique_cursor_names_and_read_connection(streaming) :
+    list(db.stream('postgresql://db/t', 'SELECT 1', readonly=True))
+    list(db.stream('postgresql://db/t', 'SELECT 1', readonly=True))
+    names = [c.name for c in streaming.cursors]
+    assert len(set(names)) == 2 and all(n.startswith('mlstudio_cursor_') for n in names)
+    assert streaming.used == ['read', 'returned', 'read', 'returned']
+
+def test_stream_closed_early_returns_connection(streaming) :
+    rows = db.stream('postgresql://db/t', 'SELECT 1', batch_size=2)
+    assert next(rows) == (0, 'exp-0')
+    rows.close()
+    assert streaming.cursors[0].closed
+    assert streaming.cursors[0].fetches == [2]
+    assert streaming.used == ['primary', 'returned']
+
+@pytest.mark.parametrize('row_type, expected', [
+    (db.TUPLE_ROW, (1, 'exp-1')),
+    (db.DICT_ROW, {'experiment_id': 1, 'name': 'exp-1'}),
+])
+def test_stream_row_types(streaming, row_type, expected) :
+    factory = db.row_factory(('experiment_id', 'name'), row_type)
+    assert list(db.stream('postgresql://db/t', 'SELECT 1', factory=factory))[1] == expected
+
+def test_row_factory_record() :
+    make = db.row_factory(['experiment_id', 'name'], db.RECORD_ROW)
+    row = make((1, 'exp-1'))
+    assert (row.experiment_id, row.name) == (1, 'exp-1') and row == (1, 'exp-1')
+    # 같은 컬럼이면 같은 type 을 다시 사용한다.
+    assert type(db.row_factory(('experiment_id', 'name'), db.RECORD_ROW)((2, 'x'))) is type(row)
+    assert db.row_factory(('a',), db.TUPLE_ROW) is None
+    with pytest.raises(ValueError) :
+        db.row_factory(('a',), 'list')
+
+def test_to_columns_dict_and_empty() :
+    rows = [(1, 'a'), (2, 'b')]
+    assert db.to_columns(iter(rows), ('id', 'name')) == {'id': [1, 2], 'name': ['a', 'b']}
+    assert db.to_columns([], ['id', 'name']) == {'id': [], 'name': []}
+    with pytest.raises(ValueError) :
+        db.to_columns(rows, ('id', 'name'), format='list')
+
+def test_to_columns_numpy_and_pandas() :
+    numpy = pytest.importorskip('numpy')
+    pandas = pytest.importorskip('pandas')
+    rows = [(1, 'a'), (2, 'b')]
+    arrays = db.to_columns(rows, ('id', 'name'), format='numpy')
+    assert isinstance(arrays['id'], numpy.ndarray) and arrays['id'].tolist() == [1, 2]
+    frame = db.to_columns(rows, ('id', 'name'), format='pandas')
+    assert list(frame.columns) == ['id', 'name'] and frame['name'].tolist() == ['a', 'b']
+    assert len(db.to_columns([], ('id', 'name'), format='pandas')) == 0
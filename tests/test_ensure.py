@@ -0,0 +1,224 @@
+#################################################
+# mlflow_api / aio 의 ensure_experiment(s) / ensure_registered_model(s) 확인 (가짜 client)
+#################################################
+import asyncio
+import pytest
+from mlflow.exceptions import MlflowException
+from mlflow.protos import databricks_pb2
+from mlstudio_sdk import aio, mlflow_api
+from mlstudio_sdk.cache import TTLCache
+
+class FakeConfig(object) :
+    def get_mlflow_tracking_uri(self) :
+        return 'postgresql://db/mlflow'
+
+    def get_mlflow_artifact_url(self) :
+        return '/tmp/artifacts'
+
+class FakeModel(object) :
+    def __init__(self, name) :
+        self.name = name
+
+class FakeExperiment(object) :
+    def __init__(self, experiment_id) :
+        self.experiment_id = experiment_id
+
+# 이미 있는 이름을 만들면 MLflow 와 같이 RESOURCE_ALREADY_EXISTS 오류를 낸다.
+class FakeClient(object) :
+    def __init__(self) :
+        self.experiments = {}
+        self.models = set()
+        self.error = None      # create 가 돌려줄 오류 (None 이면 정상)
+        self.creates = []
+
+    def create_experiment(self, name, artifact_location, tags) :
+        self.creates.append(name)
+        if self.error is not None :
+            raise self.error
+        if name in self.experiments :
+            raise MlflowException(f"Experiment '{name}' already exists.", error_code=databricks_pb2.RESOURCE_ALREADY_EXISTS)
+        self.experiments[name] = str(len(self.experiments) + 1)
+        return self.experiments[name]
+
+    def get_experiment_by_name(self, name) :
+        return FakeExperiment(self.experiments[name]) if name in self.experiments else None
+
+    def create_registered_model(self, name, tags, desc) :
+        self.creates.append(name)
+        if self.error is not None :
+            raise self.error
+        if name in self.models :
+            raise MlflowException(f"Registered Model (name={name}) already exists.", error_code=databricks_pb2.RESOURCE_ALREADY_EXISTS)
+        self.models.add(name)
+        return FakeModel(name)
+
+    def get_registered_model(self, name) :
+        if name not in self.models :
+            raise MlflowException('not found', error_code=databricks_pb2.RESOURCE_DOES_NOT_EXIST)
+        return FakeModel(name)
+
+@pytest.fixture
+def session(monkeypatch) :
+    monkeypatch.setattr(mlflow_api, 'config', FakeConfig())
+    monkeypatch.setattr(mlflow_api, 'experiment_cache', TTLCache(ttl=60, negative_ttl=60))
+    monkeypatch.setattr(mlflow_api, 'registered_model_cache', TTLCache(ttl=60, negative_ttl=60))
+    monkeypatch.setattr(mlflow_api, '_resource_changed', lambda *args : None)
+    client = FakeClient()
+    monkeypatch.setattr(mlflow_api.Session, '_client', lambda self, tracking_uri=None : client)
+    return mlflow_api.Session('admin', 'pwd'), client
+
+########################################
+# 오류 구분
+########################################
+@pytest.mark.parametrize('error_code, message, expected', [
+    ('RESOURCE_ALREADY_EXISTS', 'anything', True),
+    ('INTERNAL_ERROR', "Experiment 'x' already exists.", True),
+    ('INTERNAL_ERROR', '(psycopg2.errors.UniqueViolation) duplicate key value violates unique constraint', True),
+    ('INTERNAL_ERROR', '(psycopg2.errors.NotNullViolation) null value in column "name"', False),
+    ('INTERNAL_ERROR', '(sqlalchemy.exc.IntegrityError) (psycopg2.errors.ForeignKeyViolation) insert or update violates foreign key', False),
+    ('INVALID_PARAMETER_VALUE', 'bad name', False),
+])
+def test_is_already_exists_error(error_code, message, expected) :
+    assert mlflow_api._is_already_exists_error(error_code, message) is expected
+    assert mlflow_api._is_already_exists(MlflowException(message, error_code=getattr(databricks_pb2, error_code))) is expected
+
+def test_is_already_exists_needs_mlflow_exception() :
+    assert not mlflow_api._is_already_exists(ValueError('already exists'))
+
+########################################
+# experiment
+########################################
+def test_ensure_experiment_creates_then_reuses(session) :
+    s, client = session
+    assert s.ensure_experiment('exp') == '1'
+    assert s.ensure_experiment('exp') == '1'
+    assert client.creates == ['exp', 'exp']
+
+def test_ensure_experiment_create_race_looks_up_id(session) :
+    s, client = session
+    client.experiments['exp'] = '42'          # 다른 process 가 먼저 만들었다.
+    assert s.ensure_experiment('exp') == '42'
+
+def test_ensure_experiment_already_exists_but_missing(session) :
+    s, client = session
+    client.error = MlflowException('(psycopg2.errors.UniqueViolation) duplicate key', error_code=databricks_pb2.INTERNAL_ERROR)
+    with pytest.raises(Exception, match='does not exist') :
+        s.ensure_experiment('exp')
+
+@pytest.mark.parametrize('error', [
+    MlflowException('(sqlalchemy.exc.IntegrityError) (psycopg2.errors.NotNullViolation) null value', error_code=databricks_pb2.INTERNAL_ERROR),
+    MlflowException('permission denied', error_code=databricks_pb2.PERMISSION_DENIED),
+    ConnectionError('connection refused'),
+])
+def test_ensure_experiment_propagates_other_errors(session, error) :
+    s, client = session
+    client.error = error
+    with pytest.raises(type(error)) :
+        s.ensure_experiment('exp')
+
+def test_ensure_experiments_mixes_new_and_existing(session) :
+    s, client = session
+    client.experiments['old'] = '9'
+    assert s.ensure_experiments(['new', 'old', 'new'], max_workers=4) == {'new': '2', 'old': '9'}
+
+########################################
+# registered model
+########################################
+def test_ensure_registered_model_create_race_confirms(session) :
+    s, client = session
+    client.models.add('model')
+    assert s.ensure_registered_model('model') == 'model'
+    assert s.ensure_registered_model('model') == 'model'      # cache
+    assert client.creates == ['model']
+
+def test_ensure_registered_model_already_exists_but_missing(session) :
+    s, client = session
+    client.error = MlflowException('(psycopg2.errors.UniqueViolation) duplicate key', error_code=databricks_pb2.INTERNAL_ERROR)
+    with pytest.raises(Exception, match='does not exist') :
+        s.ensure_registered_model('model')
+    assert mlflow_api.registered_model_cache.lookup(('postgresql://db/mlflow', 'admin', 'model')) == (True, None)
+
+@pytest.mark.parametrize('error', [
+    MlflowException('(sqlalchemy.exc.IntegrityError) (psycopg2.errors.ForeignKeyViolation) violates foreign key', error_code=databricks_pb2.INTERNAL_ERROR),
+    MlflowException('bad name', error_code=databricks_pb2.INVALID_PARAMETER_VALUE),
+])
+def test_ensure_registered_model_propagates_other_errors(session, error) :
+    s, client = session
+    client.error = error
+    with pytest.raises(MlflowException) :
+        s.ensure_registered_model('model')
+
+def test_ensure_registered_models_with_specs(session) :
+    s, client = session
+    client.models.add('old')
+    assert s.ensure_registered_models(['old', {'name': 'new', 'desc': 'd'}], max_workers=2) == {'old': 'old', 'new': 'new'}
+
+def test_ensure_registered_models_propagates_errors(session) :
+    s, client = session
+    client.error = MlflowException('permission denied', error_code=databricks_pb2.PERMISSION_DENIED)
+    with pytest.raises(MlflowException) :
+        s.ensure_registered_models(['a', 'b'], max_workers=2)
+
+########################################
+# aio
+########################################
+class FakeArtifactConfig(object) :
+    def get_mlflow_artifact_url(self) :
+        return '/tmp/artifacts'
+
+@pytest.fixture
+def rest(monkeypatch) :
+    monkeypatch.setattr(aio, 'Config', FakeArtifactConfig)
+    monkeypatch.setattr(aio, '_resource_changed', lambda *args : None)
+    state = {'experiments': {}, 'models': set(), 'error': None}
+
+    async def request(self, endpoint, method, params=None, json=None) :
+        if endpoint.endswith('/create') and state['error'] is not None :
+            raise state['error']
+        if endpoint == 'experiments/create' :
+            if json['name'] in state['experiments'] :
+                raise aio.RestError('already exists', 'RESOURCE_ALREADY_EXISTS', 400)
+            state['experiments'][json['name']] = str(len(state['experiments']) + 1)
+            return {'experiment_id': state['experiments'][json['name']]}
+        if endpoint == 'experiments/get-by-name' :
+            if params['experiment_name'] not in state['experiments'] :
+                raise aio.RestError('not found', 'RESOURCE_DOES_NOT_EXIST', 404)
+            return {'experiment': {'experiment_id': state['experiments'][params['experiment_name']]}}
+        if endpoint == 'registered-models/create' :
+            if json['name'] in state['models'] :
+                raise aio.RestError('already exists', 'RESOURCE_ALREADY_EXISTS', 400)
+            state['models'].add(json['name'])
+            return {'registered_model': {'name': json['name']}}
+        if params['name'] not in state['models'] :
+            raise aio.RestError('not found', 'RESOURCE_DOES_NOT_EXIST', 404)
+        return {'registered_model': {'name': params['name']}}
+    monkeypatch.setattr(aio.AsyncSession, '_request', request)
+    return state
+
+def run(call) :
+    async def main() :
+        session = aio.AsyncSession('admin', 'pwd')
+        session._semaphore = asyncio.Semaphore(4)
+        return await call(session)
+    return asyncio.run(main())
+
+def test_async_ensure_experiments_create_race(rest) :
+    rest['experiments']['old'] = '9'
+    assert run(lambda s : s.ensure_experiments(['old', 'new'])) == {'old': '9', 'new': '2'}
+
+def test_async_ensure_registered_model_confirms(rest) :
+    rest['models'].add('model')
+    assert run(lambda s : s.ensure_registered_model('model')) == 'model'
+
+    rest['error'] = aio.RestError('(psycopg2.errors.UniqueViolation) duplicate key', 'INTERNAL_ERROR', 500)
+    with pytest.raises(Exception, match='does not exist') :
+        run(lambda s : s.ensure_registered_model('other'))
+
+@pytest.mark.parametrize('call', [
+    lambda s : s.ensure_experiment('exp'),
+    lambda s : s.ensure_registered_model('model'),
+])
+def test_async_ensure_propagates_other_errors(rest, call) :
+    rest['error'] = aio.RestError('(sqlalchemy.exc.IntegrityError) (psycopg2.errors.NotNullViolation)', 'INTERNAL_ERROR', 500)
+    with pytest.raises(aio.RestError) :
+        run(call)
@@ -0,0 +1,32 @@
+#################################################
+# export 의 merge join 확인 (DB 없이)
+#################################################
+from mlstudio_sdk import export
+
+def test_merge_join_attaches_names() :
+    permissions = [(1, 'alice', False, 'READ'), (1, 'bob', True, 'MANAGE'), (3, 'alice', False, 'EDIT'), (7, 'carol', False, 'READ')]
+    names = [(1, 'exp-1'), (2, 'exp-2'), (3, 'exp-3'), (5, 'exp-5')]
+    assert list(export._merge_join(permissions, names)) == [
+        (1, 'exp-1', 'alice', False, 'READ'),
+        (1, 'exp-1', 'bob', True, 'MANAGE'),
+        (3, 'exp-3', 'alice', False, 'EDIT'),
+        (7, None, 'carol', False, 'READ'),     # tracking DB 에 없는 experiment
+    ]
+
+def test_merge_join_string_keys_in_byte_order() :
+    permissions = [('Model', 'alice', False, 'READ'), ('model', 'bob', False, 'READ')]
+    names = [('Model', 'Model'), ('model', 'model')]
+    assert [row[1] for row in export._merge_join(permissions, names)] == ['Model', 'model']
+
+def test_merge_join_empty_inputs() :
+    assert list(export._merge_join([], [(1, 'exp-1')])) == []
+    assert list(export._merge_join([(1, 'alice', False, 'READ')], [])) == [(1, None, 'alice', False, 'READ')]
+
+def test_merge_join_consumes_names_lazily() :
+    consumed = []
+    def names() :
+        for i in range(1, 1000) :
+            consumed.append(i)
+            yield (i, f'exp-{i}')
+    assert list(export._merge_join([(2, 'alice', False, 'READ')], names())) == [(2, 'exp-2', 'alice', False, 'READ')]
+    assert consumed == [1, 2]
@@ -0,0 +1,45 @@
+#################################################
+# mlstudio_sdk cold import 시간 확인
+#  - 설정 파일이 없어도 import 되어야 한다.
+#  - mlflow, psycopg2 는 처음 사용할 때까지 import 하지 않는다.
+#################################################
+import os
+import sys
+import json
+import tempfile
+import subprocess
+
+IMPORT_TIME_BUDGET = 0.5  # seconds
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+IMPORT_SCRIPT = """
+import sys
+import json
+import time
+
+start = time.perf_counter()
+import mlstudio_sdk.mlflow_api
+elapsed = time.perf_counter() - start
+
+heavy = [m for m in ('mlflow', 'psycopg2', 'numpy', 'pandas') if m in sys.modules]
+print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))
+"""
+
+def cold_import() :
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([SRC_PATH] + [p for p in [env.get('PYTHONPATH')] if p])
+    with tempfile.TemporaryDirectory() as empty_conf_path :
+        env['CONF_PATH'] = empty_conf_path
+        out = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], env=env,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return json.loads(out.stdout.decode().strip().splitlines()[-1])
+
+def test_import_does_not_load_heavy_dependencies() :
+    result = cold_import()
+    assert result['heavy'] == []
+
+def test_cold_import_time_budget() :
+    # 가장 빠른 값으로 비교하여 CI 의 일시적인 부하 영향을 줄인다.
+    elapsed = min(cold_import()['elapsed'] for _ in range(3))
+    assert elapsed < IMPORT_TIME_BUDGET, f'cold import took {elapsed:.3f}s (budget {IMPORT_TIME_BUDGET}s)'
@@ -0,0 +1,59 @@
+#################################################
+# instrumentation 작업 이름과 histogram 확인
+#################################################
+import pytest
+from mlstudio_sdk import instrumentation, mlflow_api
+
+@pytest.fixture
+def exporter() :
+    exporter = instrumentation.HistogramExporter()
+    records = []
+    instrumentation.add_listener(exporter)
+    instrumentation.add_listener(records.append)
+    instrumentation.enable()
+    yield exporter, records
+    instrumentation.disable()
+    instrumentation.remove_listener(exporter)
+    instrumentation.remove_listener(records.append)
+
+def test_session_methods_are_recorded_without_prefix(exporter, monkeypatch) :
+    exporter, records = exporter
+    monkeypatch.setattr(mlflow_api.Session, '_get_experiment_by_name', lambda self, name, tracking_uri=None : None)
+    monkeypatch.setattr(mlflow_api, 'config', type('FakeConfig', (), {'get_mlflow_server_url' : lambda self : 'http://mlflow'})())
+
+    with pytest.raises(Exception) :
+        mlflow_api.Session('admin', 'pwd').apply_experiment_permission('missing', 'user1', 'READ')
+
+    assert [r.name for r in records] == ['apply_experiment_permission']
+    assert exporter.percentile('apply_experiment_permission', 99) is not None
+    assert exporter.percentile('Session.apply_experiment_permission', 99) is None
+
+def test_instrument_class_prefix(exporter) :
+    exporter, records = exporter
+
+    @instrumentation.instrument_class('aio')
+    class Client(object) :
+        def call(self) :
+            return 1
+
+        def _private(self) :
+            return 2
+
+    assert Client().call() == 1
+    assert Client()._private() == 2
+    assert [r.name for r in records] == ['aio.call']
+
+def test_nested_operations_are_recorded_once(exporter) :
+    exporter, records = exporter
+
+    @instrumentation.operation('inner')
+    def inner() :
+        return 1
+
+    @instrumentation.operation('outer')
+    def outer() :
+        return inner() + inner()
+
+    assert outer() == 2
+    assert [r.name for r in records] == ['outer']
+    assert exporter.snapshot()['outer']['count'] == 1
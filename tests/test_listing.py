@@ -0,0 +1,205 @@
+#################################################
+# mlflow_api 의 권한별 experiment 목록 조회 (keyset page / streaming / 컬럼 단위) 확인 (가짜 DB)
+#################################################
+import re
+from contextlib import contextmanager
+import pytest
+from mlstudio_sdk import db, mlflow_api, queries
+
+EXPERIMENTS = [{'experiment_id': i, 'name': f'exp-{i}', 'artifact_location': f's3://b/{i}', 'lifecycle_stage': 'active',
+                'creation_time': i, 'last_update_time': i} for i in range(0, 10)]
+
+# 사용자 -> (관리자 여부, auth DB 의 experiment_id 문자열 목록)
+USERS = {
+    'admin': (True, []),
+    'alice': (False, ['1', '3', '4', '7', '9', 'abc']),     # 숫자가 아닌 id 는 무시한다.
+    'nobody': (False, []),
+}
+
+class FakeCursor(object) :
+    def __init__(self, rows) :
+        self.rows = rows
+
+    def fetchone(self) :
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self) :
+        return self.rows
+
+# queries.execute : prepared query 를 이름으로 구분하여 결과를 돌려준다.
+def fake_execute(executed) :
+    def execute(conn, query, params=(), cursor_factory=None) :
+        executed.append((query.name, params))
+        if query is queries.RESOLVE_EXPERIMENT_PERMISSIONS :
+            user = USERS.get(params[0])
+            return FakeCursor([user] if user else [])
+        if query is queries.ALL_EXPERIMENTS_PAGE :
+            ids, after, limit = None, params[0], params[1]
+        else :
+            ids, after, limit = params
+        rows = [dict(r) for r in EXPERIMENTS if (ids is None or r['experiment_id'] in ids) and r['experiment_id'] > after]
+        return FakeCursor(rows if limit is None else rows[:limit])
+    return execute
+
+# named cursor 로 iter_experiments_by_permission 의 SELECT 를 해석한다.
+class FakeNamedCursor(object) :
+    def __init__(self, conn) :
+        self.conn = conn
+        self.rows = []
+
+    def execute(self, sql, params) :
+        columns = [c.strip() for c in re.search(r'SELECT (.+?)\s+FROM', sql, re.S).group(1).split(',')]
+        rows = EXPERIMENTS
+        if 'experiment_id = ANY(%s)' in sql :
+            rows = [r for r in rows if r['experiment_id'] in params[0]]
+        self.rows = [tuple(r[c] for c in columns) for r in sorted(rows, key=lambda r : r['experiment_id'])]
+
+    def fetchmany(self, size) :
+        self.conn.fetches.append(size)
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self) :
+        pass
+
+class FakeStreamConn(object) :
+    def __init__(self) :
+        self.fetches = []
+        self.cursor_names = []
+
+    def cursor(self, name=None) :
+        self.cursor_names.append(name)
+        return FakeNamedCursor(self)
+
+class FakeConfig(object) :
+    def get_mlflow_tracking_uri(self) :
+        return 'postgresql://db/mlflow'
+
+@pytest.fixture
+def listing(monkeypatch) :
+    executed = []
+
+    @contextmanager
+    def connection(*args, **kwargs) :
+        yield None
+
+    monkeypatch.setattr(mlflow_api, 'result_cache', None)
+    monkeypatch.setattr(mlflow_api.db, 'auth_read_connection', connection)
+    monkeypatch.setattr(mlflow_api.db, 'tracking_read_connection', connection)
+    monkeypatch.setattr(mlflow_api.queries, 'execute', fake_execute(executed))
+    return executed
+
+@pytest.fixture
+def streaming(listing, monkeypatch) :
+    conn = FakeStreamConn()
+
+    @contextmanager
+    def connection(*args, **kwargs) :
+        yield conn
+
+    monkeypatch.setattr(mlflow_api, 'config', FakeConfig())
+    monkeypatch.setattr(db, 'read_connection', connection)
+    return conn
+
+def ids(rows) :
+    return [r['experiment_id'] for r in rows]
+
+# 마지막 row 의 id 를 다음 page 의 after_experiment_id 로 넘기며 빈 page 가 올 때까지 읽는다.
+def walk(user_name, page_size) :
+    pages = []
+    after = None
+    while True :
+        page = mlflow_api.list_experiments_by_permission(user_name, page_size, after)
+        if not page :
+            return pages
+        pages.append(ids(page))
+        after = page[-1]['experiment_id']
+
+########################################
+# keyset page
+########################################
+def test_resolve_converts_string_ids(listing) :
+    assert mlflow_api.resolve_experiment_permissions('alice') == (False, [1, 3, 4, 7, 9])
+    assert mlflow_api.resolve_experiment_permissions('admin') == (True, [])
+    assert mlflow_api.resolve_experiment_permissions('ghost') == (False, [])
+
+def test_admin_pages_by_experiment_id(listing) :
+    executed = listing
+    assert walk('admin', 4) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    # 처음 page 는 -1 부터 (experiment 0 을 포함), 이후는 이전 page 의 마지막 id 부터
+    assert [p for name, p in executed if name == 'all_experiments_page'] == [(-1, 4), (3, 4), (7, 4), (9, 4)]
+
+def test_user_pages_only_permitted_ids(listing) :
+    executed = listing
+    assert walk('alice', 2) == [[1, 3], [4, 7], [9]]
+    assert [p[1:] for name, p in executed if name == 'experiments_by_ids_page'] == [(-1, 2), (3, 2), (7, 2), (9, 2)]
+
+def test_page_boundary_exactly_full(listing) :
+    # 마지막 page 가 꽉 찬 경우 다음 page 는 빈 목록이다.
+    assert walk('alice', 5) == [[1, 3, 4, 7, 9]]
+    assert mlflow_api.list_experiments_by_permission('alice', 5, 9) == []
+
+def test_after_experiment_id_accepts_string(listing) :
+    assert ids(mlflow_api.list_experiments_by_permission('alice', 2, '3')) == [4, 7]
+
+def test_no_page_size_returns_everything(listing) :
+    assert ids(mlflow_api.get_experiments_by_permission('alice')) == [1, 3, 4, 7, 9]
+    assert len(mlflow_api.list_experiments_by_permission('admin')) == 10
+
+def test_user_without_permissions_reads_nothing(listing) :
+    executed = listing
+    assert mlflow_api.list_experiments_by_permission('nobody', 10) == []
+    assert mlflow_api.list_experiments_by_permission('ghost', 10) == []
+    assert [name for name, _ in executed] == ['resolve_experiment_permissions'] * 2
+
+########################################
+# streaming
+########################################
+@pytest.mark.parametrize('row_type, first', [
+    (db.TUPLE_ROW, (1, 'exp-1')),
+    (db.RECORD_ROW, (1, 'exp-1')),
+    (db.DICT_ROW, {'experiment_id': 1, 'name': 'exp-1'}),
+])
+def test_iter_row_types(streaming, row_type, first) :
+    rows = list(mlflow_api.iter_experiments_by_permission('alice', ('experiment_id', 'name'), row_type=row_type))
+    assert len(rows) == 5 and rows[0] == first
+    if row_type == db.RECORD_ROW :
+        assert rows[0].name == 'exp-1'
+
+def test_iter_batches_with_named_cursor(streaming) :
+    conn = streaming
+    rows = list(mlflow_api.iter_experiments_by_permission('admin', ('experiment_id',), batch_size=3))
+    assert rows == [(i,) for i in range(10)]
+    assert conn.fetches == [3, 3, 3, 3, 3]
+    assert conn.cursor_names[0].startswith('mlstudio_cursor_')
+
+def test_iter_default_columns_and_unknown_column(streaming) :
+    row = next(iter(mlflow_api.iter_experiments_by_permission('alice')))
+    assert len(row) == len(mlflow_api.EXPERIMENT_COLUMNS)
+    with pytest.raises(ValueError) :
+        mlflow_api.iter_experiments_by_permission('alice', ('experiment_id', 'password'))
+
+def test_iter_without_permissions_is_empty(streaming) :
+    conn = streaming
+    assert list(mlflow_api.iter_experiments_by_permission('nobody')) == []
+    assert conn.cursor_names == []
+
+########################################
+# 컬럼 단위
+########################################
+def test_columns_dict(streaming) :
+    result = mlflow_api.get_experiments_by_permission_columns('alice', ('experiment_id', 'name'), batch_size=2)
+    assert result == {'experiment_id': [1, 3, 4, 7, 9], 'name': ['exp-1', 'exp-3', 'exp-4', 'exp-7', 'exp-9']}
+
+def test_columns_empty(streaming) :
+    assert mlflow_api.get_experiments_by_permission_columns('nobody', ('experiment_id', 'name')) == {'experiment_id': [], 'name': []}
+
+def test_columns_pandas(streaming) :
+    pytest.importorskip('pandas')
+    frame = mlflow_api.get_experiments_by_permission_columns('admin', ('experiment_id', 'lifecycle_stage'), format='pandas')
+    assert list(frame.columns) == ['experiment_id', 'lifecycle_stage']
+    assert frame['experiment_id'].tolist() == list(range(10))
+
+def test_columns_invalid_format(streaming) :
+    with pytest.raises(ValueError) :
+        mlflow_api.get_experiments_by_permission_columns('alice', format='list')
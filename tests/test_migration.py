@@ -0,0 +1,42 @@
+#################################################
+# migration.relocate_artifacts 의 경로 계산 확인 (DB 없이)
+#################################################
+from contextlib import contextmanager
+from mlstudio_sdk import migration, mlflow_api
+
+def relocate(monkeypatch, rows, **kwargs) :
+    selected = []
+    updated = []
+
+    @contextmanager
+    def connection() :
+        yield None
+
+    def select_chunk(conn, mapping, old_prefix, after_experiment_id, chunk_size) :
+        selected.append(old_prefix)
+        return rows if after_experiment_id is None else []
+
+    monkeypatch.setattr(migration.db, 'tracking_connection', connection)
+    monkeypatch.setattr(migration, '_select_chunk', select_chunk)
+    monkeypatch.setattr(migration, '_update_experiments', lambda conn, changes : updated.extend(changes))
+    monkeypatch.setattr(migration, '_update_runs', lambda conn, changes : 0)
+    migration.relocate_artifacts(**kwargs)
+    return selected, updated
+
+def test_prefix_is_matched_per_path(monkeypatch) :
+    rows = [(1, 's3://b/a'), (2, 's3://b/a/'), (3, 's3://b/a/x/y')]
+    selected, updated = relocate(monkeypatch, rows, old_prefix='s3://b/a/', new_prefix='s3://n/z')
+    assert selected == ['s3://b/a']
+    assert updated == [
+        (1, 's3://b/a', 's3://n/z'),
+        (2, 's3://b/a/', 's3://n/z/'),
+        (3, 's3://b/a/x/y', 's3://n/z/x/y'),
+    ]
+
+def test_run_changes_use_base_locations() :
+    assert migration._run_changes([(1, 's3://b/a/', 's3://n/z/')]) == [(1, 's3://b/a', 's3://n/z')]
+
+def test_relocation_clears_experiment_name_cache(monkeypatch) :
+    mlflow_api.experiment_cache.get_or_load('exp', lambda : 'stale experiment')
+    relocate(monkeypatch, [(1, 's3://b/a/run')], old_prefix='s3://b/a', new_prefix='s3://n')
+    assert mlflow_api.experiment_cache.lookup('exp') == (False, None)
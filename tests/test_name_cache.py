@@ -0,0 +1,136 @@
+#################################################
+# mlflow_api 의 이름 조회 cache 가 사용자 / tracking uri 별로 나뉘는지 확인 (가짜 client)
+#################################################
+import threading
+import pytest
+from mlstudio_sdk import mlflow_api
+from mlstudio_sdk.cache import TTLCache
+
+class FakeConfig(object) :
+    def get_mlflow_tracking_uri(self) :
+        return 'postgresql://db/mlflow'
+
+    def get_mlflow_server_url(self) :
+        return 'http://mlflow'
+
+    def get_mlflow_artifact_url(self) :
+        return '/tmp/artifacts'
+
+class FakeClient(object) :
+    def __init__(self, visible) :
+        self.visible = visible
+        self.calls = 0
+
+    def get_experiment_by_name(self, name) :
+        self.calls += 1
+        return f'experiment:{name}' if name in self.visible else None
+
+    def create_experiment(self, name, artifact_location, tags) :
+        self.visible.add(name)
+        return '1'
+
+@pytest.fixture
+def sessions(monkeypatch) :
+    monkeypatch.setattr(mlflow_api, 'config', FakeConfig())
+    monkeypatch.setattr(mlflow_api, 'experiment_cache', TTLCache(ttl=60, negative_ttl=60))
+    monkeypatch.setattr(mlflow_api, '_resource_changed', lambda *args : None)
+    # admin 과 SQL client 는 모든 experiment 를, user1 은 자기 것만 볼 수 있다.
+    shared = {'secret', 'public'}
+    clients = {
+        ('http://mlflow', 'admin'): FakeClient(shared),
+        ('http://mlflow', 'user1'): FakeClient({'public'}),
+        ('postgresql://db/mlflow', 'user1'): FakeClient(shared),
+        ('postgresql://db/mlflow', 'admin'): FakeClient(shared),
+    }
+    monkeypatch.setattr(mlflow_api.Session, '_client',
+                        lambda self, tracking_uri=None : clients[(tracking_uri or 'postgresql://db/mlflow', self.login_id)])
+    return mlflow_api.Session('admin', 'pwd'), mlflow_api.Session('user1', 'pwd'), clients
+
+def test_cache_is_per_login(sessions) :
+    admin, user1, _ = sessions
+    assert admin._get_experiment_by_name('secret', 'http://mlflow') == 'experiment:secret'
+    assert user1._get_experiment_by_name('secret', 'http://mlflow') is None
+
+def test_cache_is_per_tracking_uri(sessions) :
+    _, user1, _ = sessions
+    assert user1._get_experiment_by_name('secret') == 'experiment:secret'     # SQL client
+    assert user1._get_experiment_by_name('secret', 'http://mlflow') is None
+
+def test_cache_hit_for_same_key(sessions) :
+    admin, _, clients = sessions
+    for _ in range(3) :
+        admin._get_experiment_by_name('public', 'http://mlflow')
+    assert clients[('http://mlflow', 'admin')].calls == 1
+
+def test_create_invalidates_name_for_all_users(sessions) :
+    admin, user1, clients = sessions
+    assert user1._get_experiment_by_name('new', 'http://mlflow') is None
+    assert admin._get_experiment_by_name('new', 'http://mlflow') is None
+
+    admin.create_experiment('new')
+    clients[('http://mlflow', 'user1')].visible.add('new')
+    assert user1._get_experiment_by_name('new', 'http://mlflow') == 'experiment:new'
+    assert admin._get_experiment_by_name('new', 'http://mlflow') == 'experiment:new'
+
+########################################
+# 조회 중 무효화
+########################################
+def test_invalidate_during_load_is_not_stored() :
+    cache = TTLCache(ttl=60, negative_ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+
+    def load() :
+        started.set()
+        release.wait(5)
+        return 'id-1'
+
+    loader = threading.Thread(target=lambda : cache.get_or_load(('uri', 'admin', 'exp'), load))
+    loader.start()
+    assert started.wait(5)
+    # 조회 중에 다른 thread 가 삭제하여 무효화한 경우
+    mlflow_api._invalidate_name(cache, 'exp')
+    release.set()
+    loader.join()
+
+    assert cache.lookup(('uri', 'admin', 'exp')) == (False, None)
+    assert cache.get_or_load(('uri', 'admin', 'exp'), lambda : None) is None
+
+@pytest.mark.parametrize('invalidate', [
+    lambda cache, key : cache.invalidate(key),
+    lambda cache, key : cache.clear(),
+])
+def test_invalidate_or_clear_during_load(invalidate) :
+    cache = TTLCache(ttl=60)
+
+    def load() :
+        invalidate(cache, 'k')
+        return 'stale'
+
+    assert cache.get_or_load('k', load) == 'stale'
+    assert cache.lookup('k') == (False, None)
+    assert cache.get_or_load('k', lambda : 'fresh') == 'fresh'
+    assert cache.lookup('k') == (True, 'fresh')
+
+def test_load_error_is_not_cached() :
+    cache = TTLCache(ttl=60)
+    with pytest.raises(RuntimeError) :
+        cache.get_or_load('k', lambda : (_ for _ in ()).throw(RuntimeError('down')))
+    assert cache.lookup('k') == (False, None)
+    assert cache._flights == {}
+
+def test_ensure_experiment_after_delete_during_load(sessions, monkeypatch) :
+    admin, _, clients = sessions
+    client = clients[('postgresql://db/mlflow', 'admin')]
+    original = client.get_experiment_by_name
+
+    def racing_lookup(name) :
+        value = original(name)
+        # 조회가 끝나기 전에 다른 thread 가 experiment 를 지운다.
+        client.visible.discard(name)
+        mlflow_api._invalidate_name(mlflow_api.experiment_cache, name)
+        return value
+
+    monkeypatch.setattr(client, 'get_experiment_by_name', racing_lookup)
+    assert admin._get_experiment_by_name('secret') == 'experiment:secret'
+    assert mlflow_api.experiment_cache.lookup(admin._name_key('secret')) == (False, None)
@@ -0,0 +1,215 @@
+#################################################
+# permission_index.PermissionIndex 의 적재 / 갱신 / 무효화 확인 (DB 없이)
+#################################################
+import re
+from contextlib import contextmanager
+import pytest
+from mlstudio_sdk import permission_index
+from mlstudio_sdk.permission_index import PermissionIndex, EXPERIMENT, REGISTERED_MODEL, CAN_READ, CAN_UPDATE, CAN_MANAGE, ALL_PERMISSIONS
+
+# users / experiment_permissions / registered_model_permissions 세 테이블만 있는 auth DB
+class FakeAuth(object) :
+    def __init__(self) :
+        self.tables = {'users': [], 'experiment_permissions': [], 'registered_model_permissions': []}
+        self.queries = []
+
+    def user(self, user_id, user_name, is_admin=False) :
+        self.tables['users'].append((user_id, user_name, is_admin))
+
+    def experiment(self, row_id, user_id, experiment_id, permission) :
+        self.tables['experiment_permissions'].append((row_id, user_id, str(experiment_id), permission))
+
+    def model(self, row_id, user_id, name, permission) :
+        self.tables['registered_model_permissions'].append((row_id, user_id, name, permission))
+
+    # 권한 행 변경 (id 는 그대로)
+    def update(self, table, row_id, permission) :
+        self.tables[table] = [r[:3] + (permission,) if r[0] == row_id else r for r in self.tables[table]]
+
+    def cursor(self) :
+        return FakeCursor(self)
+
+class FakeCursor(object) :
+    def __init__(self, auth) :
+        self.auth = auth
+        self.rows = []
+
+    def execute(self, sql, params) :
+        m = re.match(r'SELECT .+ FROM (\w+) WHERE (\w+) (>|= ANY\()', sql)
+        table, column, op = m.groups()
+        self.auth.queries.append((table, column, params[0]))
+        index = {'id': 0, 'username': 1, 'user_id': 1}[column]
+        if op == '>' :
+            self.rows = [r for r in self.auth.tables[table] if r[index] > params[0]]
+        else :
+            self.rows = [r for r in self.auth.tables[table] if r[index] in params[0]]
+
+    def fetchall(self) :
+        return list(self.rows)
+
+@pytest.fixture
+def auth(monkeypatch) :
+    fake = FakeAuth()
+    fake.user(1, 'alice')
+    fake.user(2, 'bob')
+    fake.user(3, 'admin', is_admin=True)
+    fake.experiment(1, 1, 10, 'READ')
+    fake.experiment(2, 1, 11, 'MANAGE')
+    fake.experiment(3, 2, 10, 'EDIT')
+    fake.model(1, 1, 'm1', 'EDIT')
+    fake.model(2, 2, '10', 'READ')        # experiment id 와 같은 이름의 model
+
+    @contextmanager
+    def connection() :
+        yield fake
+
+    monkeypatch.setattr(permission_index.db, 'auth_connection', connection)
+    return fake
+
+########################################
+# 권한 확인
+########################################
+def test_rebuild_loads_masks(auth) :
+    index = PermissionIndex()
+    assert index.mask('alice', 10) == CAN_READ
+    assert index.mask('alice', '11') == ALL_PERMISSIONS       # experiment id 는 문자열로 비교
+    assert index.mask('bob', 10) == CAN_READ | CAN_UPDATE
+    assert index.mask('alice', 'm1', REGISTERED_MODEL) == CAN_READ | CAN_UPDATE
+    assert index.mask('admin', 99) == ALL_PERMISSIONS
+    assert index.mask('nobody', 10) == 0
+    assert index.stats() == {'users': 3, 'experiment_permissions': 3, 'registered_model_permissions': 2, 'dirty_users': 0}
+
+def test_check_many_keeps_order(auth) :
+    index = PermissionIndex()
+    assert index.can_read_many('alice', [11, 12, 10]) == [True, False, True]
+    assert index.can_update_many('alice', ['10', '11']) == [False, True]
+    assert index.can_manage_many('alice', ['m1', 'x'], REGISTERED_MODEL) == [False, False]
+    assert index.can_read_many('admin', [1, 2]) == [True, True]
+    assert index.can_read_many('nobody', [10, 11]) == [False, False]
+    assert index.check_many('bob', [], CAN_READ) == []
+
+def test_default_permission_applies_without_rows(auth) :
+    index = PermissionIndex(default_permission='READ')
+    assert index.can_read('alice', 99) and not index.can_update('alice', 99)
+    assert index.can_read_many('bob', [99, 10], REGISTERED_MODEL) == [True, True]
+    assert index.can_update('alice', 11)                      # 권한 행이 있으면 그대로
+    assert not index.can_read('nobody', 99)                   # 없는 사용자는 default 도 적용하지 않는다.
+
+    auth.experiment(4, 2, 12, 'NO_PERMISSIONS')
+    assert not PermissionIndex(default_permission='MANAGE').can_read('bob', 12)
+
+########################################
+# 갱신
+########################################
+def test_refresh_reads_only_new_rows(auth) :
+    index = PermissionIndex()
+    assert index._last_user_id == 3
+    assert index._last_experiment_permission_id == 3
+    assert index._last_registered_model_permission_id == 2
+
+    del auth.queries[:]
+    auth.user(4, 'carol')
+    auth.experiment(4, 4, 20, 'READ')
+    auth.model(3, 2, 'm2', 'MANAGE')
+    index.refresh()
+    assert auth.queries == [('users', 'id', 3), ('experiment_permissions', 'id', 3), ('registered_model_permissions', 'id', 2)]
+    assert index.can_read('carol', 20)
+    assert index.can_manage('bob', 'm2', REGISTERED_MODEL)
+    assert (index._last_user_id, index._last_experiment_permission_id, index._last_registered_model_permission_id) == (4, 4, 3)
+
+    # 새 행이 없으면 아무것도 바꾸지 않는다.
+    users = index._users
+    index.refresh()
+    assert index._users is users
+
+def test_refresh_copies_published_users(auth) :
+    index = PermissionIndex()
+    before = index._users['alice']
+    before_bob = index._users['bob']
+    auth.experiment(4, 1, 12, 'EDIT')
+    index.refresh()
+
+    # 읽는 쪽이 들고 있던 객체는 바뀌지 않고, 권한이 추가된 사용자만 새 객체가 된다.
+    assert '12' not in before.experiments
+    assert index._users['alice'] is not before
+    assert index._users['alice'].experiments == {'10': CAN_READ, '11': ALL_PERMISSIONS, '12': CAN_READ | CAN_UPDATE}
+    assert index._users['bob'] is before_bob
+
+def test_apply_permissions_copy_on_write(auth) :
+    index = PermissionIndex()
+    users = dict(index._users)
+    alice = users['alice']
+    rows = [(9, 1, '30', 'READ'), (10, 1, '31', 'EDIT'), (11, 99, '32', 'READ')]    # 없는 user_id 는 무시
+
+    index._apply_permissions(users, rows, 'experiments', copy=True)
+    assert '30' not in alice.experiments
+    assert users['alice'] is not alice
+    assert users['alice'].experiments['31'] == CAN_READ | CAN_UPDATE
+    assert users['alice'].registered_models == alice.registered_models
+    assert users['alice'].registered_models is not alice.registered_models
+
+    copied = users['alice']
+    index._apply_permissions(users, [(12, 1, '33', 'READ')], 'experiments', copy=False)
+    assert users['alice'] is copied and copied.experiments['33'] == CAN_READ
+
+    index._apply_permissions(index._users, rows[:1], 'experiments', copy=False)
+    assert index._users['alice'] is alice and alice.experiments['30'] == CAN_READ
+
+def test_dirty_user_is_reloaded_on_read(auth) :
+    index = PermissionIndex()
+    auth.update('experiment_permissions', 1, 'MANAGE')           # 변경은 refresh 로 알 수 없다.
+    index.refresh()
+    assert index.mask('alice', 10) == CAN_READ
+
+    index.invalidate_user('alice')
+    assert index.stats()['dirty_users'] == 1
+    del auth.queries[:]
+    assert index.mask('alice', 10) == ALL_PERMISSIONS
+    assert auth.queries == [('users', 'username', ['alice']), ('experiment_permissions', 'user_id', [1]),
+                            ('registered_model_permissions', 'user_id', [1])]
+    assert index.stats()['dirty_users'] == 0
+
+    # 다시 읽지 않는다.
+    del auth.queries[:]
+    index.can_read_many('alice', [10])
+    assert auth.queries == []
+
+def test_dirty_user_that_was_deleted(auth) :
+    index = PermissionIndex()
+    auth.tables['users'] = [r for r in auth.tables['users'] if r[1] != 'bob']
+    permission_index.invalidate_user('bob')
+    assert not index.can_read('bob', 10)
+    assert 'bob' not in index._users and 2 not in index._names_by_id
+
+def test_invalidate_resource_by_type(auth) :
+    index = PermissionIndex()
+    # experiment id 는 숫자로 주어도 문자열 key 로 찾고, model 이름 '10' 과는 섞이지 않는다.
+    index.invalidate_resource(10)
+    assert index._dirty == {'alice', 'bob'}
+
+    index._dirty.clear()
+    index.invalidate_resource('10', REGISTERED_MODEL)
+    assert index._dirty == {'bob'}
+
+    index._dirty.clear()
+    index.invalidate_resource('m1', REGISTERED_MODEL)
+    index.invalidate_resource(11, EXPERIMENT)
+    assert index._dirty == {'alice'}
+
+    index._dirty.clear()
+    permission_index.invalidate_resource(99)
+    assert index._dirty == set()
+
+def test_rebuild_clears_dirty_and_removed_rows(auth) :
+    index = PermissionIndex()
+    index.invalidate_user('alice')
+    auth.tables['experiment_permissions'] = [r for r in auth.tables['experiment_permissions'] if r[1] != 1]
+    index.rebuild()
+    assert index._dirty == set()
+    assert index.can_read_many('alice', [10, 11]) == [False, False]
+    assert index._last_experiment_permission_id == 3
+
+def test_load_false_reads_nothing(auth) :
+    index = PermissionIndex(load=False)
+    assert auth.queries == []
+    assert not index.can_read('alice', 10)
@@ -0,0 +1,80 @@
+#################################################
+# provisioning 의 계획(_plan)과 입력(read_users) 확인 (DB 없이)
+#################################################
+import io
+import pytest
+from mlstudio_sdk import provisioning
+from mlstudio_sdk.provisioning import (
+    CREATE, DELETE, GRANT_ADMIN, REVOKE_ADMIN, SKIP, UserSpec, user_spec, read_users, reconcile_users,
+)
+
+def plan(specs, current, delete_missing=True, keep=(), delete_admins=()) :
+    specs = {s.username: s for s in specs}
+    return [(u, a) for u, a, _ in provisioning._plan(specs, current, delete_missing, set(keep), set(delete_admins))]
+
+def test_plan_diff() :
+    current = {'alice': False, 'bob': False, 'carol': True}
+    specs = [user_spec('alice'), user_spec('bob', is_admin=True), user_spec('carol'), user_spec('dave')]
+    assert plan(specs, current) == [
+        ('alice', SKIP), ('bob', GRANT_ADMIN), ('carol', REVOKE_ADMIN), ('dave', CREATE),
+    ]
+
+def test_plan_keeps_missing_users_without_delete_missing() :
+    assert plan([], {'alice': False}, delete_missing=False) == [('alice', SKIP)]
+
+def test_plan_deletes_missing_users_except_keep() :
+    current = {'alice': False, 'bob': False}
+    assert plan([], current, keep=['bob']) == [('alice', DELETE), ('bob', SKIP)]
+
+def test_plan_deletes_admin_only_when_named() :
+    current = {'root': True, 'ops': True, 'alice': False}
+    assert plan([], current) == [('alice', DELETE), ('ops', SKIP), ('root', SKIP)]
+    assert plan([], current, delete_admins=['ops']) == [('alice', DELETE), ('ops', DELETE), ('root', SKIP)]
+
+def test_delete_missing_requires_max_deletes() :
+    with pytest.raises(ValueError) :
+        reconcile_users('admin', 'pwd', [], delete_missing=True)
+
+def test_max_deletes_guard(monkeypatch) :
+    monkeypatch.setattr(provisioning, '_current_users', lambda : {'admin': True, 'a': False, 'b': False})
+    with pytest.raises(provisioning.ProvisioningError) :
+        reconcile_users('admin', 'pwd', [], delete_missing=True, max_deletes=1)
+
+def test_dry_run_does_not_apply(monkeypatch) :
+    monkeypatch.setattr(provisioning, '_current_users', lambda : {'admin': True, 'a': False})
+    def fail(*args) :
+        raise AssertionError('must not apply')
+    monkeypatch.setattr(provisioning, '_apply', fail)
+    results = reconcile_users('admin', 'pwd', [user_spec('b')], delete_missing=True, max_deletes=5, dry_run=True)
+    assert [(r.username, r.action, r.status) for r in results] == [
+        ('a', DELETE, 'skipped'), ('admin', SKIP, 'skipped'), ('b', CREATE, 'skipped'),
+    ]
+
+def test_read_users_jsonl() :
+    source = io.StringIO('{"username": " alice ", "password_env": "PW"}\n\n{"username": "bob", "is_admin": true}\n')
+    assert list(read_users(source, format='jsonl')) == [
+        UserSpec('alice', False, None, 'PW', None),
+        UserSpec('bob', True, None, None, None),
+    ]
+
+def test_read_users_csv() :
+    source = io.StringIO('username,is_admin,password\nalice,yes,pw1\nbob,,\n')
+    assert list(read_users(source, format='csv')) == [
+        UserSpec('alice', True, 'pw1', None, None),
+        UserSpec('bob', False, None, None, None),
+    ]
+
+def test_read_users_format_from_extension(tmp_path) :
+    path = tmp_path / 'users.ndjson'
+    path.write_text('{"username": "alice"}\n')
+    assert [s.username for s in read_users(str(path))] == ['alice']
+
+@pytest.mark.parametrize('text', [
+    '{"username": "alice", "admin": true}\n',   # 모르는 field
+    '{"username": ""}\n',                       # 이름 없음
+    '{"username": "alice", "is_admin": "maybe"}\n',
+    'not json\n',
+])
+def test_read_users_invalid(text) :
+    with pytest.raises(ValueError) :
+        list(read_users(io.StringIO(text), format='jsonl'))
@@ -0,0 +1,20 @@
+#################################################
+# queries 의 권장 index 확인
+#################################################
+from mlstudio_sdk import queries
+
+# MLflow schema 에 이미 있는 제약 / index
+MLFLOW_INDEXES = ('users_username_key', 'experiment_pk', 'model_version_pk', 'registered_model_pk', 'run_pk')
+
+def test_recommended_indexes_are_concurrent_and_new() :
+    for database, _, sql in queries.RECOMMENDED_INDEXES :
+        assert database in ('auth', 'tracking')
+        assert sql.startswith('CREATE INDEX CONCURRENTLY IF NOT EXISTS ')
+        assert queries._index_name(sql) not in MLFLOW_INDEXES
+
+def test_index_name() :
+    assert queries._index_name('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_a ON t (c)') == 'ix_a'
+
+def test_dry_run_returns_statements() :
+    statements = queries.create_recommended_indexes(dry_run=True)
+    assert statements == [(database, sql) for database, _, sql in queries.RECOMMENDED_INDEXES]
@@ -0,0 +1,143 @@
+#################################################
+# result_cache.ResultCache 확인
+#################################################
+import time
+import threading
+import pytest
+from mlstudio_sdk import result_cache
+from mlstudio_sdk.result_cache import ResultCache, user_tag
+
+def test_hit_and_miss() :
+    cache = ResultCache(ttl=60)
+    loads = []
+    load = lambda : loads.append(1) or ['row']
+    assert cache.get_or_load('k', load) == ['row']
+    assert cache.get_or_load('k', load) == ['row']
+    assert len(loads) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 1)
+
+def test_ttl_expiry() :
+    cache = ResultCache(ttl=0.02)
+    cache.get_or_load('k', lambda : 1)
+    time.sleep(0.03)
+    assert cache.get_or_load('k', lambda : 2) == 2
+    assert cache.stats()['expirations'] == 1
+
+def test_zero_ttl_does_not_store() :
+    cache = ResultCache(ttl=0)
+    cache.get_or_load('k', lambda : 1)
+    assert len(cache) == 0
+
+def test_single_flight() :
+    cache = ResultCache(ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+    loads = []
+
+    def load() :
+        loads.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    results = []
+    leader = threading.Thread(target=lambda : results.append(cache.get_or_load('k', load)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda : results.append(cache.get_or_load('k', load))) for _ in range(5)]
+    for t in followers :
+        t.start()
+    # follower 들이 기다리기 시작할 때까지
+    deadline = time.monotonic() + 5
+    while cache.stats()['shared'] < 5 and time.monotonic() < deadline :
+        time.sleep(0.001)
+    release.set()
+    for t in [leader] + followers :
+        t.join()
+
+    assert loads == [1]
+    assert results == ['value'] * 6
+    assert cache.stats()['shared'] == 5
+
+def test_single_flight_error_is_shared_and_not_cached() :
+    cache = ResultCache(ttl=60)
+    with pytest.raises(ValueError) :
+        cache.get_or_load('k', lambda : (_ for _ in ()).throw(ValueError('db down')))
+    assert len(cache) == 0
+    assert cache.get_or_load('k', lambda : 'ok') == 'ok'
+
+def test_byte_budget_evicts_least_recently_used() :
+    cache = ResultCache(max_bytes=300, ttl=60, sizeof=lambda value : 100)
+    for key in ('a', 'b', 'c') :
+        cache.get_or_load(key, lambda : key)
+    cache.get_or_load('a', lambda : 'reloaded')     # a 를 최근 사용으로
+    cache.get_or_load('d', lambda : 'd')
+
+    assert cache.get_or_load('a', lambda : 'miss') == 'a'
+    assert cache.get_or_load('b', lambda : 'miss') == 'miss'
+    stats = cache.stats()
+    assert stats['bytes'] <= 300
+    assert stats['evictions'] >= 1
+
+def test_oversized_value_is_not_cached() :
+    cache = ResultCache(max_bytes=100, ttl=60, sizeof=lambda value : 1000)
+    assert cache.get_or_load('k', lambda : 'big') == 'big'
+    assert len(cache) == 0
+    assert cache.stats()['oversized'] == 1
+
+def test_estimate_size_counts_nested_values() :
+    small = result_cache.estimate_size([{'name': 'a'}])
+    large = result_cache.estimate_size([{'name': 'a' * 1000}])
+    assert large - small >= 999
+
+def test_invalidate_tag() :
+    cache = ResultCache(ttl=60)
+    cache.get_or_load(('list', 'alice'), lambda : 1, (user_tag('alice'), 'experiment'))
+    cache.get_or_load(('list', 'bob'), lambda : 2, (user_tag('bob'), 'experiment'))
+    cache.get_or_load(('models', 'bob'), lambda : 3, (user_tag('bob'), 'registered_model'))
+
+    cache.invalidate_tag(user_tag('alice'))
+    assert len(cache) == 2
+    cache.invalidate_tag('experiment')
+    assert len(cache) == 1
+    assert cache.get_or_load(('models', 'bob'), lambda : 'miss') == 3
+    assert cache.stats()['invalidations'] == 2
+
+def test_invalidation_during_load_is_not_stored() :
+    cache = ResultCache(ttl=60)
+
+    def load() :
+        # 조회 중에 권한이 바뀐 경우
+        cache.invalidate_tag(user_tag('alice'))
+        return 'stale'
+
+    assert cache.get_or_load('k', load, (user_tag('alice'),)) == 'stale'
+    assert cache.get_or_load('k', lambda : 'fresh', (user_tag('alice'),)) == 'fresh'
+
+def test_module_invalidation_reaches_every_cache() :
+    caches = [ResultCache(ttl=60) for _ in range(2)]
+    for cache in caches :
+        cache.get_or_load('k', lambda : 1, (user_tag('alice'), 'experiment'))
+        cache.get_or_load('j', lambda : 1, (user_tag('bob'), 'registered_model'))
+
+    result_cache.invalidate_user('alice')
+    assert [len(c) for c in caches] == [1, 1]
+    result_cache.invalidate_resource('registered_model')
+    assert [len(c) for c in caches] == [0, 0]
+
+def test_invalid_size() :
+    with pytest.raises(ValueError) :
+        ResultCache(max_bytes=0)
+
+def test_mlflow_api_returns_row_copies() :
+    from mlstudio_sdk import mlflow_api
+    mlflow_api.enable_result_cache(ttl=60)
+    try:
+        load = lambda : [{'name': 'exp'}]
+        rows = mlflow_api._cached('list', 'alice', (), 'experiment', load)
+        rows[0]['name'] = 'changed'
+        assert mlflow_api._cached('list', 'alice', (), 'experiment', load) == [{'name': 'exp'}]
+        assert mlflow_api.get_result_cache_stats()['hits'] == 1
+    finally:
+        mlflow_api.disable_result_cache()
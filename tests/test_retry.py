@@ -0,0 +1,153 @@
+#################################################
+# retry 의 circuit breaker / backoff / 재시도 확인
+#################################################
+import time
+import pytest
+from mlstudio_sdk import retry
+from mlstudio_sdk.retry import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+OPTIONS = {'deadline': 5.0, 'connect_timeout': 1, 'max_attempts': 3, 'base_delay': 0.001, 'max_delay': 0.002,
+           'failure_threshold': 2, 'reset_timeout': 0.05}
+
+class Transient(Exception) :
+    pass
+
+def is_transient(e) :
+    return isinstance(e, Transient)
+
+@pytest.fixture(autouse=True)
+def options(monkeypatch) :
+    monkeypatch.setattr(retry, '_options', lambda : dict(OPTIONS))
+    retry.reset()
+    yield
+    retry.reset()
+
+def open_breaker(breaker) :
+    for _ in range(breaker.failure_threshold) :
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+
+########################################
+# CircuitBreaker
+########################################
+def test_breaker_opens_after_threshold() :
+    breaker = CircuitBreaker('b', failure_threshold=3, reset_timeout=60)
+    for _ in range(2) :
+        breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert 0 < breaker.retry_after() <= 60
+
+def test_success_resets_failure_count() :
+    breaker = CircuitBreaker('b', failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+def test_half_open_allows_single_trial() :
+    breaker = CircuitBreaker('b', failure_threshold=1, reset_timeout=0.01)
+    open_breaker(breaker)
+    time.sleep(0.02)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()          # 시험 호출은 하나만
+
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+def test_half_open_failure_reopens() :
+    breaker = CircuitBreaker('b', failure_threshold=5, reset_timeout=0.01)
+    for _ in range(5) :
+        breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()            # half open 에서는 한번만 실패해도 다시 연다.
+    assert breaker.state == OPEN and not breaker.allow()
+
+def test_release_returns_trial() :
+    breaker = CircuitBreaker('b', failure_threshold=1, reset_timeout=0.01)
+    open_breaker(breaker)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+@pytest.mark.parametrize('attempt', range(1, 12))
+def test_backoff_bounds(attempt) :
+    for _ in range(50) :
+        delay = retry.backoff(attempt, 0.05, 1.0)
+        assert 0 <= delay <= min(1.0, 0.05 * 2 ** (attempt - 1))
+
+########################################
+# call
+########################################
+def test_call_retries_transient_errors() :
+    attempts = []
+    def func() :
+        attempts.append(1)
+        if len(attempts) < 2 :
+            raise Transient()
+        return 'ok'
+    assert retry.call('db', func, is_transient) == 'ok'
+    stats = retry.stats()['db']
+    assert (stats['attempts'], stats['retries'], stats['successes']) == (2, 1, 1)
+
+def test_call_does_not_retry_permanent_errors() :
+    attempts = []
+    def func() :
+        attempts.append(1)
+        raise ValueError('bad request')
+    with pytest.raises(ValueError) :
+        retry.call('db', func, is_transient)
+    assert len(attempts) == 1
+    assert retry.get_breaker('db').state == CLOSED
+
+def test_call_respects_can_retry() :
+    attempts = []
+    def func() :
+        attempts.append(1)
+        raise Transient()
+    with pytest.raises(Transient) :
+        retry.call('http', func, is_transient, can_retry=lambda e : False)
+    assert len(attempts) == 1
+
+def test_nested_call_attempts_once() :
+    inner = []
+    def inner_func() :
+        inner.append(1)
+        raise Transient()
+    with pytest.raises(Transient) :
+        retry.call('outer', lambda : retry.call('inner', inner_func, is_transient), is_transient)
+    # 바깥에서만 재시도한다. (threshold 에 닿아 circuit 이 열리면 그 전에 멈춘다.)
+    assert len(inner) == OPTIONS['failure_threshold']
+
+def test_open_circuit_rejects_calls() :
+    with pytest.raises(Transient) :
+        retry.call('db', lambda : (_ for _ in ()).throw(Transient()), is_transient)
+    assert retry.get_breaker('db').state == OPEN
+    with pytest.raises(retry.CircuitOpenError) :
+        retry.call('db', lambda : 'ok', is_transient)
+    assert retry.stats()['db']['rejected'] == 1
+
+def test_call_raises_deadline_exceeded() :
+    with retry.deadline(0.0) :
+        with pytest.raises(retry.DeadlineExceeded) :
+            retry.call('db', lambda : 'ok', is_transient)
+
+@pytest.mark.parametrize('error', [KeyboardInterrupt, SystemExit])
+def test_base_exception_releases_half_open_trial(error) :
+    breaker = retry.get_breaker('db')
+    open_breaker(breaker)
+    time.sleep(OPTIONS['reset_timeout'] * 1.5)
+
+    def interrupted() :
+        raise error()
+    with pytest.raises(error) :
+        retry.call('db', interrupted, is_transient)
+
+    assert retry.call('db', lambda : 'ok', is_transient) == 'ok'
+    assert breaker.state == CLOSED
@@ -0,0 +1,164 @@
+#################################################
+# run_logger.RunLogger 의 batch 전송 확인 (가짜 client)
+#################################################
+import threading
+import pytest
+import requests
+from mlflow.exceptions import MlflowException
+from mlstudio_sdk import run_logger
+from mlstudio_sdk.run_logger import RunLogger, RunLoggerClosed
+
+class FakeClient(object) :
+    def __init__(self, failures=0, reject=None) :
+        self.batches = []
+        self.failures = failures
+        self.reject = reject        # batch 를 받아 거절할지 정하는 함수 (permanent 오류)
+        self.gate = threading.Event()
+        self.gate.set()
+        self.lock = threading.Lock()
+
+    def log_batch(self, run_id, metrics, params, tags) :
+        self.gate.wait(5)
+        with self.lock :
+            if self.failures :
+                self.failures -= 1
+                raise requests.exceptions.ConnectionError('connection reset')
+            if self.reject is not None and self.reject(metrics, params, tags) :
+                raise MlflowException('INVALID_PARAMETER_VALUE: Changing param values is not allowed')
+            self.batches.append((list(metrics), list(params), list(tags)))
+
+    def metric_count(self) :
+        return sum(len(m) for m, _, _ in self.batches)
+
+def new_logger(client, **kwargs) :
+    kwargs.setdefault('flush_interval', 60.0)
+    return RunLogger('run-1', client=client, **kwargs)
+
+def test_flush_size_triggers_batch() :
+    client = FakeClient()
+    with new_logger(client, flush_size=5) as logger :
+        for step in range(5) :
+            logger.log_metric('loss', step, step=step)
+        assert logger.flush(5)
+        assert [len(m) for m, _, _ in client.batches] == [5]
+    assert logger.stats()['metrics'] == 5
+
+def test_batches_respect_mlflow_limits() :
+    client = FakeClient()
+    client.gate.clear()     # 모두 쌓인 뒤에 보내도록
+    logger = new_logger(client, flush_size=10000)
+    logger.log_metrics({f'm{i}': i for i in range(2500)}, step=1)
+    logger.log_params({f'p{i}': i for i in range(150)})
+    client.gate.set()
+    assert logger.flush(5)
+    logger.close()
+
+    for metrics, params, tags in client.batches :
+        assert len(metrics) <= run_logger.MAX_METRICS_PER_BATCH
+        assert len(params) + len(tags) <= run_logger.MAX_PARAMS_TAGS_PER_BATCH
+        assert len(metrics) + len(params) + len(tags) <= run_logger.MAX_ENTITIES_PER_BATCH
+    assert client.metric_count() == 2500
+    assert sum(len(p) for _, p, _ in client.batches) == 150
+
+def test_params_and_tags_keep_last_value() :
+    client = FakeClient()
+    client.gate.clear()
+    logger = new_logger(client)
+    logger.log_param('lr', 0.1)
+    logger.log_param('lr', 0.2)
+    logger.set_tag('stage', 'a')
+    logger.set_tag('stage', 'b')
+    client.gate.set()
+    logger.close()
+
+    params = [(p.key, p.value) for _, ps, _ in client.batches for p in ps]
+    tags = [(t.key, t.value) for _, _, ts in client.batches for t in ts]
+    assert params == [('lr', '0.2')]
+    assert tags == [('stage', 'b')]
+
+def test_close_sends_pending_values_and_rejects_new() :
+    client = FakeClient()
+    logger = new_logger(client)
+    logger.log_metric('loss', 1.0)
+    logger.close()
+    assert client.metric_count() == 1
+    with pytest.raises(RunLoggerClosed) :
+        logger.log_metric('loss', 2.0)
+
+def test_non_blocking_queue_drops_when_full() :
+    client = FakeClient()
+    client.gate.clear()
+    logger = new_logger(client, max_queue=3, block=False)
+    for i in range(5) :
+        logger.log_metric('loss', i)
+    assert logger.stats()['dropped'] >= 2
+    client.gate.set()
+    logger.close()
+
+def test_blocking_queue_waits_for_room() :
+    client = FakeClient()
+    logger = new_logger(client, max_queue=3, flush_size=1000)
+    for i in range(10) :
+        logger.log_metric('loss', i)
+    logger.close()
+    assert client.metric_count() == 10
+    assert logger.stats()['dropped'] == 0
+
+def test_failed_batch_is_retried(monkeypatch) :
+    monkeypatch.setattr(run_logger.time, 'sleep', lambda seconds : None)
+    client = FakeClient(failures=1)
+    logger = new_logger(client, max_retries=2)
+    logger.log_metric('loss', 1.0)
+    logger.close()
+    stats = logger.stats()
+    assert (stats['metrics'], stats['retries'], stats['failed']) == (1, 1, 0)
+
+def test_batch_fails_after_max_retries(monkeypatch) :
+    monkeypatch.setattr(run_logger.time, 'sleep', lambda seconds : None)
+    client = FakeClient(failures=10)
+    logger = new_logger(client, max_retries=1)
+    logger.log_metric('loss', 1.0)
+    logger.close()
+    stats = logger.stats()
+    assert (stats['metrics'], stats['failed']) == (0, 1)
+    assert isinstance(logger.last_error, requests.exceptions.ConnectionError)
+
+def test_permanent_error_is_not_retried(monkeypatch) :
+    monkeypatch.setattr(run_logger.time, 'sleep', lambda seconds : None)
+    client = FakeClient(reject=lambda metrics, params, tags : True)
+    logger = new_logger(client, max_retries=3)
+    logger.log_param('lr', 0.1)
+    logger.close()
+    stats = logger.stats()
+    assert (stats['params'], stats['retries'], stats['failed']) == (0, 0, 1)
+    assert isinstance(logger.last_error, MlflowException)
+
+def test_rejected_params_do_not_lose_metrics(monkeypatch) :
+    monkeypatch.setattr(run_logger.time, 'sleep', lambda seconds : None)
+    client = FakeClient(reject=lambda metrics, params, tags : bool(params))
+    client.gate.clear()
+    logger = new_logger(client, max_retries=3)
+    logger.log_metrics({'loss': 0.5, 'acc': 0.9}, step=1)
+    logger.log_param('lr', 0.1)
+    logger.set_tag('stage', 'train')
+    client.gate.set()
+    logger.close()
+
+    # metric 만 다시 보내 기록되고, param / tag 는 거절되어 failed 로 센다.
+    assert [(len(m), len(p), len(t)) for m, p, t in client.batches] == [(2, 0, 0)]
+    stats = logger.stats()
+    assert (stats['metrics'], stats['params'], stats['tags'], stats['failed'], stats['retries']) == (2, 0, 0, 2, 0)
+    assert 'Changing param values' in str(logger.last_error)
+
+def test_rejected_metrics_do_not_lose_params(monkeypatch) :
+    monkeypatch.setattr(run_logger.time, 'sleep', lambda seconds : None)
+    client = FakeClient(reject=lambda metrics, params, tags : bool(metrics))
+    client.gate.clear()
+    logger = new_logger(client)
+    logger.log_metric('loss', 0.5)
+    logger.log_param('lr', 0.1)
+    client.gate.set()
+    logger.close()
+    assert [(len(m), len(p), len(t)) for m, p, t in client.batches] == [(0, 1, 0)]
+    stats = logger.stats()
+    assert (stats['metrics'], stats['params'], stats['failed']) == (0, 1, 1)